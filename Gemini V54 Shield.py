@@ -11,7 +11,8 @@
 
 import os
 import sys
-import requests
+from line_notifier import LineNotifier, Outbox
+from run_metrics import RunMetrics, lap, count
 import warnings
 import pandas as pd
 import numpy as np
@@ -29,14 +30,10 @@ def send_line_push(msg):
     if not LINE_TOKEN or not LINE_UID:
         print("⚠️ 未檢測到 LINE 金鑰，僅在終端機輸出結果：")
         print(msg); return
-    url = 'https://api.line.me/v2/bot/message/push'
-    headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {LINE_TOKEN}'}
-    payload = {"to": LINE_UID, "messages": [{"type": "text", "text": msg}]}
-    try:
-        res = requests.post(url, headers=headers, json=payload)
-        if res.status_code == 200: print("✅ V54 Shield 戰報推播成功！")
-    except Exception as e:
-        print(f"❌ LINE 網絡連結錯誤: {e}")
+    # 共用 session / 自動分段 / 429·5xx 退避重試 (line_notifier)
+    for to, (ok, detail, _) in LineNotifier(LINE_TOKEN, LINE_UID).push(msg).items():
+        if ok: print("✅ V54 Shield 戰報推播成功！")
+        else: print(f"❌ LINE 發送失敗: {detail}")
 
 try:
     import yfinance as yf
@@ -86,6 +83,7 @@ def analyze_market_v54():
     print(f"📥 [V54 Shield] 正在獲取動能排行榜數據...")
     start_str = (datetime.now() - timedelta(days=365)).strftime('%Y-%m-%d')
     data = yf.download(tickers, start=start_str, group_by='ticker', progress=False, auto_adjust=True)
+    lap('download'); count('tickers', len(tickers))
     
     data_map = {}
     ticker_to_sector = {t.split('-')[0]: s for s, ts in SATELLITE_POOL.items() for t in ts}
@@ -107,6 +105,7 @@ def analyze_market_v54():
             if symbol == 'BTC': df['Mayer'] = df['Close'] / df['SMA_200']
             data_map[symbol] = df
         except: continue
+    lap('indicators')
 
     today = data_map['BTC'].index[-1]
     vix = data_map['VIX'].loc[today]['Close'] if 'VIX' in data_map else 20
@@ -175,6 +174,7 @@ def analyze_market_v54():
                 if len(top)==2:
                     tw['SAT2'] = sat_w * 0.4; ss['SAT2'] = top[1]['sym']
 
+    lap('signals'); count('candidates', len(candidates))
     return tw, ss, vix, row_btc['Mayer'], mode, drawdown, today, candidates
 
 # ==========================================
@@ -242,12 +242,25 @@ def generate_v54_report():
     progress = (total_eq * 32 / 30000000) * 100
     msg += f"🚩 衝刺 3000 萬進度: {progress:.2f}%\n"
     msg += f"💡 SMA100 已啟動，給標的多一點呼吸空間。"
-    
+    lap('report')
     return msg
 
 if __name__ == "__main__":
-    try:
-        report = generate_v54_report()
-        send_line_push(report)
-    except Exception as e:
-        print(f"❌ 腳本執行錯誤: {e}")
+    # [OPT-24] 各階段 wall / CPU / RSS 寫入 run_metrics.jsonl
+    with RunMetrics('V54_Shield') as metrics:
+        # 上次未送達的戰報先在背景重送，不阻塞數據下載
+        outbox = Outbox('line_outbox_v54.json')
+        notifier = LineNotifier(LINE_TOKEN, LINE_UID)
+        if notifier.enabled and outbox.pending(): outbox.deliver_async(notifier)
+        try:
+            report = generate_v54_report()
+            if not notifier.enabled:
+                send_line_push(report)
+            else:
+                outbox.enqueue(report, source='V54 Shield')
+                outbox.deliver_async(notifier)
+        except Exception as e:
+            metrics.status = f"error: {str(e)[:120]}"
+            print(f"❌ 腳本執行錯誤: {e}")
+        if notifier.enabled: outbox.wait(30)
+        lap('notify')
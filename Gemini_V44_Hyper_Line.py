@@ -18,7 +18,9 @@ import os
 
 import sys
 
-import requests
+from line_notifier import LineNotifier
+
+from run_metrics import RunMetrics, lap, count
 
 import json
 
@@ -98,43 +100,13 @@ def send_line_push(msg):
 
 
 
-    url = 'https://api.line.me/v2/bot/message/push'
-
-    headers = {
-
-        'Content-Type': 'application/json',
-
-        'Authorization': f'Bearer {LINE_CHANNEL_ACCESS_TOKEN}'
-
-    }
-
-    payload = {
-
-        "to": LINE_USER_ID,
-
-        "messages": [{"type": "text", "text": msg}]
-
-    }
-
-    
-
-    try:
-
-        print("📤 正在推送 LINE 訊息...")
-
-        response = requests.post(url, headers=headers, json=payload)
-
-        if response.status_code == 200:
+    print("📤 正在推送 LINE 訊息...")
 
-            print("✅ 發送成功！")
+    for to, (ok, detail, _) in LineNotifier(LINE_CHANNEL_ACCESS_TOKEN, LINE_USER_ID).push(msg).items():
 
-        else:
-
-            print(f"❌ 發送失敗: {response.status_code} {response.text}")
+        if ok: print("✅ 發送成功！")
 
-    except Exception as e:
-
-        print(f"❌ 網絡錯誤: {e}")
+        else: print(f"❌ 發送失敗: {detail}")
 
 
 
@@ -716,26 +688,44 @@ def print_dashboard_preview(msg):
 
 if __name__ == "__main__":
 
-    try:
+    # [OPT-24] 各階段 wall / CPU / RSS 寫入 run_metrics.jsonl
 
-        raw = fetch_data()
+    with RunMetrics('V44_Hyper_Line') as metrics:
 
-        processed = process_data(raw)
+        try:
 
-        if processed and 'BTC' in processed:
+            raw = fetch_data()
 
-            stat, today = analyze_market(processed)
+            lap('download')
 
-            line_msg = generate_report(stat, today)
+            processed = process_data(raw)
 
-            print_dashboard_preview(line_msg)
+            lap('indicators'); count('tickers', len(processed or {}))
 
-            send_line_push(line_msg)
+            if processed and 'BTC' in processed:
 
-        else:
+                stat, today = analyze_market(processed)
 
-            print("❌ 無法獲取數據")
+                lap('signals')
 
-    except Exception as e:
+                line_msg = generate_report(stat, today)
+
+                lap('report')
+
+                print_dashboard_preview(line_msg)
+
+                send_line_push(line_msg)
+
+                lap('notify')
+
+            else:
+
+                metrics.status = 'no data'
+
+                print("❌ 無法獲取數據")
+
+        except Exception as e:
+
+            metrics.status = f"error: {str(e)[:120]}"
 
-        print(f"❌ 錯誤: {e}")
+            print(f"❌ 錯誤: {e}")
@@ -1,12 +1,14 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import json
 import os
-import requests
-import ccxt
+from line_notifier import LineNotifier
+from exchange_sync import run_fetch_holdings
+from run_metrics import timed_run, lap, count, gauge, set_status
 import time
 import gc
+import copy
+import threading
 import traceback
 from datetime import datetime, timedelta
 import pytz
@@ -30,16 +32,15 @@ BG_PASS = clean_env('BITGET_PASSWORD')
 
 # ⚠️ 已移除永豐金 API 設定，改為純訊號模式
 
-# 初始化 Bitget
-exchange = None
-crypto_name = "Manual"
-try:
-    if BG_KEY and BG_SECRET and BG_PASS:
-        exchange = ccxt.bitget({
-            'apiKey': BG_KEY, 'secret': BG_SECRET, 'password': BG_PASS, 'enableRateLimit': True
-        })
-        crypto_name = "Bitget"
-except: pass
+# 初始化 Bitget (金鑰齊全才啟用；client 由 sync_crypto 執行時建立，import 時不載入 ccxt)
+BITGET_ENABLED = bool(BG_KEY and BG_SECRET and BG_PASS)
+crypto_name = "Bitget" if BITGET_ENABLED else "Manual"
+BITGET_CONFIG = {'apiKey': BG_KEY, 'secret': BG_SECRET, 'password': BG_PASS, 'enableRateLimit': True}
+
+def make_async_exchange():
+    # sync_crypto 用的非同步 client (每次執行建立一次，結束時 close)
+    import ccxt.async_support as ccxt_async
+    return ccxt_async.bitget({**BITGET_CONFIG, 'timeout': 15000})
 
 # 幣種對照
 BITGET_MAP = {'PEPE': 'PEPE24478-USD', 'RNDR': 'RENDER-USD', 'RENDER': 'RENDER-USD', 'BONK': 'BONK-USD', 'WIF': 'WIF-USD', 'FLOKI': 'FLOKI-USD', 'SHIB': 'SHIB-USD'}
@@ -78,31 +79,25 @@ ALL_TICKERS = list(set([t for sub in STRATEGIC_POOL.values() for t in sub])) + [
 # ==========================================
 def send_line(msg):
     if not LINE_TOKEN or not LINE_USER: return
-    url = "https://api.line.me/v2/bot/message/push"
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {LINE_TOKEN}"}
-    payload = {"to": LINE_USER, "messages": [{"type": "text", "text": msg}]}
-    for _ in range(3):
-        try:
-            res = requests.post(url, headers=headers, json=payload, timeout=10)
-            if res.status_code == 200: break
-        except: time.sleep(2)
+    # 共用 session + 429/5xx 指數退避 (原本固定 3 次 / sleep 2 秒)
+    for to, (ok, detail, _) in LineNotifier(LINE_TOKEN, LINE_USER).push(msg).items():
+        if not ok: print(f"❌ LINE 發送失敗: {detail}")
 
 def get_bitget_symbol(yf_ticker):
     if yf_ticker in REV_BITGET_MAP: base = REV_BITGET_MAP[yf_ticker]
     else: base = yf_ticker.replace('-USD', '')
     return f"{base}/USDT"
 
-def sync_crypto(state):
-    """同步 Bitget 持倉"""
-    if not exchange: return state, "⚠️ Bitget 未設定\n"
+def bitget_ticker(coin, total):
+    ticker = BITGET_MAP.get(coin, f"{coin}-USD")
+    return ticker if ticker in STRATEGIC_POOL['CRYPTO'] else None
+
+def sync_crypto(state, make_exchange=None):
+    """同步 Bitget 持倉 (非同步：新持倉的成交價並行查詢，markets 走磁碟快取)"""
+    if make_exchange is None and not BITGET_ENABLED: return state, "⚠️ Bitget 未設定\n"
     try:
-        exchange.timeout = 15000
-        balance = exchange.fetch_balance()
-        api_holdings = {}
-        for coin, total in balance['total'].items():
-            if total > 0:
-                ticker = BITGET_MAP.get(coin, f"{coin}-USD")
-                if ticker in STRATEGIC_POOL['CRYPTO']: api_holdings[ticker] = total
+        api_holdings, entries, errors, _ = run_fetch_holdings(
+            make_exchange or make_async_exchange, bitget_ticker, get_bitget_symbol, set(state['held_assets']))
         
         log = ""
         new_assets = state['held_assets'].copy()
@@ -110,13 +105,10 @@ def sync_crypto(state):
         # A. 更新
         for ticker, amt in api_holdings.items():
             if ticker not in new_assets:
-                try:
-                    sym = get_bitget_symbol(ticker)
-                    trades = exchange.fetch_my_trades(sym, limit=1)
-                    entry = trades[0]['price'] if trades else 0
-                except: entry = 0
+                entry = entries.get(ticker, 0)
                 new_assets[ticker] = {"entry": entry, "high": entry}
                 log += f"➕ Bitget 新增: {ticker}\n"
+                if ticker in errors: log += f"   ⚠️ 成交價查詢失敗 ({errors[ticker]})，進場價暫記 0\n"
         
         # B. 移除 (只針對 Crypto)
         for t in list(new_assets.keys()):
@@ -131,19 +123,80 @@ def sync_crypto(state):
 
 # ⚠️ 移除 sync_tw_stock 函式，改為手動維護台股持倉
 
+# ==========================================
+# 3.5 [OPT-18] 並行 I/O 階段 (下載 / 狀態載入 / 交易所同步)
+# ==========================================
+STATE_FILE = 'state.json'
+# 各階段上限秒數 (自 pipeline 啟動起算)
+STAGE_TIMEOUTS = {'market': 180, 'state': 10, 'exchange': 60}
+
+def download_prices():
+    import yfinance as yf  # 延遲載入 (~0.4s)，與 state/交易所階段並行時不佔主執行緒
+    # threads=False 確保 GitHub Actions 穩定
+    data = yf.download(ALL_TICKERS, period='300d', progress=False, auto_adjust=True, threads=False)
+    prices = data['Close'].ffill()
+    del data; gc.collect()
+    return prices
+
+def load_state(state_file=STATE_FILE):
+    if os.path.exists(state_file):
+        with open(state_file, 'r') as f: return json.load(f)
+    return {"held_assets": {}}
+
+def run_stages(stages, timeouts=None):
+    """
+    stages: {name: (fn, deps)}，fn(*deps 的結果)；無相依的階段同時啟動，相依者在前置完成後立刻啟動。
+    回傳 {name: (status, value)}，status ∈ ok / error / timeout / skipped (前置失敗)。
+    daemon thread 執行：逾時的階段不會拖住行程結束。
+    """
+    timeouts = timeouts or STAGE_TIMEOUTS
+    results, done = {}, {name: threading.Event() for name in stages}
+    start = time.monotonic()
+
+    def worker(name, fn, deps):
+        for d in deps: done[d].wait()
+        if any(results[d][0] != 'ok' for d in deps):
+            results[name] = ('skipped', None)
+        else:
+            t0 = time.monotonic()
+            try: results[name] = ('ok', fn(*[results[d][1] for d in deps]))
+            except Exception as e: results[name] = ('error', e)
+            print(f"   ⏱️ {name}: {time.monotonic() - t0:.1f}s ({results[name][0]})")
+            gauge(f"io_{name}_s", round(time.monotonic() - t0, 3))  # [OPT-24] 並行階段各自耗時
+        done[name].set()
+
+    for name, (fn, deps) in stages.items():
+        threading.Thread(target=worker, args=(name, fn, deps), daemon=True, name=f"stage-{name}").start()
+    for name in stages:
+        remaining = timeouts.get(name, 60) - (time.monotonic() - start)
+        if not done[name].wait(max(remaining, 0)):
+            results.setdefault(name, ('timeout', None))
+    print(f"   ⏱️ I/O 階段合計 {time.monotonic() - start:.1f}s")
+    return {name: results.get(name, ('timeout', None)) for name in stages}
+
 # ==========================================
 # 4. 主決策引擎 (V157 邏輯完美對齊)
+# [OPT-24] 各階段 wall / CPU / RSS 與計數器寫入 run_metrics.jsonl
 # ==========================================
+@timed_run('V157_Omega')
 def main():
     tz = pytz.timezone('Asia/Taipei')
     now = datetime.now(tz)
     print(f"🚀 V166 Omega (Stable) 啟動...")
     
-    # A. 數據獲取 (threads=False 確保 GitHub Actions 穩定)
+    # A~C. [OPT-18] 下載 / 狀態載入 → Bitget 同步 並行，總耗時 ≈ 最慢的單一階段
+    stages = run_stages({
+        'market': (download_prices, ()),
+        'state': (load_state, ()),
+        'exchange': (lambda st: sync_crypto(copy.deepcopy(st)), ('state',)),  # 逾時時仍可沿用未同步的 state
+    })
+    lap('io')
+
+    # A. 數據獲取
     try:
-        data = yf.download(ALL_TICKERS, period='300d', progress=False, auto_adjust=True, threads=False)
-        prices = data['Close'].ffill()
-        del data; gc.collect()
+        status, prices = stages['market']
+        if status == 'error': raise prices
+        if status != 'ok': raise TimeoutError(f"下載超過 {STAGE_TIMEOUTS['market']}s")
 
         # V157 核心指標計算
         ma20 = prices.rolling(20).mean()
@@ -157,17 +210,22 @@ def main():
         btc_ma100 = prices['BTC-USD'].rolling(100).mean() if 'BTC-USD' in prices else ma200_spy
         
         mom_20 = prices.pct_change(20, fill_method=None)
+        lap('indicators'); count('tickers', len(prices.columns))
     except Exception as e:
+        set_status(f"error: 數據下載失敗 {str(e)[:80]}")
         send_line(f"❌ 數據下載失敗: {e}"); return
 
     # B. 狀態載入
-    state_file = 'state.json'
-    if os.path.exists(state_file):
-        with open(state_file, 'r') as f: state = json.load(f)
-    else: state = {"held_assets": {}}
+    status, state = stages['state']
+    if status != 'ok':
+        set_status(f"error: 狀態載入失敗 ({status})")
+        send_line(f"❌ 狀態載入失敗: {state if status == 'error' else status}"); return
 
     # C. 同步 (僅 Bitget)
-    state, c_log = sync_crypto(state)
+    status, synced = stages['exchange']
+    if status == 'ok': state, c_log = synced
+    elif status == 'timeout': c_log = f"⏱️ Bitget 同步逾時 ({STAGE_TIMEOUTS['exchange']}s)，沿用上次持倉\n"
+    else: c_log = f"❌ Bitget 異常: {str(synced)[:30]}...\n"
     
     today_p = prices.iloc[-1]
     
@@ -272,8 +330,10 @@ def main():
                 sym5, sc5, p5, r5 = cands[slots+1]
                 report += f"🔹 {sym5} {r5}\n   參考價: {p5:.2f} | 止損: {p5*0.85:.1f}\n"
 
+    lap('signals'); count('positions', positions); count('sell_alerts', len(sell_alerts)); count('candidates', len(cands))
     send_line(report)
-    with open('state.json', 'w') as f: json.dump(state, f, indent=4)
+    lap('notify')
+    with open(STATE_FILE, 'w') as f: json.dump(state, f, indent=4)
 
 if __name__ == "__main__":
     main()
@@ -13,18 +13,65 @@
 # 保留: CR_FIX_05/07/08/09/10/11 全部 Live 基礎設施
 # =========================================================
 
-import yfinance as yf
+import time
+_STARTUP_T0 = time.perf_counter()  # [OPT-21] --profile-startup 以此為起點
 import pandas as pd
 import numpy as np
 import warnings
 import json
 import os
+import sys
 import argparse
-import requests
-from datetime import datetime
+import copy
+import threading
+import traceback
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from vanguard_cooldown import CooldownTracker
+from vanguard_nav import NavTracker
+from vanguard_indicator_cache import IndicatorCache, panel_hash
+from vanguard_trace import DecisionTrace, TRACE_FILE
+from line_notifier import LineNotifier, Outbox
+from vanguard_delta import build_delta, load_snapshot, promote_snapshot
+from vanguard_stages import Stage, StageCache, StagePipeline, stage_cancelled
+from run_metrics import RunMetrics
 
 warnings.filterwarnings("ignore")
 
+# [OPT-21] yfinance 延遲載入 (~0.4s)：只有真的要下載時才 import；--catch-up/--rebuild-state 走本地快取可完全略過
+yf = None
+STARTUP_BUDGET_MS = 1500   # import → 第一行輸出的預算 (--profile-startup 超出時 exit code 1)
+REPORT_BUDGET_MS = 3000    # import → 戰報第一行的預算 (本地快取、不下載；同上)
+STARTUP_PROFILE = {'imports': time.perf_counter() - _STARTUP_T0}
+
+def _yfinance():
+    global yf
+    if yf is None:
+        t0 = time.perf_counter()
+        import yfinance
+        yf = yfinance
+        STARTUP_PROFILE['lazy: yfinance'] = time.perf_counter() - t0
+    return yf
+
+def mark_first_output(key='first_output'):
+    STARTUP_PROFILE.setdefault(key, time.perf_counter() - _STARTUP_T0)
+
+def print_startup_profile():
+    """回傳是否在預算內"""
+    first = STARTUP_PROFILE.get('first_output', time.perf_counter() - _STARTUP_T0) * 1000
+    print("\n⏱️ 【Startup Profile】")
+    print(f"   模組載入 (pandas/numpy/本地模組): {STARTUP_PROFILE['imports'] * 1000:7.1f} ms")
+    print(f"   import → 第一行輸出:               {first:7.1f} ms (預算 {STARTUP_BUDGET_MS} ms)")
+    report = STARTUP_PROFILE.get('first_report')
+    if report is not None: print(f"   import → 戰報第一行:               {report * 1000:7.1f} ms (預算 {REPORT_BUDGET_MS} ms)")
+    for k, v in STARTUP_PROFILE.items():
+        if k.startswith('lazy: '): print(f"   延遲載入 {k[6:]:<26} {v * 1000:7.1f} ms")
+    heavy = [m for m in ('yfinance', 'requests', 'ccxt', 'scipy', 'matplotlib') if m in sys.modules]
+    print(f"   已載入的重量級模組: {', '.join(heavy) or '無'}")
+    ok = first <= STARTUP_BUDGET_MS and (report is None or report * 1000 <= REPORT_BUDGET_MS)
+    print("   ✅ 在預算內" if ok else "   ⚠️ 超出啟動預算")
+    return ok
+
 # =========================
 # 1) Configuration & Secrets
 # =========================
@@ -47,8 +94,11 @@ MAX_TOTAL_POSITIONS = 3
 BASE_POSITION_SIZE = 1.0 / MAX_TOTAL_POSITIONS
 
 STATE_FILE = 'state.json'
+PRICE_CACHE_FILE = 'price_cache.pkl'  # [OPT-10] 本地價格面板快取 (每次下載後合併寫入)
 LINE_TOKEN = os.getenv('LINE_CHANNEL_ACCESS_TOKEN')
 LINE_USER_ID = os.getenv('LINE_USER_ID')
+OUTBOX_FILE = 'line_outbox.json'  # [OPT-15] LINE 訊息先落地，背景投遞；未送達者下次執行重送
+OUTBOX_WAIT_SEC = 30              # 結束前最多等待投遞的秒數
 
 # =========================
 # 2) Strategy Parameters
@@ -167,7 +217,7 @@ TIER_1_ASSETS = [
     'MSTR', 'COIN', 'AXON'
 ]  # V18.02
 
-ALL_TICKERS = list(set(list(ASSET_MAP.keys()) + ['SPY', 'QQQ', 'BTC-USD', '^TWII', '^HSI', '^VIX', 'TWD=X']))
+ALL_TICKERS = sorted(set(list(ASSET_MAP.keys()) + ['SPY', 'QQQ', 'BTC-USD', '^TWII', '^HSI', '^VIX', 'TWD=X']))  # [OPT-22] 固定順序，快取 key 才穩定
 
 # =========================
 # 3) Live State & Position Engine
@@ -175,7 +225,7 @@ ALL_TICKERS = list(set(list(ASSET_MAP.keys()) + ['SPY', 'QQQ', 'BTC-USD', '^TWII
 
 class Position:
     def __init__(self, symbol, entry_date, entry_price, units, sector, max_price=None, current_price=None,
-                 entry_price_twd=None, max_price_twd=None):
+                 entry_price_twd=None, max_price_twd=None, sector_params=None):
         self.symbol = symbol
         self.entry_date = entry_date if isinstance(entry_date, pd.Timestamp) else pd.Timestamp(entry_date)
         self.entry_price = float(entry_price)
@@ -186,12 +236,13 @@ class Position:
         # 台股專用：直接存 NT$ 原價，避免匯率來回轉換誤差
         self.entry_price_twd = float(entry_price_twd) if entry_price_twd else None
         self.max_price_twd = float(max_price_twd) if max_price_twd else None
+        self.sector_params = sector_params  # [OPT-12] 多帳戶：None = 全域 SECTOR_PARAMS
 
     @classmethod
-    def from_dict(cls, data):
+    def from_dict(cls, data, sector_params=None):
         return cls(data['symbol'], data['entry_date'], data['entry_price'], 
                    data['units'], data['sector'], data.get('max_price'), data.get('current_price'),
-                   data.get('entry_price_twd'), data.get('max_price_twd'))
+                   data.get('entry_price_twd'), data.get('max_price_twd'), sector_params)
 
     def to_dict(self):
         d = {
@@ -206,7 +257,9 @@ class Position:
     @property
     def market_value(self): return self.units * self.current_price
 
-    def get_params(self): return SECTOR_PARAMS.get(self.sector, SECTOR_PARAMS['DEFAULT'])
+    def get_params(self):
+        params = self.sector_params or SECTOR_PARAMS
+        return params.get(self.sector, params['DEFAULT'])
 
     def check_intraday_exit(self, open_p, high_p, low_p, curr_vix=20.0):
         params = self.get_params()
@@ -231,10 +284,11 @@ class Position:
         if high_p > self.max_price: self.max_price = high_p
         return False, 0.0, ""
 
-def load_state():
-    if os.path.exists(STATE_FILE):
+def load_state(path=None):
+    path = path or STATE_FILE
+    if os.path.exists(path):
         try:
-            with open(STATE_FILE, 'r') as f:
+            with open(path, 'r') as f:
                 return json.load(f)
         except: pass
     return {
@@ -242,18 +296,19 @@ def load_state():
         "last_processed_date": (datetime.utcnow() - pd.Timedelta(days=5)).strftime('%Y-%m-%d')
     }
 
-def save_state(state):
+def save_state(state, path=None):
     # [OPT-04] 原子寫入：先寫 tmp 再 rename，防止中斷損壞
-    tmp = STATE_FILE + '.tmp'
+    path = path or STATE_FILE
+    tmp = path + '.tmp'
     with open(tmp, 'w') as f:
         json.dump(state, f, indent=4)
-    os.replace(tmp, STATE_FILE)
+    os.replace(tmp, path)
 
 def get_data(start_date=None):
     if start_date is None:
         start_date = datetime.utcnow() - pd.Timedelta(days=DATA_DOWNLOAD_DAYS)
     start_str = start_date.strftime('%Y-%m-%d')
-    data = yf.download(ALL_TICKERS, start=start_str, progress=False, auto_adjust=True)
+    data = _yfinance().download(ALL_TICKERS, start=start_str, progress=False, auto_adjust=True)
     if isinstance(data.columns, pd.MultiIndex):
         raw_close, close = data['Close'], data['Close'].ffill()
         open_, high, low = data['Open'].ffill(), data['High'].ffill(), data['Low'].ffill()
@@ -277,7 +332,47 @@ def get_data(start_date=None):
         for df in [close, open_, high, low, is_trading_day, raw_high_twd]: df.drop(columns=cols_to_drop, inplace=True)
         
     # [FIX_09] 回傳 twd_series + raw_high_twd 供顯示換算使用
-    return close, open_, high, low, is_trading_day, twd_series, raw_high_twd
+    panel = (close, open_, high, low, is_trading_day, twd_series, raw_high_twd)
+    save_price_cache(panel)
+    return panel
+
+# [OPT-10] 價格面板快取：與既有快取合併 (新下載覆蓋舊值)，累積成本地資料庫供 state 重建使用
+PANEL_KEYS = ('close', 'open', 'high', 'low', 'is_trading_day', 'twd_series', 'raw_high_twd')
+
+def _merge_panel(old, new):
+    merged = []
+    for key, o, n in zip(PANEL_KEYS, old, new):
+        # 等同 n.combine_first(o)，但整表一次 where (逐欄 combine_first 在數百欄時要數百 ms)
+        if isinstance(n, pd.Series):
+            m = n.combine_first(o)
+        else:
+            a, b = n.align(o, join='outer')
+            m = a.where(a.notna(), b)
+        if key == 'is_trading_day': m = m.fillna(False).astype(bool)
+        merged.append(m)
+    return tuple(merged)
+
+def load_price_cache():
+    if not os.path.exists(PRICE_CACHE_FILE): return None
+    try:
+        cached = pd.read_pickle(PRICE_CACHE_FILE)
+        return tuple(cached[k] for k in PANEL_KEYS)
+    except Exception as e:
+        print(f"⚠️ 價格快取讀取失敗: {e}")
+        return None
+
+def save_price_cache(panel):
+    # [OPT-23] 逾時被放棄的下載 stage 不再寫入：fallback 正在讀同一個快取檔；tmp 檔名帶執行緒，並行寫入互不覆蓋
+    if stage_cancelled(): print("⏳ 下載已逾時放棄，不寫入價格快取"); return
+    tmp = f"{PRICE_CACHE_FILE}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        old = load_price_cache()
+        if old is not None: panel = _merge_panel(old, panel)
+        pd.to_pickle(dict(zip(PANEL_KEYS, panel)), tmp)
+        if stage_cancelled(): os.remove(tmp); return
+        os.replace(tmp, PRICE_CACHE_FILE)
+    except Exception as e:
+        print(f"⚠️ 價格快取寫入失敗: {e}")
 
 def get_sector(sym): return ASSET_MAP.get(sym, 'US_STOCK')
 
@@ -290,13 +385,15 @@ def get_costs(sector, sym, gross_amount, action):
 BROKER_TRADES_CSV = 'broker_trades.csv'
 BROKER_TRADES_HEADER = "timestamp,symbol,side,qty,signal_price,fill_price,slippage_pct,reason,sector\n"
 
-def log_broker_trade(symbol, side, qty, signal_price, fill_price, reason, sector):
+def log_broker_trade(symbol, side, qty, signal_price, fill_price, reason, sector, path=None):
+    path = path or BROKER_TRADES_CSV
     try:
         timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
         slip_pct = (fill_price / signal_price - 1.0) * 100.0 if signal_price else 0.0
         row = f"{timestamp},{symbol},{side},{qty:.6f},{signal_price:.6f},{fill_price:.6f},{slip_pct:+.4f},{reason},{sector}\n"
-        write_header = not os.path.exists(BROKER_TRADES_CSV)
-        with open(BROKER_TRADES_CSV, 'a') as f:
+        write_header = not os.path.exists(path)
+        if write_header and os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)  # 變體帳戶首次成交 (portfolios/)
+        with open(path, 'a') as f:
             if write_header:
                 f.write(BROKER_TRADES_HEADER)
             f.write(row)
@@ -318,7 +415,8 @@ def check_regime(date, sym, close_df, benchmarks_ma):
     return price > ma100
 
 # [FIX_08] 絕對淨化機制：清洗舊有髒資料，保證算術完美
-def sanitize_queue(positions, orders_queue):
+def sanitize_queue(positions, orders_queue, max_positions=None):
+    max_positions = max_positions or MAX_TOTAL_POSITIONS
     unique_orders = []
     seen = set()
     for o in orders_queue:
@@ -333,36 +431,398 @@ def sanitize_queue(positions, orders_queue):
     buys = [o for o in queue if o['type'] == 'BUY']
 
     expected_total = current_holding - pending_sells + len(buys)
-    if expected_total > MAX_TOTAL_POSITIONS:
-        excess = expected_total - MAX_TOTAL_POSITIONS
+    if expected_total > max_positions:
+        excess = expected_total - max_positions
         buys_to_remove = buys[-excess:]
         queue = [o for o in queue if o not in buys_to_remove]
         
     return queue
 
-def run_live(dry_run=False):
-    print("🚀 Vanguard Live Engine 啟動...")
+# =========================
+# [OPT-11] Array Day-Step：面板預先轉 numpy，日迴圈只做整數索引 (取代逐格 .loc)
+# =========================
 
-    # --- [FIX_11] 先讀檔，根據您的買入日期，動態決定要抓多久的資料 ---
-    state = load_state()
-    positions = {sym: Position.from_dict(d) for sym, d in state['positions'].items()}
+MIN_SCORE_THRESHOLD = 0.02  # [OPT-08] 分數最低門檻，避免開倉品質太差
+
+# [OPT-12] 多帳戶引擎：每個帳戶一組策略參數 + 自己的 state / 成交紀錄檔
+PORTFOLIO_DIR = 'portfolios'
+PORTFOLIOS_FILE = 'portfolios.json'
+
+class StrategyConfig:
+    """單一帳戶的策略參數與 state 命名空間；未指定的欄位沿用本檔全域常數 (= 正式帳戶)"""
+    def __init__(self, name='production', sector_params=None, asset_map=None, tier_1=None,
+                 max_positions=None, min_hold_days=None, min_hold_days_crypto_spot=None,
+                 top_rank_size=0.40, other_rank_size=0.30, state_file=None, trades_csv=None):
+        self.name = name
+        self.sector_params = sector_params if sector_params is not None else SECTOR_PARAMS
+        self.asset_map = asset_map if asset_map is not None else ASSET_MAP
+        self.tier_1 = tier_1 if tier_1 is not None else TIER_1_ASSETS
+        self.max_positions = max_positions or MAX_TOTAL_POSITIONS
+        self.min_hold_days = min_hold_days if min_hold_days is not None else MIN_HOLD_DAYS
+        self.min_hold_days_crypto_spot = min_hold_days_crypto_spot if min_hold_days_crypto_spot is not None else MIN_HOLD_DAYS_CRYPTO_SPOT
+        self.top_rank_size, self.other_rank_size = top_rank_size, other_rank_size
+        self.state_file = state_file or STATE_FILE
+        self.trades_csv = trades_csv or BROKER_TRADES_CSV
+
+    def get_sector(self, sym): return self.asset_map.get(sym, 'US_STOCK')
 
-    earliest_entry = pd.Timestamp(datetime.utcnow().date() - pd.Timedelta(days=DATA_DOWNLOAD_DAYS))
-    if positions:
-        min_entry = min([pos.entry_date for pos in positions.values()])
-        if min_entry < earliest_entry:
-            earliest_entry = min_entry - pd.Timedelta(days=5) # 提早5天策安全
-            
-    close, open_, high, low, is_trading_day, twd_series, raw_high_twd = get_data(start_date=earliest_entry)
-
-    # 抓取最新匯率供介面顯示
-    latest_twd_rate = twd_series.iloc[-1] if not twd_series.empty else USD_TWD_RATE
+    @classmethod
+    def from_overrides(cls, name, overrides):
+        """
+        portfolios.json 單一變體 → StrategyConfig。
+        SECTOR_PARAMS 逐板塊淺層合併 (trail 門檻 JSON 字串鍵轉回 float)；ASSET_MAP 合併，值為 null 代表移除。
+        """
+        sector_params = {sec: dict(p) for sec, p in SECTOR_PARAMS.items()}
+        for sec, p in overrides.get('SECTOR_PARAMS', {}).items():
+            p = dict(p)
+            if 'trail' in p: p['trail'] = {float(k): v for k, v in p['trail'].items()}
+            sector_params[sec] = {**sector_params.get(sec, SECTOR_PARAMS['DEFAULT']), **p}
+        asset_map = dict(ASSET_MAP)
+        for sym, sec in overrides.get('ASSET_MAP', {}).items():
+            if sec is None: asset_map.pop(sym, None)
+            else: asset_map[sym] = sec
+        return cls(name, sector_params, asset_map, overrides.get('TIER_1_ASSETS'),
+                   overrides.get('MAX_TOTAL_POSITIONS'), overrides.get('MIN_HOLD_DAYS'),
+                   overrides.get('MIN_HOLD_DAYS_CRYPTO_SPOT'),
+                   overrides.get('TOP_RANK_SIZE', 0.40), overrides.get('OTHER_RANK_SIZE', 0.30),
+                   os.path.join(PORTFOLIO_DIR, f"{name}.json"), os.path.join(PORTFOLIO_DIR, f"{name}_trades.csv"))
+
+def load_portfolio_configs(path=PORTFOLIOS_FILE):
+    """portfolios.json 格式: {"variants": [{"name": "...", "overrides": {...}}, ...]}"""
+    with open(path, 'r') as f: spec = json.load(f)
+    os.makedirs(PORTFOLIO_DIR, exist_ok=True)  # 變體的 state / 成交紀錄都在此目錄，日迴圈首筆成交前就要存在
+    return [StrategyConfig.from_overrides(v['name'], v.get('overrides', {})) for v in spec.get('variants', [])]
+
+def compute_indicators(close):
+    """與帳戶參數無關的共用指標：所有帳戶共用同一份"""
+    ind = {
+        'ma20': close.rolling(20).mean(), 'ma50': close.rolling(50).mean(), 'ma60': close.rolling(60).mean(),
+        'mom_20': close.pct_change(20), 'vol_20': close.pct_change().rolling(20).std() * np.sqrt(252),
+    }
+    benchmarks_ma = {b: close[b].rolling(100).mean() for b in ['SPY', 'QQQ', 'BTC-USD', '^TWII'] if b in close.columns}
+    for b in list(benchmarks_ma.keys()): benchmarks_ma[f"{b}_50"] = close[b].rolling(50).mean()
+    ind['benchmarks_ma'] = benchmarks_ma
+    # [FIX_12] Macro Kill Switch: SPY/QQQ MA200
+    ind['spy_ma200'] = close['SPY'].rolling(200).mean() if 'SPY' in close.columns else None
+    ind['qqq_ma200'] = close['QQQ'].rolling(200).mean() if 'QQQ' in close.columns else None
+    ind['vix_series'] = close['^VIX'] if '^VIX' in close.columns else pd.Series(20, index=close.index)
+    return ind
+
+def compute_scores(close, is_trading_day, ind, asset_map=None, tier_1=None):
+    asset_map = asset_map if asset_map is not None else ASSET_MAP
+    tier_1 = tier_1 if tier_1 is not None else TIER_1_ASSETS
+    ma20, ma50, ma60, mom_20, vol_20 = ind['ma20'], ind['ma50'], ind['ma60'], ind['mom_20'], ind['vol_20']
+    scores = pd.DataFrame(index=close.index, columns=close.columns, dtype=float)
+    for t in asset_map.keys():
+        if t not in close.columns: continue
+        trend_ok = (close[t] > ma20[t]) & (ma20[t] > ma50[t]) & (close[t] > ma60[t])
+        valid_mom = (mom_20[t] > (0.08 if 'TW' in asset_map[t] else 0.05 if '3X' in asset_map[t] else 0.0)).fillna(False)
+        mult = (1.0 + vol_20[t].fillna(0)) * (1.2 if t in tier_1 else 1.0)
+        # [V18.05] 移除台股 0.9x 懲罰 — 手續費已在 get_costs() 精確扣除，不需雙重課稅
+        scores[t] = np.where(trend_ok & valid_mom, mom_20[t] * mult, np.nan)
 
-    today_utc = datetime.utcnow().date()
-    completed_dates = [d for d in close.index if d.date() < today_utc]
-    if not completed_dates: return
+    # [CR-02] 非交易日分數遮蔽：台股休市日不參與排名 (防止 ffill 假價格汙染信號)
+    for t in asset_map.keys():
+        if t in scores.columns and t in is_trading_day.columns:
+            scores.loc[~is_trading_day[t], t] = np.nan
+    return scores
+
+class DayArrays:
+    """run_live 日迴圈所需的全部矩陣 (T x N) 與逐日序列 (T)，建構一次後重複使用"""
+    def __init__(self, close, open_, high, low, is_trading_day, scores, ind, sector_of=None):
+        vol_20, vix_series, benchmarks_ma = ind['vol_20'], ind['vix_series'], ind['benchmarks_ma']
+        spy_ma200, qqq_ma200 = ind['spy_ma200'], ind['qqq_ma200']
+        self.dates = close.index
+        self.columns = close.columns
+        self.col = {sym: j for j, sym in enumerate(close.columns)}
+        self.close = close.to_numpy(dtype=float)
+        self.open = open_.reindex(columns=close.columns).to_numpy(dtype=float)
+        self.high = high.reindex(columns=close.columns).to_numpy(dtype=float)
+        self.low = low.reindex(columns=close.columns).to_numpy(dtype=float)
+        self.trading = is_trading_day.reindex(columns=close.columns, fill_value=False).to_numpy(dtype=bool)
+        self.vol = vol_20.to_numpy(dtype=float)
+        self.vix = vix_series.to_numpy(dtype=float)
+        # check_regime 向量化：每個 benchmark 算一次 T 長度布林序列，再依板塊展開成 T x N
+        self._bench_ok = bench_ok = {}
+        for bench in ['BTC-USD', '^TWII', '^HSI', 'QQQ']:
+            if bench not in close.columns or bench not in benchmarks_ma:
+                bench_ok[bench] = np.ones(len(close.index), dtype=bool); continue
+            price, ma100 = close[bench].to_numpy(dtype=float), benchmarks_ma[bench].to_numpy(dtype=float)
+            ma50 = benchmarks_ma[f"{bench}_50"].to_numpy(dtype=float) if f"{bench}_50" in benchmarks_ma else np.full(len(price), np.nan)
+            undefined = np.isnan(price) | np.isnan(ma100)
+            ok = np.where(np.isnan(ma50), price > ma100, (price > ma100) & (ma50 > ma100))
+            bench_ok[bench] = undefined | ok
+        self._set_strategy(scores, sector_of or get_sector)
+        # [FIX_12] Macro Kill Switch：SPY 或 QQQ 在 MA200 下方
+        self.macro_bearish = np.zeros(len(close.index), dtype=bool)
+        for bench, ma200 in (('SPY', spy_ma200), ('QQQ', qqq_ma200)):
+            if ma200 is None: continue
+            m = ma200.reindex(close.index).to_numpy(dtype=float)
+            self.macro_bearish |= ~np.isnan(m) & (close[bench].to_numpy(dtype=float) < m)
+
+    def _set_strategy(self, scores, sector_of):
+        self.scores = scores.to_numpy(dtype=float)
+        def _bench(sym):
+            sector = sector_of(sym)
+            return 'BTC-USD' if 'CRYPTO' in sector else '^TWII' if 'TW_' in sector else '^HSI' if 'CN_' in sector else 'QQQ'
+        self.regime_ok = (np.column_stack([self._bench_ok[_bench(sym)] for sym in self.columns]) if len(self.columns)
+                          else np.ones((len(self.dates), 0), dtype=bool))
+
+    def for_strategy(self, scores, sector_of):
+        """[OPT-12] 共用價格矩陣，只替換帳戶相依的 scores / regime 遮罩"""
+        variant = copy.copy(self)
+        variant._set_strategy(scores, sector_of)
+        return variant
+
+class LiveBook:
+    """單一帳戶的可變狀態：現金、持倉、掛單隊列、冷卻、[OPT-30] 串流淨值指標"""
+    def __init__(self, cash, positions, orders_queue, cooldowns, nav=None):
+        self.cash = cash
+        self.positions = positions
+        self.orders_queue = orders_queue
+        self.cooldowns = cooldowns
+        self.nav = nav if nav is not None else NavTracker()
 
-    cash = state['cash']
+    @property
+    def total_equity(self): return self.cash + sum(p.market_value for p in self.positions.values())
+
+def step_day(arr, i, book, cfg=None, trace=None):
+    """
+    處理第 i 根 bar (exec_date)，邏輯與原 run_live 日迴圈逐行對應。
+    cfg 為帳戶策略參數 (None = 正式帳戶)；trace 為 DecisionTrace (None = 不記錄)。
+    回傳 (fills, intraday_alerts)，fills 為當日成交明細 list[dict]。
+    """
+    cfg = cfg or StrategyConfig()
+    get_sector = cfg.get_sector
+    exec_date = arr.dates[i]
+    if trace is not None: trace.start(exec_date, cfg.name)
+    s = i - 1 if i > 0 else i   # signal_date = 前一根 bar
+    col, close_v, open_v, trading_v = arr.col, arr.close[i], arr.open[i], arr.trading[i]
+    positions, cooldowns = book.positions, book.cooldowns
+    fills, intraday_alerts = [], []
+    cooldowns.advance(exec_date)  # [OPT-09] 批次移除已到期冷卻
+
+    sell_orders = [o for o in book.orders_queue if o['type'] == 'SELL']
+    buy_orders  = [o for o in book.orders_queue if o['type'] == 'BUY']
+    pending_orders = []
+
+    for o in sell_orders:
+        sym = o['symbol']
+        # [CR_FIX_13] 先檢查持倉是否存在，避免孤兒賣出指令卡在隊列
+        if sym not in positions: continue
+        j = col[sym]
+        if not trading_v[j] or np.isnan(open_v[j]):
+            pending_orders.append(o)
+            continue
+        exec_price = open_v[j] * (1 - SLIPPAGE_RATE)
+        pos = positions[sym]
+        comm, tax = get_costs(pos.sector, sym, pos.units * exec_price, 'SELL')
+        book.cash += (pos.units * exec_price) - comm - tax
+        reason = o.get('reason', 'SELL_QUEUED')
+        # [BROKER_LOG] 排隊 SELL 成交記錄
+        log_broker_trade(symbol=sym, side='SELL', qty=pos.units, signal_price=float(open_v[j]),
+                         fill_price=float(exec_price), reason=reason, sector=pos.sector, path=cfg.trades_csv)
+        fills.append({'date': exec_date, 'side': 'SELL', 'symbol': sym, 'qty': pos.units, 'price': float(exec_price), 'reason': reason,
+                      'pnl': float((exec_price - pos.entry_price) * pos.units)})
+        del positions[sym]
+
+    for o in buy_orders:
+        sym, amount = o['symbol'], o['amount_usd']
+        # [CR_FIX_14] 已持有該標的則丟棄孤兒買入指令
+        if sym in positions: continue
+        j = col[sym]
+        if not trading_v[j] or np.isnan(open_v[j]):
+            pending_orders.append(o)
+            continue
+
+        has_pending_sells = any(x['type']=='SELL' for x in pending_orders)
+        if book.cash < amount * 0.90 and has_pending_sells:
+            pending_orders.append(o)
+            continue
+
+        if book.cash <= 0 or (open_v[j] / arr.close[s, j]) > (1 + GAP_UP_LIMIT):
+            if trace is not None: trace.event('BUY_SKIP', sym, note='NO_CASH' if book.cash <= 0 else 'GAP_UP')
+            continue
+
+        exec_price = open_v[j] * (1 + SLIPPAGE_RATE)
+        temp_comm, _ = get_costs(get_sector(sym), sym, 1.0, 'BUY')
+        units = min(book.cash, amount) / (exec_price * (1 + temp_comm))
+        if units * exec_price < 100:
+            if trace is not None: trace.event('BUY_SKIP', sym, note='MIN_NOTIONAL')
+            continue
+
+        cost = units * exec_price
+        comm, _ = get_costs(get_sector(sym), sym, cost, 'BUY')
+        book.cash -= (cost + comm)
+        positions[sym] = Position(sym, exec_date, exec_price, units, get_sector(sym), sector_params=cfg.sector_params)
+        reason = o.get('reason', 'BUY_QUEUED')
+        # [BROKER_LOG] 排隊 BUY 成交記錄
+        log_broker_trade(symbol=sym, side='BUY', qty=units, signal_price=float(open_v[j]),
+                         fill_price=float(exec_price), reason=reason, sector=get_sector(sym), path=cfg.trades_csv)
+        fills.append({'date': exec_date, 'side': 'BUY', 'symbol': sym, 'qty': units, 'price': float(exec_price), 'reason': reason})
+
+    orders_queue = pending_orders
+
+    cols_to_del = []
+    curr_vix_trail = arr.vix[s] if not np.isnan(arr.vix[s]) else 20.0
+    for sym, pos in positions.items():
+        j = col[sym]
+        if not trading_v[j] or np.isnan(arr.low[i, j]): continue
+        pos.current_price = close_v[j]
+        triggered, exec_price, reason = pos.check_intraday_exit(open_v[j], arr.high[i, j], arr.low[i, j], curr_vix_trail)
+        if triggered:
+            signal_exec_price = exec_price  # [BROKER_LOG] 捕捉 pre-slippage 觸發價
+            exec_price *= (1 - SLIPPAGE_RATE)
+            comm, tax = get_costs(pos.sector, sym, pos.units * exec_price, 'SELL')
+            book.cash += (pos.units * exec_price) - comm - tax
+            if 'CRYPTO' in pos.sector or 'LEV' in pos.sector: cooldowns.set(sym, exec_date + pd.Timedelta(days=1))
+            else: cooldowns.set(sym, exec_date + pd.Timedelta(days=5))
+            # [BROKER_LOG] 盤中觸發出場記錄（TRAIL_EXIT/HARD_STOP/GAP_* 等）
+            log_broker_trade(symbol=sym, side='SELL', qty=pos.units, signal_price=float(signal_exec_price),
+                             fill_price=float(exec_price), reason=reason, sector=pos.sector, path=cfg.trades_csv)
+            fills.append({'date': exec_date, 'side': 'SELL', 'symbol': sym, 'qty': pos.units, 'price': float(exec_price), 'reason': reason,
+                          'pnl': float((exec_price - pos.entry_price) * pos.units)})
+            cols_to_del.append(sym)
+            intraday_alerts.append(f"⚠️ {sym} 於 {exec_date.strftime('%m/%d')} 盤中觸發: {reason}")
+    for sym in cols_to_del: del positions[sym]
+
+    curr_vix = arr.vix[i] if not np.isnan(arr.vix[i]) else 20.0
+    score_v, regime_v = arr.scores[i], arr.regime_ok[i]
+    def _score(sym): return score_v[col[sym]]
+
+    holdings_to_sell = []
+    for sym, pos in positions.items():
+        if not trading_v[col[sym]]: continue
+        if curr_vix > 45.0:
+            if not any(o['type'] == 'SELL' and o['symbol'] == sym for o in orders_queue):
+                orders_queue.append({'type': 'SELL', 'symbol': sym, 'reason': "VIX>45斷路"})
+            holdings_to_sell.append(sym); continue
+        if (exec_date - pos.entry_date).days > pos.get_params()['zombie'] and pos.current_price <= pos.entry_price:
+            if not any(o['type'] == 'SELL' and o['symbol'] == sym for o in orders_queue):
+                orders_queue.append({'type': 'SELL', 'symbol': sym, 'reason': "Zombie"})
+            holdings_to_sell.append(sym); continue
+        if not regime_v[col[sym]]:
+            if not any(o['type'] == 'SELL' and o['symbol'] == sym for o in orders_queue):
+                orders_queue.append({'type': 'SELL', 'symbol': sym, 'reason': "Regime Fail"})
+            holdings_to_sell.append(sym); continue
+
+    active_holdings = [
+        s_ for s_ in positions
+        if s_ not in holdings_to_sell
+        and not any(o['type'] == 'SELL' and o['symbol'] == s_ for o in orders_queue)
+    ]
+
+    # [OPT-08][OPT-09] 分數門檻 + cooldown + regime 一次向量化遮罩
+    eligible = ~np.isnan(score_v) & (score_v >= MIN_SCORE_THRESHOLD) & cooldowns.allowed_mask(exec_date) & regime_v
+    elig_idx = np.flatnonzero(eligible)
+    ranked = elig_idx[np.argsort(score_v[elig_idx], kind='quicksort')[::-1]]
+    candidates = [arr.columns[j] for j in ranked if arr.columns[j] not in positions]
+
+    # [V18.07] VIX Boost: VIX 低時加碼 (A/B 驗證 CAGR+116pp, MaxDD -49.39% < -50% 底線)
+    vix_scaler = 0.4 if curr_vix > 40 else 0.7 if curr_vix > 30 else 1.0 if curr_vix > 20 else 1.15 if curr_vix > 15 else 1.3
+    # [OPT-06] 先更新所有持倉 current_price 再算 total_eq
+    for sym_upd, pos_upd in positions.items():
+        if not np.isnan(close_v[col[sym_upd]]):
+            pos_upd.current_price = close_v[col[sym_upd]]
+    total_eq = book.total_equity
+
+    if trace is not None:
+        # [OPT-13] 排名/持倉分數在巨觀開關清空候選前記錄，才看得到「被擋下的是誰」
+        trace.summary(curr_vix, vix_scaler, bool(arr.macro_bearish[i]), total_eq, book.cash, len(candidates), len(positions))
+        trace.ranking(candidates, _score)
+        for sym in positions: trace.event('HOLD', sym, score=_score(sym), flag=int(sym in holdings_to_sell))
+
+    # --- [FIX_12] Macro Kill Switch: SPY 或 QQQ 在 MA200 下方 = 禁止開倉 ---
+    if arr.macro_bearish[i]:
+        candidates = []
+
+    # [V18.05] 動態倉位：排名 #1 的標的 40%，其餘各 30% (A/B 驗證 CAGR+100pp)
+    def get_pos_size(rank):
+        return total_eq * cfg.top_rank_size * vix_scaler if rank == 0 else total_eq * cfg.other_rank_size * vix_scaler
+    proj = list(active_holdings)
+
+    def is_allowed(cand): return True if curr_vix < 25.0 else sum(1 for x in proj if get_sector(x)==get_sector(cand)) < 2
+
+    while active_holdings and candidates:
+        active_holdings.sort(key=lambda x: _score(x) if not np.isnan(_score(x)) else -999)
+        worst = active_holdings[0]
+        # [CR-09] CRYPTO_SPOT 用 MIN_HOLD=3，其餘用 MIN_HOLD=5
+        min_hold = cfg.min_hold_days_crypto_spot if cfg.asset_map.get(worst, '') == 'CRYPTO_SPOT' else cfg.min_hold_days
+        if (exec_date - positions[worst].entry_date).days < min_hold:
+            if trace is not None: trace.event('MIN_HOLD', worst, note=f"{(exec_date - positions[worst].entry_date).days}<{min_hold}")
+            active_holdings.pop(0); continue
+
+        valid_idx = next((k for k, c in enumerate(candidates) if is_allowed(c)), -1)
+        if trace is not None:
+            for c in (candidates if valid_idx == -1 else candidates[:valid_idx]): trace.event('SECTOR_CAP', c, note=get_sector(c))
+        if valid_idx == -1: break
+        best = candidates[valid_idx]
+
+        w_score = _score(worst) if not np.isnan(_score(worst)) else 0
+        b_score = _score(best)
+        v_hold = arr.vol[i, col[worst]] if not np.isnan(arr.vol[i, col[worst]]) else 0.0
+        if trace is not None:
+            swap_ok = b_score > w_score * min(2.0, 1.4 + v_hold*0.1) and b_score > w_score + 0.05
+            trace.event('SWAP', worst, score=b_score, ref=w_score, mult=min(2.0, 1.4 + v_hold*0.1), flag=int(swap_ok), note=best)
+        if b_score > w_score * min(2.0, 1.4 + v_hold*0.1) and b_score > w_score + 0.05:
+            if not any(o['type'] == 'SELL' and o['symbol'] == worst for o in orders_queue):
+                orders_queue.append({'type': 'SELL', 'symbol': worst, 'reason': f"Swap to {best}"})
+            if not any(o['type'] == 'BUY' and o['symbol'] == best for o in orders_queue):
+                orders_queue.append({'type': 'BUY', 'symbol': best, 'amount_usd': get_pos_size(0)})
+            proj.remove(worst); proj.append(best); active_holdings.pop(0); candidates.pop(valid_idx)
+        else: break
+
+    current_holding_count = len(positions)
+    pending_sell_count = len([o for o in orders_queue if o['type'] == 'SELL'])
+    pending_buy_count = len([o for o in orders_queue if o['type'] == 'BUY'])
+
+    open_slots = cfg.max_positions - (current_holding_count - pending_sell_count + pending_buy_count)
+
+    for _ in range(max(0, open_slots)):
+        if not candidates or curr_vix > PANIC_VIX_THRESHOLD: break
+        valid_idx = next((k for k, c in enumerate(candidates) if is_allowed(c)), -1)
+        if trace is not None:
+            for c in (candidates if valid_idx == -1 else candidates[:valid_idx]): trace.event('SECTOR_CAP', c, note=get_sector(c))
+        if valid_idx != -1:
+            cand = candidates.pop(valid_idx)
+            if not any(o['type'] == 'BUY' and o['symbol'] == cand for o in orders_queue):
+                orders_queue.append({'type': 'BUY', 'symbol': cand, 'amount_usd': get_pos_size(len(positions))})
+            proj.append(cand)
+
+    # 每日結算後，再次確保對列完美
+    book.orders_queue = sanitize_queue(positions, orders_queue, cfg.max_positions)
+    # [OPT-07] 利息計算移到策略信號判斷後（更精確）
+    if book.cash > 0: book.cash *= ((1 + 0.04) ** (1/365))
+    if trace is not None:
+        for f in fills: trace.event('FILL', f['symbol'], score=f['price'], note=f"{f['side']}:{f['reason']}")
+        for o in book.orders_queue: trace.event('ORDER', o['symbol'], score=o.get('amount_usd', np.nan), note=f"{o['type']}:{o.get('reason', '')}")
+    return fills, intraday_alerts
+
+# [OPT-11] Catch-up：優先使用本地價格快取，只補下載快取最後一根 bar 之後的缺口
+def load_catch_up_panel(earliest_entry):
+    cached = load_price_cache()
+    if cached is None or cached[0].index.tz_localize(None)[0] > earliest_entry:
+        return None
+    last_bar = cached[0].index.tz_localize(None)[-1]
+    if last_bar.date() < datetime.utcnow().date():
+        print(f"📥 補下載缺口: {last_bar.strftime('%Y-%m-%d')} 之後")
+        get_data(start_date=last_bar - pd.Timedelta(days=5))  # get_data 會合併寫回快取
+        cached = load_price_cache()
+    start = cached[0].index.tz_localize(None).searchsorted(earliest_entry)
+    return tuple(df.iloc[start:] for df in cached)
+
+def print_catch_up_report(daily_fills, elapsed):
+    n_days = len(daily_fills)
+    print(f"\n📒 Catch-up 補跑 {n_days} 天，日迴圈耗時 {elapsed*1000:.1f} ms ({elapsed*1000/max(n_days, 1):.2f} ms/天)")
+    for date, fills in daily_fills:
+        if not fills: continue
+        print(f"  {date.strftime('%Y-%m-%d')}")
+        for f in fills:
+            print(f"    {'🟢' if f['side'] == 'BUY' else '🔴'} {f['side']:<4} {f['symbol']:<14} {f['qty']:>12.4f} @ {f['price']:>12.4f} ({f['reason']})")
+
+def prepare_book(state, cfg, close, high, raw_high_twd, today_utc):
+    """state dict → LiveBook：最高價修復、過期 cooldown 清除、隊列淨化 (run_live 進入日迴圈前的準備)"""
+    positions = {sym: Position.from_dict(d, cfg.sector_params) for sym, d in state['positions'].items()}
 
     # --- [FIX_10] 歷史最高價全自動掃描與修復機制 ---
     naive_high_idx = high.index.tz_localize(None) # 消除 yfinance 時區
@@ -383,243 +843,206 @@ def run_live(dry_run=False):
                                 pos.max_price_twd = float(twd_highs.max())
             except Exception as e:
                 print(f"⚠️ {sym} 最高價修復失敗: {e}")
-                
-    orders_queue = state['orders_queue']
-    cooldown_dict = {sym: pd.Timestamp(d) for sym, d in state['cooldown_dict'].items()}
 
-    # [OPT-03] 清除過期 cooldown
-    today_ts = pd.Timestamp(today_utc)
-    cooldown_dict = {sym: d for sym, d in cooldown_dict.items() if d > today_ts}
+    # [OPT-09] cooldown 改用 heap 追蹤器，遮罩與 close.columns 對齊
+    cooldowns = CooldownTracker.from_dict(close.columns, state['cooldown_dict'])
 
-    orders_queue = sanitize_queue(positions, orders_queue)
+    # [OPT-03] 清除過期 cooldown (保留 d > today)
+    cooldowns.advance(pd.Timestamp(today_utc) + pd.Timedelta(days=1))
+
+    orders_queue = sanitize_queue(positions, state['orders_queue'], cfg.max_positions)
 
     # [CR_FIX_13/14] 孤兒指令清理：迴圈外先清一次，避免 dates_to_process 為空時指令永遠卡著
     orders_queue = [o for o in orders_queue
                     if not (o['type'] == 'SELL' and o['symbol'] not in positions)
                     and not (o['type'] == 'BUY' and o['symbol'] in positions)]
+    return LiveBook(state['cash'], positions, orders_queue, cooldowns, NavTracker.from_dict(state.get('nav')))
+
+def book_to_state(state, book):
+    state['cash'] = book.cash
+    state['positions'] = {sym: pos.to_dict() for sym, pos in book.positions.items()}
+    state['orders_queue'] = book.orders_queue
+    state['cooldown_dict'] = book.cooldowns.to_dict()
+    state['nav'] = book.nav.to_dict()
+    return state
+
+def print_variant_summary(variants, variant_states):
+    print("\n🧪 【紙上變體帳戶】")
+    print(f"{'Name':<16} {'Equity($)':>12} {'Cash($)':>10} {'Pos':>4} {'Queue':>6} {'Last':>11}  Holdings")
+    for cfg, state in zip(variants, variant_states):
+        equity = state['cash'] + sum(d['units'] * d['current_price'] for d in state['positions'].values())
+        print(f"{cfg.name:<16} {equity:>12,.0f} {state['cash']:>10,.0f} {len(state['positions']):>4} "
+              f"{len(state['orders_queue']):>6} {state['last_processed_date']:>11}  {', '.join(state['positions']) or '-'}")
 
-    last_processed = pd.Timestamp(state['last_processed_date'])
-    dates_to_process = [d for d in completed_dates if d > last_processed]
-
-    ma20, ma50, ma60 = close.rolling(20).mean(), close.rolling(50).mean(), close.rolling(60).mean()
-    benchmarks_ma = {b: close[b].rolling(100).mean() for b in ['SPY', 'QQQ', 'BTC-USD', '^TWII'] if b in close.columns}
-    for b in list(benchmarks_ma.keys()): benchmarks_ma[f"{b}_50"] = close[b].rolling(50).mean()
-
-    # [FIX_12] Macro Kill Switch: SPY/QQQ MA200
-    spy_ma200 = close['SPY'].rolling(200).mean() if 'SPY' in close.columns else None
-    qqq_ma200 = close['QQQ'].rolling(200).mean() if 'QQQ' in close.columns else None
-        
-    MIN_SCORE_THRESHOLD = 0.02  # [OPT-08] 分數最低門檻，避免開倉品質太差
-    mom_20, vol_20 = close.pct_change(20), close.pct_change().rolling(20).std() * np.sqrt(252)
-    scores = pd.DataFrame(index=close.index, columns=close.columns)
-    for t in ASSET_MAP.keys():
-        if t not in close.columns: continue
-        trend_ok = (close[t] > ma20[t]) & (ma20[t] > ma50[t]) & (close[t] > ma60[t])
-        valid_mom = (mom_20[t] > (0.08 if 'TW' in ASSET_MAP[t] else 0.05 if '3X' in ASSET_MAP[t] else 0.0)).fillna(False)
-        mult = (1.0 + vol_20[t].fillna(0)) * (1.2 if t in TIER_1_ASSETS else 1.0)
-        # [V18.05] 移除台股 0.9x 懲罰 — 手續費已在 get_costs() 精確扣除，不需雙重課稅
-        scores[t] = np.where(trend_ok & valid_mom, mom_20[t] * mult, np.nan)
-
-    # [CR-02] 非交易日分數遮蔽：台股休市日不參與排名 (防止 ffill 假價格汙染信號)
-    for t in ASSET_MAP.keys():
-        if t in scores.columns and t in is_trading_day.columns:
-            scores.loc[~is_trading_day[t], t] = np.nan
-
-    vix_series = close['^VIX'] if '^VIX' in close.columns else pd.Series(20, index=close.index)
-
-    intraday_alerts = []
+# =========================
+# [OPT-19] Execution Adapter：orders_queue 送出到券商介面 (預設為本機紙上券商模擬器)
+# =========================
+PAPER_TRADES_CSV = 'paper_trades.csv'
+PAPER_LATENCY_MS = 0.0
+PAPER_SLIPPAGE_BPS = 5.0
+
+def execute_orders(spec, orders_queue, positions, as_of, bars):
+    """
+    spec: 'paper' (以當次價格面板啟動內建模擬器) 或模擬器 URL。
+    成交寫入 paper_trades.csv (與 broker_trades.csv 同格式)；state 記帳仍由 step_day 於下一根開盤處理。
+    """
+    if not orders_queue: print("\n🏦 Execution: 無待送指令"); return []
+    from vanguard_broker import latency_summary, make_adapter  # [OPT-21] 只有 --execute 才載入 (http.server / requests)
+    adapter = make_adapter(spec, bars=bars, latency_ms=PAPER_LATENCY_MS, slippage_bps=PAPER_SLIPPAGE_BPS)
+    try:
+        t0 = time.perf_counter()
+        fills = adapter.submit(orders_queue, positions, as_of)
+        elapsed = time.perf_counter() - t0
+    finally:
+        adapter.close()
+    print(f"\n🏦 Execution ({adapter.name}): {len(fills)} 筆委託，耗時 {elapsed * 1000:.0f}ms | {latency_summary(fills)}")
+    for f in fills:
+        if f.get('status') != 'FILLED':
+            print(f"   ⚠️ {f.get('symbol', '?')} {f.get('side', '')} {f.get('status')}: {f.get('error', '')}")
+            continue
+        print(f"   {f['side']:<4} {f['symbol']:<14} {f['qty']:.4f} @ {f['price']:.4f} ({f['bar']} {f['bar_date']}, {f['latency_ms']:.1f}ms)")
+        log_broker_trade(f['symbol'], f['side'], f['qty'], f['ref_price'], f['price'], f['reason'] or 'QUEUE', get_sector(f['symbol']), PAPER_TRADES_CSV)
+    return fills
 
-    for date in dates_to_process:
-        # [OPT-01] 重命名：signal_date=前一交易日(產生信號), exec_date=執行日(開盤下單)
-        date_idx = close.index.get_loc(date)  # [OPT-02] O(1) 取代 list().index() O(n)
-        signal_date = close.index[date_idx - 1] if date_idx > 0 else date
-        exec_date = date
-        
-        sell_orders = [o for o in orders_queue if o['type'] == 'SELL']
-        buy_orders  = [o for o in orders_queue if o['type'] == 'BUY']
-        pending_orders = []
-
-        for o in sell_orders:
-            sym = o['symbol']
-            # [CR_FIX_13] 先檢查持倉是否存在，避免孤兒賣出指令卡在隊列
-            if sym not in positions: continue
-            if not is_trading_day.loc[exec_date, sym] or pd.isna(open_.loc[exec_date, sym]): 
-                pending_orders.append(o)
-                continue
-            exec_price = open_.loc[exec_date, sym] * (1 - SLIPPAGE_RATE)
-            comm, tax = get_costs(positions[sym].sector, sym, positions[sym].units * exec_price, 'SELL')
-            cash += (positions[sym].units * exec_price) - comm - tax
-            # [BROKER_LOG] 排隊 SELL 成交記錄
-            log_broker_trade(
-                symbol=sym, side='SELL', qty=positions[sym].units,
-                signal_price=float(open_.loc[exec_date, sym]), fill_price=float(exec_price),
-                reason=o.get('reason', 'SELL_QUEUED'), sector=positions[sym].sector,
-            )
-            del positions[sym]
-
-        for o in buy_orders:
-            sym, amount = o['symbol'], o['amount_usd']
-            # [CR_FIX_14] 已持有該標的則丟棄孤兒買入指令
-            if sym in positions: continue
-            if not is_trading_day.loc[exec_date, sym] or pd.isna(open_.loc[exec_date, sym]):
-                pending_orders.append(o)
-                continue
-                
-            has_pending_sells = any(x['type']=='SELL' for x in pending_orders)
-            if cash < amount * 0.90 and has_pending_sells:
-                pending_orders.append(o)
-                continue
-            
-            if cash <= 0 or (open_.loc[exec_date, sym]/close.loc[signal_date, sym]) > (1+GAP_UP_LIMIT): 
-                continue
-            
-            exec_price = open_.loc[exec_date, sym] * (1 + SLIPPAGE_RATE)
-            temp_comm, _ = get_costs(get_sector(sym), sym, 1.0, 'BUY')
-            units = min(cash, amount) / (exec_price * (1 + temp_comm))
-            if units * exec_price < 100: continue
-            
-            cost = units * exec_price
-            comm, _ = get_costs(get_sector(sym), sym, cost, 'BUY')
-            cash -= (cost + comm)
-            positions[sym] = Position(sym, exec_date, exec_price, units, get_sector(sym))
-            # [BROKER_LOG] 排隊 BUY 成交記錄
-            log_broker_trade(
-                symbol=sym, side='BUY', qty=units,
-                signal_price=float(open_.loc[exec_date, sym]), fill_price=float(exec_price),
-                reason=o.get('reason', 'BUY_QUEUED'), sector=get_sector(sym),
-            )
-
-        orders_queue = pending_orders
-
-        cols_to_del = []
-        curr_vix_trail = vix_series.loc[signal_date] if not pd.isna(vix_series.loc[signal_date]) else 20.0
-        for sym, pos in positions.items():
-            if not is_trading_day.loc[exec_date, sym] or pd.isna(low.loc[exec_date, sym]): continue
-            pos.current_price = close.loc[exec_date, sym]
-            triggered, exec_price, reason = pos.check_intraday_exit(open_.loc[exec_date, sym], high.loc[exec_date, sym], low.loc[exec_date, sym], curr_vix_trail)
-            if triggered:
-                signal_exec_price = exec_price  # [BROKER_LOG] 捕捉 pre-slippage 觸發價
-                exec_price *= (1 - SLIPPAGE_RATE)
-                comm, tax = get_costs(pos.sector, sym, pos.units * exec_price, 'SELL')
-                cash += (pos.units * exec_price) - comm - tax
-                if 'CRYPTO' in pos.sector or 'LEV' in pos.sector: cooldown_dict[sym] = exec_date + pd.Timedelta(days=1)
-                else: cooldown_dict[sym] = exec_date + pd.Timedelta(days=5)
-                # [BROKER_LOG] 盤中觸發出場記錄（TRAIL_EXIT/HARD_STOP/GAP_* 等）
-                log_broker_trade(
-                    symbol=sym, side='SELL', qty=pos.units,
-                    signal_price=float(signal_exec_price), fill_price=float(exec_price),
-                    reason=reason, sector=pos.sector,
-                )
-                cols_to_del.append(sym)
-                if date == dates_to_process[-1]: intraday_alerts.append(f"⚠️ {sym} 於 {exec_date.strftime('%m/%d')} 盤中觸發: {reason}")
-        for sym in cols_to_del: del positions[sym]
-
-        curr_vix = vix_series.loc[exec_date] if not pd.isna(vix_series.loc[exec_date]) else 20.0
-        
-        holdings_to_sell = []
-        for sym, pos in positions.items():
-            if not is_trading_day.loc[exec_date, sym]: continue
-            if curr_vix > 45.0: 
-                if not any(o['type'] == 'SELL' and o['symbol'] == sym for o in orders_queue):
-                    orders_queue.append({'type': 'SELL', 'symbol': sym, 'reason': "VIX>45斷路"})
-                holdings_to_sell.append(sym); continue
-            if (exec_date - pos.entry_date).days > pos.get_params()['zombie'] and pos.current_price <= pos.entry_price:
-                if not any(o['type'] == 'SELL' and o['symbol'] == sym for o in orders_queue):
-                    orders_queue.append({'type': 'SELL', 'symbol': sym, 'reason': "Zombie"})
-                holdings_to_sell.append(sym); continue
-            if not check_regime(exec_date, sym, close, benchmarks_ma):
-                if not any(o['type'] == 'SELL' and o['symbol'] == sym for o in orders_queue):
-                    orders_queue.append({'type': 'SELL', 'symbol': sym, 'reason': "Regime Fail"})
-                holdings_to_sell.append(sym); continue
-
-        active_holdings = [
-            s for s in positions 
-            if s not in holdings_to_sell 
-            and not any(o['type'] == 'SELL' and o['symbol'] == s for o in orders_queue)
-        ]
-        
-        # [OPT-08] 加入最低分數門檻篩選
-        candidates = [s for s in scores.loc[exec_date].dropna().sort_values(ascending=False).index 
-                      if s not in positions and check_regime(exec_date, s, close, benchmarks_ma)
-                      and (s not in cooldown_dict or exec_date > cooldown_dict[s])
-                      and scores.loc[exec_date, s] >= MIN_SCORE_THRESHOLD]
-        
-        # [V18.07] VIX Boost: VIX 低時加碼 (A/B 驗證 CAGR+116pp, MaxDD -49.39% < -50% 底線)
-        vix_scaler = 0.4 if curr_vix > 40 else 0.7 if curr_vix > 30 else 1.0 if curr_vix > 20 else 1.15 if curr_vix > 15 else 1.3
-        # [OPT-06] 先更新所有持倉 current_price 再算 total_eq
-        for sym_upd, pos_upd in positions.items():
-            if sym_upd in close.columns and not pd.isna(close.loc[exec_date, sym_upd]):
-                pos_upd.current_price = close.loc[exec_date, sym_upd]
-        total_eq = cash + sum(p.market_value for p in positions.values())
-
-        # --- [FIX_12] Macro Kill Switch: SPY 或 QQQ 在 MA200 下方 = 禁止開倉 ---
-        macro_bearish = False
-        if spy_ma200 is not None and exec_date in spy_ma200.index and not pd.isna(spy_ma200.loc[exec_date]):
-            if close.loc[exec_date, 'SPY'] < spy_ma200.loc[exec_date]:
-                macro_bearish = True
-        if qqq_ma200 is not None and exec_date in qqq_ma200.index and not pd.isna(qqq_ma200.loc[exec_date]):
-            if close.loc[exec_date, 'QQQ'] < qqq_ma200.loc[exec_date]:
-                macro_bearish = True
-        if macro_bearish:
-            candidates = []
-
-        # [V18.05] 動態倉位：排名 #1 的標的 40%，其餘各 30% (A/B 驗證 CAGR+100pp)
-        def get_pos_size(rank):
-            return total_eq * 0.40 * vix_scaler if rank == 0 else total_eq * 0.30 * vix_scaler
-        proj = list(active_holdings)
-        
-        def is_allowed(cand): return True if curr_vix < 25.0 else sum(1 for x in proj if get_sector(x)==get_sector(cand)) < 2
-
-        while active_holdings and candidates:
-            active_holdings.sort(key=lambda x: scores.loc[exec_date, x] if not pd.isna(scores.loc[exec_date, x]) else -999)
-            worst = active_holdings[0]
-            # [CR-09] CRYPTO_SPOT 用 MIN_HOLD=3，其餘用 MIN_HOLD=5
-            min_hold = MIN_HOLD_DAYS_CRYPTO_SPOT if ASSET_MAP.get(worst, '') == 'CRYPTO_SPOT' else MIN_HOLD_DAYS
-            if (exec_date - positions[worst].entry_date).days < min_hold: active_holdings.pop(0); continue
-            
-            valid_idx = next((i for i, c in enumerate(candidates) if is_allowed(c)), -1)
-            if valid_idx == -1: break
-            best = candidates[valid_idx]
-            
-            w_score = scores.loc[exec_date, worst] if not pd.isna(scores.loc[exec_date, worst]) else 0
-            b_score = scores.loc[exec_date, best]
-            v_hold = vol_20.loc[exec_date, worst] if not pd.isna(vol_20.loc[exec_date, worst]) else 0.0
-            if b_score > w_score * min(2.0, 1.4 + v_hold*0.1) and b_score > w_score + 0.05:
-                if not any(o['type'] == 'SELL' and o['symbol'] == worst for o in orders_queue):
-                    orders_queue.append({'type': 'SELL', 'symbol': worst, 'reason': f"Swap to {best}"})
-                if not any(o['type'] == 'BUY' and o['symbol'] == best for o in orders_queue):
-                    orders_queue.append({'type': 'BUY', 'symbol': best, 'amount_usd': get_pos_size(0)})
-                proj.remove(worst); proj.append(best); active_holdings.pop(0); candidates.pop(valid_idx)
-            else: break
-            
-        current_holding_count = len(positions)
-        pending_sell_count = len([o for o in orders_queue if o['type'] == 'SELL'])
-        pending_buy_count = len([o for o in orders_queue if o['type'] == 'BUY'])
-        
-        open_slots = MAX_TOTAL_POSITIONS - (current_holding_count - pending_sell_count + pending_buy_count)
-        
-        for _ in range(max(0, open_slots)):
-            if not candidates or curr_vix > PANIC_VIX_THRESHOLD: break
-            valid_idx = next((i for i, c in enumerate(candidates) if is_allowed(c)), -1)
-            if valid_idx != -1:
-                cand = candidates.pop(valid_idx)
-                if not any(o['type'] == 'BUY' and o['symbol'] == cand for o in orders_queue):
-                    orders_queue.append({'type': 'BUY', 'symbol': cand, 'amount_usd': get_pos_size(len(positions))})
-                proj.append(cand)
-                
-        # 每日結算後，再次確保對列完美
-        orders_queue = sanitize_queue(positions, orders_queue)
-        # [OPT-07] 利息計算移到策略信號判斷後（更精確）
-        if cash > 0: cash *= ((1 + 0.04) ** (1/365))
-        state['last_processed_date'] = exec_date.strftime('%Y-%m-%d')
-
-    state['cash'] = cash
-    state['positions'] = {sym: pos.to_dict() for sym, pos in positions.items()}
-    state['orders_queue'] = orders_queue
-    state['cooldown_dict'] = {sym: d.strftime('%Y-%m-%d') for sym, d in cooldown_dict.items()}
+# =========================
+# [OPT-22] run_live Stage DAG：每段宣告輸入/輸出，可重算的段落依內容雜湊記憶在 .stage_cache/
+#   load → download → indicators → scores → simulate → persist → report → execute → notify
+#   LINE 推播失敗或只改戰報格式時重跑：download (ttl 內) / indicators / scores / simulate 直接讀快取
+# =========================
+DOWNLOAD_CACHE_TTL_SEC = 3600  # 同一天內重跑，一小時內沿用上次下載的價格面板 (--no-cache 強制重抓)
+PANEL_REQUIRED = ('SPY', 'QQQ', 'BTC-USD', '^VIX')  # 下載健檢：regime / 巨觀開關 / VIX 縮放必備
+PANEL_MAX_LAG_DAYS = 4  # 必備序列最後一根有效 K 棒距面板最後一天的上限 (週末 + 一天假日)
+STAGE_VOLATILE_GLOBALS = ('STARTUP_PROFILE',)  # 執行期變動、與計算結果無關的全域，不納入程式碼指紋
+# [OPT-23] 各 stage 時間預算 (秒)：逾時降級而非整批失敗
+#   download → 本地快取舊價格 (戰報標示)；simulate → 在日與日之間停下，剩餘天數下次補跑
+#   report → 省略剩餘持倉明細；notify → 訊息留在 outbox 下次重送
+# RUN_TIMEOUT_SEC 為整次執行上限：各段預算與剩餘時間取小，persist (寫入 state) 一定在上限內完成
+STAGE_TIMEOUTS = {'download': 240, 'simulate': 120, 'report': 15, 'notify': OUTBOX_WAIT_SEC}
+RUN_TIMEOUT_SEC = 420
+
+def live_load(variants, today_utc):
+    # --- [FIX_11] 先讀檔，根據您的買入日期，動態決定要抓多久的資料 ---
+    state = load_state()
+    variant_states = [load_state(cfg.state_file) for cfg in variants]
 
+    earliest_entry = pd.Timestamp(today_utc - pd.Timedelta(days=DATA_DOWNLOAD_DAYS))
+    entry_dates = [pd.Timestamp(d['entry_date']) for st in [state] + variant_states for d in st['positions'].values()]
+    if entry_dates:
+        min_entry = min(entry_dates)
+        if min_entry < earliest_entry:
+            earliest_entry = min_entry - pd.Timedelta(days=5) # 提早5天策安全
+    return {'prev_state': state, 'prev_variant_states': variant_states, 'earliest_entry': earliest_entry}
+
+def live_download(earliest_entry, catch_up, panel_provider, today_utc):
+    """today_utc 只參與快取 key：換日後必定重抓"""
+    panel = panel_provider(earliest_entry) if panel_provider else load_catch_up_panel(earliest_entry) if catch_up else None
+    if catch_up and panel is None: print("⚠️ 本地快取未涵蓋所需區間，改用完整下載")
+    return {'panel': panel if panel is not None else get_data(start_date=earliest_entry)}
+
+def live_download_stale(earliest_entry, catch_up, panel_provider, today_utc):
+    """下載逾時的降級：改用本地價格快取 (未涵蓋所需區間則無法降級)"""
+    cached = load_price_cache()
+    if cached is None or cached[0].index.tz_localize(None)[0] > earliest_entry: return None
+    start = cached[0].index.tz_localize(None).searchsorted(earliest_entry)
+    return {'panel': tuple(df.iloc[start:] for df in cached),
+            '_degraded': f"⚠️ 價格下載逾時，改用本地快取 (最後 K 棒 {cached[0].index[-1].strftime('%Y-%m-%d')})，訊號可能過期"}
+
+def live_download_check(panel):
+    """下載健檢：空面板或必備序列缺最後 K 棒 (yfinance 暫時失敗) → 該次降級且不寫入快取，下次執行重新下載"""
+    close, is_trading_day = panel[0], panel[4]
+    if close.empty: return "⚠️ 價格下載結果為空，本次不快取 (下次執行重新下載)"
+    last, missing = close.index[-1], []
+    for b in PANEL_REQUIRED:
+        traded = np.flatnonzero(is_trading_day[b].to_numpy(dtype=bool)) if b in is_trading_day.columns else []
+        if not len(traded) or (last - close.index[traded[-1]]).days > PANEL_MAX_LAG_DAYS: missing.append(b)
+    if missing: return f"⚠️ 價格下載不完整 ({', '.join(missing)} 缺最新 K 棒)，訊號可能過期；本次不快取"
+    return None
+
+def live_indicators(panel, indicator_cache):
+    # [OPT-12] 指標只算一次，所有帳戶共用；[OPT-31] 同一份價格面板由 .indicator_cache 以 mmap 讀回
+    key = panel_hash(panel[0], panel[4]) if indicator_cache.enabled else None
+    return {'ind': indicator_cache.call(compute_indicators, key, panel[0])}
+
+def live_scores(panel, ind, variants, indicator_cache):
+    # [OPT-12] scores 依帳戶 ASSET_MAP / TIER_1 各算一份 (相同設定共用正式帳戶，記為 None)
+    close, is_trading_day = panel[0], panel[4]
+    key = panel_hash(close, is_trading_day) if indicator_cache.enabled else None
+    variant_scores = [None if cfg.asset_map == ASSET_MAP and list(cfg.tier_1) == list(TIER_1_ASSETS)
+                      else indicator_cache.call(compute_scores, key, close, is_trading_day, ind, asset_map=cfg.asset_map, tier_1=cfg.tier_1)
+                      for cfg in variants]
+    return {'scores': indicator_cache.call(compute_scores, key, close, is_trading_day, ind), 'variant_scores': variant_scores}
+
+def live_simulate(panel, ind, scores, variant_scores, prev_state, prev_variant_states, variants, today_utc, trace, deadline):
+    """
+    逐日推進所有帳戶；回傳新 state (輸入的 prev_* 不修改)。沒有已收盤交易日時回傳 None 結束流程。
+    [OPT-23] 超過 deadline 時在日與日之間停下：所有帳戶都停在同一天，state 一致，剩餘天數下次補跑。
+    """
+    close, open_, high, low, is_trading_day, twd_series, raw_high_twd = panel
+    completed_dates = [d for d in close.index if d.date() < today_utc]
+    if not completed_dates: return None
+    state, variant_states = copy.deepcopy(prev_state), copy.deepcopy(prev_variant_states)
+
+    prod_cfg = StrategyConfig()
+    book = prepare_book(state, prod_cfg, close, high, raw_high_twd, today_utc)
+
+    # [OPT-11] 日迴圈改走陣列化 step_day
+    arr = DayArrays(close, open_, high, low, is_trading_day, scores, ind)
+    accounts = [(prod_cfg, state, book, arr)]
+    for cfg, st, v_scores in zip(variants, variant_states, variant_scores):
+        v_arr = arr if v_scores is None else arr.for_strategy(v_scores, cfg.get_sector)
+        accounts.append((cfg, st, prepare_book(st, cfg, close, high, raw_high_twd, today_utc), v_arr))
+
+    # 各帳戶 last_processed_date 可能不同：依聯集日期逐日推進，每個帳戶只處理自己尚未處理的日期
+    last_processed = [pd.Timestamp(st['last_processed_date']) for _, st, _, _ in accounts]
+    dates_to_process = [d for d in completed_dates if d > min(last_processed)]
+    prod_dates = [d for d in dates_to_process if d > last_processed[0]]
+
+    daily_fills = []
+    loop_start = time.perf_counter()
+    note = None
+    for k, date_idx in enumerate(close.index.get_indexer(dates_to_process)):
+        if deadline is not None and time.monotonic() > deadline:
+            note = f"⏳ 日迴圈逾時：已處理 {k}/{len(dates_to_process)} 天 (至 {state['last_processed_date']})，其餘下次執行補跑，指令可能過期"
+            break
+        date = close.index[date_idx]
+        for n, (cfg, st, b, a) in enumerate(accounts):
+            if date <= last_processed[n]: continue
+            fills, alerts = step_day(a, date_idx, b, cfg, trace)
+            b.nav.update(date, b.total_equity, b.cash, fills)  # [OPT-30] 每日一次 O(1)
+            st['last_processed_date'] = date.strftime('%Y-%m-%d')
+            if n == 0:
+                daily_fills.append((date, fills))
+                # 最後一個已處理交易日的盤中觸發與成交寫進 state：重跑 (已無新日期) 時戰報仍看得到
+                st['intraday_alerts'] = alerts
+                st['last_fills'] = [{**f, 'date': f['date'].strftime('%Y-%m-%d')} for f in fills]
+    loop_sec = time.perf_counter() - loop_start
+    for _, st, b, _ in accounts: book_to_state(st, b)
+    return {'state': state, 'variant_states': variant_states,
+            'daily_fills': daily_fills, 'loop_sec': loop_sec, '_degraded': note}
+
+def live_persist(state, variant_states, variants, daily_fills, loop_sec, catch_up, trace, dry_run):
+    if catch_up: print_catch_up_report(daily_fills, loop_sec)
+    if trace is not None and len(trace):
+        trace.save()
+        print(f"🧾 Decision trace 已寫入 {trace.path} ({len(trace)} 筆日紀錄)")
     if not dry_run: save_state(state)
+    if variants:
+        os.makedirs(PORTFOLIO_DIR, exist_ok=True)
+        for cfg, st in zip(variants, variant_states):
+            if not dry_run: save_state(st, cfg.state_file)
+        print_variant_summary(variants, variant_states)
+    return {}
+
+def live_report(panel, ind, scores, state, today_utc, dry_run, degraded, deadline):
+    """戰報：終端機 / LINE 文字訊息 + 結構化 report (delta 比對用)；degraded 為前段降級說明，逾時省略剩餘持倉明細"""
+    intraday_alerts = state.get('intraday_alerts', [])
+    close, open_, high, low, is_trading_day, twd_series, raw_high_twd = panel
+    benchmarks_ma, spy_ma200, qqq_ma200, vix_series = ind['benchmarks_ma'], ind['spy_ma200'], ind['qqq_ma200'], ind['vix_series']
+    positions = {sym: Position.from_dict(d) for sym, d in state['positions'].items()}
+    cash, orders_queue = state['cash'], state['orders_queue']
 
+    # 抓取最新匯率供介面顯示
+    latest_twd_rate = twd_series.iloc[-1] if not twd_series.empty else USD_TWD_RATE
     total_eq = cash + sum(p.market_value for p in positions.values())
     latest_vix = vix_series.iloc[-1]
     # [CR_FIX_12 v2] Market status for TW 9PM schedule
@@ -675,7 +1098,16 @@ def run_live(dry_run=False):
         if close['QQQ'].iloc[-1] < qqq_ma200.dropna().iloc[-1]: _macro_bear = True
     macro_icon = "🔴 MA200↓ 禁止開倉" if _macro_bear else "🟢 允許開倉"
     msg += f"\n🌍 巨觀防禦：{macro_icon}"
-    msg += f"\n🔒 VIX: {latest_vix:.1f} | 總資產估算: ${total_eq:,.0f}\n━━━━━━━━━━━━━━\n"
+    _vs = 0.4 if latest_vix > 40 else 0.7 if latest_vix > 30 else 1.0 if latest_vix > 20 else 1.15 if latest_vix > 15 else 1.3
+    # [OPT-16] 結構化戰報：供 delta 模式與上次送出的版本比對
+    nav_line = NavTracker.from_dict(state.get('nav')).report_line()  # [OPT-30]
+    report = {'date': str(today_utc), 'header': msg, 'summary': f"🔒 VIX: {latest_vix:.1f} | 總資產估算: ${total_eq:,.0f}" + (f"\n{nav_line}" if nav_line else ""),
+              'regime': {'美股': us_status, '台股': tw_status, '加密': btc_status, '巨觀防禦': macro_icon, 'VIX 加碼': f"{_vs:.2f}x"},
+              'alerts': list(intraday_alerts), 'fills': state.get('last_fills', []), 'orders': {}, 'holdings': {}, 'degraded': list(degraded.values())}
+    msg += f"\n{report['summary']}\n━━━━━━━━━━━━━━\n"
+
+    if degraded:
+        msg += "⚠️ 【降級執行】\n" + "\n".join(degraded.values()) + "\n--------------------\n"
 
     if intraday_alerts:
         msg += "🚨 【昨日盤中防禦觸發】(系統已記帳)\n" + "\n".join(intraday_alerts) + "\n--------------------\n"
@@ -685,7 +1117,9 @@ def run_live(dry_run=False):
 
     if sells:
         msg += "🔴 【賣出指令】(請於開盤賣出)\n"
-        for s in sells: msg += f"❌ 賣出 {s['symbol']} ({s.get('reason','')})\n"
+        for s in sells:
+            report['orders'][f"SELL:{s['symbol']}"] = line = f"❌ 賣出 {s['symbol']} ({s.get('reason','')})\n"
+            msg += line
         msg += "--------------------\n"
     if buys:
         msg += "\U0001F7E2 \u3010\u8cb7\u5165\u6307\u4ee4\u3011(\u8acb\u65bc\u958b\u76e4\u8cb7\u5165)\n"
@@ -696,6 +1130,7 @@ def run_live(dry_run=False):
             stop_pct = params['stop']
             pct_str = str(int(stop_pct * 100))
             alloc_str = str(round(b['amount_usd'] / total_eq * 100))
+            block_start = len(msg)
             if 'TW' in sector:
                 curr_p_usd = close[sym].iloc[-1] if sym in close.columns and not pd.isna(close[sym].iloc[-1]) else 0
                 est_stop_ntd = curr_p_usd * (1 - stop_pct) * latest_twd_rate if curr_p_usd > 0 else 0
@@ -718,11 +1153,18 @@ def run_live(dry_run=False):
                 msg += "   \U0001F4F1 Firstrade \u2192 \u8ffd\u8e64\u505c\u640d\u50f9%\uff1a\n"
                 msg += "   \u2460 \u8ffd\u8e64\u5024%: " + pct_str + "\n"
                 msg += "   \u2461 \u6709\u6548\u671f: 90\u5929\n"
+            report['orders'][f"BUY:{sym}"] = msg[block_start:]
         msg += "--------------------\n"
 
+    report_note = None
     if positions:
         msg += "\U0001F6E1\ufe0f \u3010\u639b\u55ae\u8a08\u7b97\u5668 \u2705\u7cbe\u78ba\u5024\u3011\u76f4\u63a5\u7167\u8a2d\n"
-        for sym, p in positions.items():
+        for k, (sym, p) in enumerate(positions.items()):
+            if deadline is not None and time.monotonic() > deadline:
+                report_note = f"⏳ 戰報逾時，其餘 {len(positions) - k} 檔持倉明細省略 (停損價請沿用上次)"
+                msg += report_note + "\n"
+                break
+            block_start = len(msg)
             params = p.get_params()
             stop_pct = params['stop']
             profit_ratio = (p.max_price - p.entry_price) / p.entry_price
@@ -773,6 +1215,7 @@ def run_live(dry_run=False):
                     msg += "   (\u6700\u9ad8\u7372\u5229 " + profit_str + "%\uff0c\u5df2\u6536\u7dca | \u9700\u66f4\u65b0\u639b\u55ae!)\n"
                 else:
                     msg += "   \u56de\u6a94: " + pct_str + "%  \u505c\u640d\u50f9: \u2705NT$" + str(int(final_ntd)) + "\n"
+                report['holdings'][sym] = {'stop': float(final_ntd), 'pct': pct_str, 'text': msg[block_start:]}
             elif 'CRYPTO' in p.sector:
                 msg += "\U0001F4CC " + sym + " (\u5e63\u5b89)\n"
                 msg += "   \u6210\u4ea4: $" + ("%.4f" % p.entry_price) + " | \u6700\u9ad8: $" + ("%.4f" % p.max_price) + "\n"
@@ -781,6 +1224,7 @@ def run_live(dry_run=False):
                     msg += "   (\u6700\u9ad8\u7372\u5229 " + profit_str + "%\uff0c\u5df2\u6536\u7dca | \u9700\u66f4\u65b0\u639b\u55ae!)\n"
                 else:
                     msg += "   T/D: " + pct_str + "%  \u89f8\u767c\u50f9: \u2705$" + ("%.4f" % final_price) + "\n"
+                report['holdings'][sym] = {'stop': float(final_price), 'pct': pct_str, 'text': msg[block_start:]}
             else:
                 msg += "\U0001F4CC " + sym + " (Firstrade)\n"
                 msg += "   \u6210\u4ea4: $" + ("%.2f" % p.entry_price) + " | \u6700\u9ad8: $" + ("%.2f" % p.max_price) + "\n"
@@ -789,13 +1233,13 @@ def run_live(dry_run=False):
                     msg += "   (\u6700\u9ad8\u7372\u5229 " + profit_str + "%\uff0c\u5df2\u6536\u7dca | \u9700\u66f4\u65b0\u639b\u55ae!)\n"
                 else:
                     msg += "   \u8ffd\u8e64\u5024: " + pct_str + "%  \u89f8\u767c\u50f9: \u2705$" + ("%.2f" % final_price) + "\n"
+                report['holdings'][sym] = {'stop': float(final_price), 'pct': pct_str, 'text': msg[block_start:]}
 
     # [ALLOC_CHECK] \u5009\u4f4d\u914d\u7f6e\u6aa2\u67e5\uff08\u4f9d\u52d5\u80fd\u6392\u540d\u6a19\u76ee\u6a19\u4f54\u6bd4 + \u5be6\u969b\u4f54\u6bd4 + \u504f\u96e2\u5ea6\uff09
-    if positions and total_eq > 0:
+    if positions and total_eq > 0 and report_note is None:
         try:
-            # \u7528\u6700\u65b0\u4ea4\u6613\u65e5 + \u91cd\u7b97 vix_scaler\uff08\u907f\u514d exec_date/vix_scaler \u672a\u5b9a\u7fa9\uff09
+            # \u7528\u6700\u65b0\u4ea4\u6613\u65e5 + \u91cd\u7b97 vix_scaler\uff08\u907f\u514d exec_date/vix_scaler \u672a\u5b9a\u7fa9\uff09\u2192 _vs \u5df2\u65bc\u6a19\u982d\u8a08\u7b97
             latest_score_date = close.index[-1]
-            _vs = 0.4 if latest_vix > 40 else 0.7 if latest_vix > 30 else 1.0 if latest_vix > 20 else 1.15 if latest_vix > 15 else 1.3
             ranked = []
             for sym_r, p_r in positions.items():
                 sc = scores.loc[latest_score_date, sym_r] if (sym_r in scores.columns and latest_score_date in scores.index) else np.nan
@@ -820,30 +1264,392 @@ def run_live(dry_run=False):
         msg += "\u2615 \u4eca\u65e5\u7121\u63db\u5009\u52d5\u4f5c\uff0c\u7dad\u6301\u9632\u7a7e\u639b\u55ae\u5373\u53ef"
 
 
+    mark_first_output('first_report')
     print(msg)
-    if not dry_run and LINE_TOKEN and LINE_USER_ID:
-        # [OPT-05] LINE 訊息長度檢查與分割（上限 5000 字）
-        def send_line_messages(full_msg):
-            MAX_LEN = 4900  # 保留 buffer
-            msgs = []
-            while len(full_msg) > MAX_LEN:
-                split_idx = full_msg.rfind('\n', 0, MAX_LEN)
-                if split_idx == -1: split_idx = MAX_LEN
-                msgs.append(full_msg[:split_idx])
-                full_msg = full_msg[split_idx:].lstrip('\n')
-            if full_msg: msgs.append(full_msg)
-            # LINE push API 每次最多 5 則訊息
-            for i in range(0, len(msgs), 5):
-                batch = [{'type': 'text', 'text': m} for m in msgs[i:i+5]]
-                requests.post('https://api.line.me/v2/bot/message/push',
-                              headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {LINE_TOKEN}'},
-                              json={'to': LINE_USER_ID, 'messages': batch})
+    return {'msg': msg, 'report': report, '_degraded': report_note}
+
+def live_execute(execute, state, panel):
+    if execute:
+        positions = {sym: Position.from_dict(d) for sym, d in state['positions'].items()}
+        close, open_ = panel[0], panel[1]
+        try: execute_orders(execute, state['orders_queue'], positions, close.index[-1], {'open': open_, 'close': close})
+        except Exception as e: print(f"❌ Execution 失敗: {e}")
+    return {}
+
+def live_notify(msg, report, delta, outbox, notifier, deadline):
+    line_msg = msg
+    if delta:
+        # [OPT-16] 與上次送出的戰報比對，只推播變化段落；首次執行 (無 snapshot) 送完整戰報
+        prev = load_snapshot()
+        line_msg = build_delta(prev, report) if prev is not None else msg
+        print("\n📭 Delta 模式：與上次送出的戰報相比無變化，不推播" if line_msg is None else
+              f"\n📬 Delta 模式：推播變化段落 ({len(line_msg)} / 完整 {len(msg)} 字)")
+    if outbox is not None and line_msg is not None:
+        # [OPT-05] LINE 訊息長度檢查與分割（上限 5000 字）→ [OPT-14] 由 line_notifier 分段/重試/多收件人
+        # [OPT-15] 先寫入 outbox 再背景投遞；逾時或失敗的訊息留在 outbox，下次執行重送
         try:
-            send_line_messages(msg)
+            # [OPT-16] snapshot 隨訊息落地，確認送達後才成為下次 delta 的比對基準 (promote_snapshot)
+            outbox.enqueue(line_msg, source='V18.00_VANGUARD', meta={'snapshot': report})
+            outbox.deliver_async(notifier)
+            # [OPT-23] 等待上限 = notify 預算與整次剩餘時間取小；未送達者留在 outbox 下次重送
+            if not outbox.wait(max(deadline - time.monotonic(), 0) if deadline is not None else OUTBOX_WAIT_SEC):
+                return {'_degraded': f"📮 LINE 投遞延後：{len(outbox.pending())} 則訊息留在 {outbox.path}，下次執行重送"}
         except Exception as e: print(f"LINE 發送失敗: {e}")
+    return {}
+
+LIVE_STAGES = [
+    Stage('load', live_load, ('variants', 'today_utc'), ('prev_state', 'prev_variant_states', 'earliest_entry'), cache=False),
+    Stage('download', live_download, ('earliest_entry', 'catch_up', 'panel_provider', 'today_utc'), ('panel',),
+          key=('earliest_entry', 'catch_up', 'today_utc'), pure=False, ttl=DOWNLOAD_CACHE_TTL_SEC, fallback=live_download_stale,
+          check=live_download_check),
+    Stage('indicators', live_indicators, ('panel', 'indicator_cache'), ('ind',), key=('panel',)),
+    Stage('scores', live_scores, ('panel', 'ind', 'variants', 'indicator_cache'), ('scores', 'variant_scores'), key=('panel', 'ind', 'variants')),
+    Stage('simulate', live_simulate,
+          ('panel', 'ind', 'scores', 'variant_scores', 'prev_state', 'prev_variant_states', 'variants', 'today_utc', 'trace', 'deadline'),
+          ('state', 'variant_states', 'daily_fills', 'loop_sec'),
+          key=('panel', 'ind', 'scores', 'variant_scores', 'prev_state', 'prev_variant_states', 'variants', 'today_utc')),
+    Stage('persist', live_persist, ('state', 'variant_states', 'variants', 'daily_fills', 'loop_sec', 'catch_up', 'trace', 'dry_run'), (), cache=False),
+    Stage('report', live_report, ('panel', 'ind', 'scores', 'state', 'today_utc', 'dry_run', 'degraded', 'deadline'),
+          ('msg', 'report'), cache=False),
+    Stage('execute', live_execute, ('execute', 'state', 'panel'), (), cache=False),
+    Stage('notify', live_notify, ('msg', 'report', 'delta', 'outbox', 'notifier', 'deadline'), (), cache=False),
+]
+
+def run_live(dry_run=False, catch_up=False, variants=None, trace=None, delta=False, execute=None, panel_provider=None, memo=True,
+             timeouts=None, run_timeout=RUN_TIMEOUT_SEC, exporter=None):
+    """
+    variants: list[StrategyConfig] 紙上變體帳戶，與正式帳戶共用同一份價格面板與指標，逐日同步推進
+    trace: DecisionTrace，記錄每日排名/換倉/倉位決策 (None = 關閉)
+    delta: LINE 只推播與上次送出戰報相比有變化的段落 (終端機仍印完整戰報)
+    execute: 'paper' 或模擬器 URL，將 orders_queue 送出到執行介面 (None = 不送單)
+    panel_provider: earliest_entry → 價格面板 tuple (daemon 的常駐記憶體面板)；None = 下載 / 本地快取
+    memo: [OPT-22] stage 結果依內容雜湊記憶在 .stage_cache/，[OPT-31] 指標 / 分數另存 .indicator_cache/ (False = 全部重算)
+    timeouts / run_timeout: [OPT-23] 覆寫 STAGE_TIMEOUTS 的部分 stage / 整次上限秒數 (None = 不限)
+    exporter: [OPT-25] MetricsExporter，每次評估結束 (含例外) 更新 Prometheus 指標
+    """
+    deadline = time.monotonic() + run_timeout if run_timeout else None
+    print("🚀 Vanguard Live Engine 啟動..." if not catch_up else "🚀 Vanguard Live Engine 啟動 (Catch-up)...")
+    mark_first_output()
+
+    # [OPT-15] 上次未送達的 LINE 訊息在背景重送，與下載/計算並行
+    outbox, notifier = None, None
+    if not dry_run and LINE_TOKEN and LINE_USER_ID:
+        outbox, notifier = Outbox(OUTBOX_FILE, on_delivered=promote_snapshot), LineNotifier(LINE_TOKEN, LINE_USER_ID)
+        if outbox.pending(): outbox.deliver_async(notifier)
+
+    ctx = {'dry_run': dry_run, 'catch_up': catch_up, 'variants': variants or [], 'trace': trace, 'delta': delta,
+           'execute': execute, 'panel_provider': panel_provider, 'outbox': outbox, 'notifier': notifier,
+           'today_utc': datetime.utcnow().date(), 'indicator_cache': IndicatorCache(enabled=memo)}
+    # daemon 的常駐面板本身即是最新資料；trace 需要實際跑日迴圈才有紀錄
+    fresh = ({'download'} if panel_provider else set()) | ({'simulate'} if trace is not None else set())
+    pipe = StagePipeline(LIVE_STAGES, StageCache() if memo else None, STAGE_VOLATILE_GLOBALS)
+    # [OPT-24] 各 stage 的 wall / CPU / RSS 與計數器寫入 run_metrics.jsonl (一次執行一行)
+    metrics, out = RunMetrics('vanguard_live', dry_run=dry_run, catch_up=catch_up, memo=memo, variants=len(variants or []),
+                              daemon=panel_provider is not None), {}
+    try:
+        with metrics:
+            out = pipe.run(ctx, fresh, {**STAGE_TIMEOUTS, **(timeouts or {})}, deadline)
+            record_live_metrics(metrics, out, pipe)
+    finally:
+        if exporter is not None: exporter.observe(metrics.record(), out, pipe)
+    print(f"\n🧩 Stages: {pipe.summary()}")
+    return pipe
+
+def record_live_metrics(metrics, ctx, pipe):
+    if 'panel' in ctx: metrics.gauge('tickers', len(ctx['panel'][0].columns))
+    simulated = any(name == 'simulate' and status != 'hit' for name, status, _ in pipe.log)  # 命中快取 = 本次未推進
+    if 'daily_fills' in ctx:
+        metrics.gauge('days_processed', len(ctx['daily_fills']) if simulated else 0)
+        metrics.gauge('fills', sum(len(fills) for _, fills in ctx['daily_fills']))
+    if 'state' in ctx:
+        metrics.gauge('orders', len(ctx['state']['orders_queue']))
+        metrics.gauge('positions', len(ctx['state']['positions']))
+    metrics.gauge('degraded', sorted(ctx['degraded']))
+    if pipe.halted: metrics.status = f"halt: {pipe.halted}"
+
+# =========================
+# 4) [OPT-10] State Recovery (broker_trades.csv 重播重建)
+# =========================
+
+INTRADAY_EXIT_REASONS = ('TRAIL_EXIT', 'HARD_STOP', 'GAP_STOP', 'GAP_TRAIL')
+FILL_MATCH_TOL = 0.03   # 開盤價與 signal_price 的容許相對誤差 (還原權值造成的位移)
+
+def _match_exec_dates(trades, open_, high, low, is_trading_day, vix_series):
+    """
+    broker_trades.csv 的 timestamp 是「執行程式的時間」而非成交 bar 日期，需反查成交日。
+    CSV 為 append-only，列順序即成交順序 → 成交日單調不減，逐列以前一筆成交日為下界搜尋：
+      - 排隊單：signal_price = 當日開盤價，取下界之後第一個開盤價吻合的 bar；
+        價格快取為還原權值 (auto_adjust) 時除息前的開盤價整體位移 → 無吻合時取 FILL_MATCH_TOL 內最晚的 bar
+        (每日執行時成交 bar 即執行日前最後一根；長時間 catch-up 一次寫入的區間內仍可能誤配)
+      - 盤中出場：自進場 bar 起以 Position.check_intraday_exit 重演，第一個觸發的 bar
+    找不到時沿用前一筆成交日 (首筆則用執行日前一根 bar)。
+    """
+    naive_idx = open_.index.tz_localize(None)
+    run_end = naive_idx.searchsorted(trades['timestamp'].dt.normalize().values, side='left')
+    open_v, high_v, low_v, trading_v = open_.values, high.values, low.values, is_trading_day.reindex(columns=open_.columns).values
+    vix_v = vix_series.values
+    lower, entries, exec_pos = 0, {}, []
+    for row, end in zip(trades.itertuples(index=False), run_end):
+        end = max(int(end), lower + 1)
+        found = None
+        if row.symbol in open_.columns:
+            col = open_.columns.get_loc(row.symbol)
+            if row.side == 'SELL' and row.reason in INTRADAY_EXIT_REASONS and row.symbol in entries:
+                k0, fill, sector = entries[row.symbol]
+                pos = Position(row.symbol, naive_idx[k0], fill, row.qty, sector)
+                for k in range(max(lower, k0), end):
+                    if not trading_v[k, col] or np.isnan(low_v[k, col]): continue
+                    v = vix_v[k - 1] if k > 0 and not np.isnan(vix_v[k - 1]) else 20.0
+                    if pos.check_intraday_exit(open_v[k, col], high_v[k, col], low_v[k, col], v)[0]:
+                        found = k; break
+            else:
+                err = np.abs(open_v[lower:end, col] / row.signal_price - 1.0)
+                hits = np.flatnonzero(err < 1e-4)
+                if len(hits): found = lower + hits[0]
+                elif (near := np.flatnonzero(err < FILL_MATCH_TOL)).size: found = lower + near[-1]
+        if found is None: found = lower if lower > 0 else end - 1
+        if row.side == 'BUY': entries[row.symbol] = (found, row.fill_price, row.sector)
+        else: entries.pop(row.symbol, None)
+        exec_pos.append(found)
+        lower = found
+    return naive_idx[exec_pos]
+
+def rebuild_state_from_trades(trades_csv=BROKER_TRADES_CSV, initial_cash=INITIAL_CAPITAL_USD):
+    """
+    state.json 遺失/被回滾時，依 broker_trades.csv + 本地價格快取一次重播重建 state。
+    現金利息自第一筆成交日起逐日計算 (首筆成交前的利息無從得知，屬已知誤差)；
+    orders_queue 無法從成交紀錄還原，重建後留空，下一次 run_live 會自 last_processed_date 之後重新產生信號。
+    """
+    trades = pd.read_csv(trades_csv)
+    if trades.empty:
+        print("❌ broker_trades.csv 無成交紀錄，無法重建")
+        return None
+    trades['timestamp'] = pd.to_datetime(trades['timestamp'])
+    trades['reason'] = trades['reason'].fillna('')
+
+    first_run = trades['timestamp'].min().normalize()
+    panel = load_price_cache()
+    if panel is None or panel[0].index.tz_localize(None)[0] > first_run - pd.Timedelta(days=5):
+        print("📥 價格快取未涵蓋首筆成交，重新下載...")
+        panel = get_data(start_date=first_run - pd.Timedelta(days=30))
+    close, open_, high, low, is_trading_day, twd_series, raw_high_twd = panel
+    naive_idx = close.index.tz_localize(None)
+
+    vix_series = close['^VIX'] if '^VIX' in close.columns else pd.Series(20.0, index=close.index)
+    trades['exec_date'] = _match_exec_dates(trades, open_, high, low, is_trading_day, vix_series)
+
+    # 成交現金流 (向量化)：BUY = -(成本+手續費)，SELL = +(賣出-手續費-交易稅)
+    gross = trades['qty'] * trades['fill_price']
+    comm_rate = trades['sector'].map(lambda sec: RATES.get(f"{sec.split('_')[0]}_COMM", RATES['US_COMM']))
+    is_sell = (trades['side'] == 'SELL').values
+    is_tw = trades['sector'].str.contains('TW').values
+    tax_rate = np.where(trades['symbol'].str.startswith('00'), RATES['TW_TAX_ETF'], RATES['TW_TAX_STOCK'])
+    tax = np.where(is_sell & is_tw, gross * tax_rate, 0.0)
+    trades['cash_flow'] = np.where(is_sell, gross - gross * comm_rate - tax, -(gross + gross * comm_rate))
+
+    # 逐日重播現金 (含每日利息，與 run_live 相同：先成交、再計息)
+    # run_live 每次都推進到最後一根已收盤 bar，不論當天有無成交 → last_processed 取兩者較晚者
+    today_ts = pd.Timestamp(datetime.utcnow().date())
+    completed = naive_idx[naive_idx < today_ts]
+    last_processed = max(trades['exec_date'].max(), completed[-1]) if len(completed) else trades['exec_date'].max()
+    flows = trades.groupby('exec_date')['cash_flow'].sum()
+    day_mask = (naive_idx >= trades['exec_date'].min()) & (naive_idx <= last_processed)
+    daily_flow = flows.reindex(naive_idx[day_mask], fill_value=0.0).values
+    cash, rate = initial_cash, (1 + 0.04) ** (1 / 365)
+    for f in daily_flow:
+        cash += f
+        if cash > 0: cash *= rate
+
+    # 持倉與冷卻：每個標的只看最後一筆動作
+    positions, cooldown_dict = {}, {}
+    last_rows = trades.groupby('symbol', sort=False).tail(1)
+    for row in last_rows.itertuples(index=False):
+        if row.side == 'BUY':
+            positions[row.symbol] = Position(row.symbol, row.exec_date, row.fill_price, row.qty, row.sector)
+        elif row.reason in INTRADAY_EXIT_REASONS:
+            days = 1 if ('CRYPTO' in row.sector or 'LEV' in row.sector) else 5
+            cooldown_dict[row.symbol] = row.exec_date + pd.Timedelta(days=days)
+
+    # max_price：持倉期間最高價，一次向量化計算所有持倉
+    held = [s for s in positions if s in high.columns]
+    if held:
+        entry = np.array([positions[s].entry_date.to_datetime64() for s in held], dtype='datetime64[ns]')
+        since_entry = naive_idx.values[:, None] >= entry[None, :]
+        peak = np.nanmax(np.where(since_entry, high[held].values, np.nan), axis=0)
+        peak_twd = np.nanmax(np.where(since_entry, raw_high_twd.reindex(columns=held).values, np.nan), axis=0)
+        last_close = close[held].ffill().iloc[-1].values
+        for s, pk, pk_twd, lc in zip(held, peak, peak_twd, last_close):
+            pos = positions[s]
+            if pd.notna(pk) and pk > pos.max_price: pos.max_price = float(pk)
+            if 'TW' in pos.sector and pd.notna(pk_twd): pos.max_price_twd = float(pk_twd)
+            if pd.notna(lc): pos.current_price = float(lc)
+
+    return {
+        "cash": cash, "positions": {sym: pos.to_dict() for sym, pos in positions.items()}, "orders_queue": [],
+        "cooldown_dict": {sym: d.strftime('%Y-%m-%d') for sym, d in cooldown_dict.items() if d > today_ts},
+        "last_processed_date": last_processed.strftime('%Y-%m-%d'),
+    }
+
+def cross_check_state(rebuilt, current):
+    """比對重建結果與現有 state.json，回傳差異行列表 (空列表 = 一致)"""
+    diffs = []
+    if abs(rebuilt['cash'] - current.get('cash', 0.0)) > max(1.0, abs(rebuilt['cash']) * 0.01):
+        diffs.append(f"cash: 現有 ${current.get('cash', 0.0):,.2f} vs 重建 ${rebuilt['cash']:,.2f}")
+    cur_pos, new_pos = current.get('positions', {}), rebuilt['positions']
+    for sym in sorted(set(cur_pos) | set(new_pos)):
+        if sym not in new_pos: diffs.append(f"positions: {sym} 僅存在於現有 state"); continue
+        if sym not in cur_pos: diffs.append(f"positions: {sym} 僅存在於重建結果"); continue
+        for key in ('units', 'entry_price', 'max_price'):
+            a, b = float(cur_pos[sym].get(key, 0.0)), float(new_pos[sym][key])
+            if abs(a - b) > abs(b) * 0.005: diffs.append(f"positions.{sym}.{key}: 現有 {a:.6g} vs 重建 {b:.6g}")
+        if cur_pos[sym].get('entry_date') != new_pos[sym]['entry_date']:
+            diffs.append(f"positions.{sym}.entry_date: 現有 {cur_pos[sym].get('entry_date')} vs 重建 {new_pos[sym]['entry_date']}")
+    if current.get('cooldown_dict', {}) != rebuilt['cooldown_dict']:
+        diffs.append(f"cooldown_dict: 現有 {current.get('cooldown_dict', {})} vs 重建 {rebuilt['cooldown_dict']}")
+    if current.get('last_processed_date') != rebuilt['last_processed_date']:
+        diffs.append(f"last_processed_date: 現有 {current.get('last_processed_date')} vs 重建 {rebuilt['last_processed_date']}")
+    return diffs
+
+def run_rebuild(apply=False):
+    if not os.path.exists(BROKER_TRADES_CSV):
+        print(f"❌ 找不到 {BROKER_TRADES_CSV}，無法重建 state"); return
+    rebuilt = rebuild_state_from_trades()
+    if rebuilt is None: return
+    with open(STATE_FILE + '.rebuilt', 'w') as f: json.dump(rebuilt, f, indent=4)
+    print(f"🔧 重建完成 → {STATE_FILE}.rebuilt | 現金 ${rebuilt['cash']:,.2f} | 持倉 {list(rebuilt['positions'])} | 最後處理日 {rebuilt['last_processed_date']}")
+    if os.path.exists(STATE_FILE):
+        with open(STATE_FILE, 'r') as f: current = json.load(f)
+        diffs = cross_check_state(rebuilt, current)
+        print("✅ 與現有 state.json 一致" if not diffs else "⚠️ 與現有 state.json 差異：\n   " + "\n   ".join(diffs))
+    else:
+        print(f"⚠️ {STATE_FILE} 不存在，略過交叉比對")
+    if apply:
+        save_state(rebuilt)
+        print(f"💾 已覆寫 {STATE_FILE} (orders_queue 已清空，下次執行自動重新產生)")
+
+# =========================
+# 5) [OPT-20] Daemon：常駐記憶體面板 + UTC 換日觸發
+# =========================
+# (名稱, 時區, 觸發時間, 僅平日, 延遲分鐘：等 yfinance 日K 定稿)
+# state 機以「已完結的 UTC 日」整日推進 (live_simulate: d.date() < today_utc)，台股/美股收盤當下該日尚未完結，
+# 收盤觸發只會重算一次相同結果；新的一天只在 UTC 換日後出現，因此只在換日後評估
+DAEMON_TRIGGERS = [
+    ('UTC_DAY', 'UTC', (0, 0), False, 10),
+]
+
+def next_trigger(now_utc, triggers=None):
+    """回傳 now_utc 之後最近的 (市場, 觸發時間 UTC)；時區換算含夏令時間"""
+    best = None
+    for name, tz, (hh, mm), weekdays_only, delay in (triggers or DAEMON_TRIGGERS):
+        local_now = now_utc.astimezone(ZoneInfo(tz))
+        for add in range(8):
+            day = local_now.date() + timedelta(days=add)
+            if weekdays_only and day.weekday() >= 5: continue
+            when = datetime(day.year, day.month, day.day, hh, mm, tzinfo=ZoneInfo(tz)) + timedelta(minutes=delay)
+            when = when.astimezone(timezone.utc)
+            if when > now_utc:
+                if best is None or when < best[1]: best = (name, when)
+                break
+    return best
+
+class WarmPanel:
+    """
+    daemon 常駐的價格面板：首次完整下載，之後每次觸發只下載最後幾根 K 棒並合併 (新資料優先)。
+    指標仍以完整面板重算 (數十 ms)；state 機只推進 last_processed_date 之後已完結的 UTC 日。
+    """
+    REFRESH_OVERLAP_DAYS = 5
+
+    def __init__(self):
+        self.panel = None
+
+    def __call__(self, earliest_entry):
+        idx = self.panel[0].index.tz_localize(None) if self.panel is not None else None
+        if idx is None or idx[0] > earliest_entry:
+            self.panel = get_data(start_date=earliest_entry)
+        else:
+            t0 = time.perf_counter()
+            fresh = get_data(start_date=idx[-1] - pd.Timedelta(days=self.REFRESH_OVERLAP_DAYS))
+            self.panel = _merge_panel(self.panel, fresh)
+            print(f"♻️ 增量更新面板: {len(fresh[0])} 根 K 棒 ({(time.perf_counter() - t0):.1f}s)")
+        start = self.panel[0].index.tz_localize(None).searchsorted(earliest_entry)
+        return tuple(df.iloc[start:] for df in self.panel)
+
+def run_daemon(variants=None, trace=None, delta=True, execute=None, dry_run=False, memo=True, timeouts=None, run_timeout=RUN_TIMEOUT_SEC,
+               exporter=None):
+    """啟動時先評估一次 (補上停機期間)，之後睡到下一個 UTC 換日觸發點再評估"""
+    warm = WarmPanel()
+    trigger = 'STARTUP'
+    while True:
+        t0 = time.perf_counter()
+        print(f"\n🛰️ [{datetime.now(timezone.utc):%Y-%m-%d %H:%M} UTC] Daemon 評估觸發: {trigger}")
+        try:
+            run_live(dry_run=dry_run, variants=variants, trace=trace, delta=delta, execute=execute, panel_provider=warm, memo=memo,
+                     timeouts=timeouts, run_timeout=run_timeout, exporter=exporter)
+        except Exception as e:
+            print(f"❌ 評估失敗 ({trigger}): {e}")
+            traceback.print_exc()
+        print(f"⏱️ 本次評估 {time.perf_counter() - t0:.1f}s")
+        trigger, when = next_trigger(datetime.now(timezone.utc))
+        print(f"😴 下一次: {trigger} {when:%Y-%m-%d %H:%M} UTC")
+        try:
+            while (remaining := (when - datetime.now(timezone.utc)).total_seconds()) > 0:
+                time.sleep(min(remaining, 300))  # 分段睡眠，系統休眠/時鐘調整後仍能準時醒來
+        except KeyboardInterrupt:
+            print("👋 Daemon 結束"); return
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--dry-run", action="store_true", help="不儲存 state 且不發送 LINE")
+    parser.add_argument("--catch-up", action="store_true", help="漏跑補救：使用本地價格快取，只補下載缺口並列出逐日成交")
+    parser.add_argument("--portfolios", nargs='?', const=PORTFOLIOS_FILE, default=None,
+                        help="多帳戶模式：載入 portfolios.json 的紙上變體，與正式帳戶共用資料同步推進")
+    parser.add_argument("--trace", nargs='?', const=TRACE_FILE, default=None,
+                        help="記錄每日排名/換倉/倉位決策到 columnar 檔 (預設 decision_trace.npz)，以 vanguard_trace.py 查詢")
+    parser.add_argument("--delta", action="store_true", help="LINE 只推播與上次送出戰報相比的變化 (新指令/停損價移動/狀態翻轉)；不加則送完整戰報")
+    parser.add_argument("--execute", nargs='?', const='paper', default=None, metavar="paper|URL",
+                        help="將今日指令送到執行介面：paper = 內建紙上券商模擬器 (預設)，或既有模擬器 URL")
+    parser.add_argument("--no-cache", action="store_true", help="不讀寫 .stage_cache / .indicator_cache (下載/指標/分數/日迴圈全部重算)")
+    parser.add_argument("--timeout", action="append", default=[], metavar="STAGE=SEC",
+                        help=f"覆寫時間預算 (可重複)：{', '.join(STAGE_TIMEOUTS)} 或 total (整次上限，預設 {RUN_TIMEOUT_SEC}s)；0 = 不限")
+    parser.add_argument("--daemon", action="store_true",
+                        help="常駐模式：價格面板留在記憶體，每次 UTC 換日後自動評估 (預設 delta 推播)")
+    parser.add_argument("--metrics-port", type=int, default=None, metavar="PORT",
+                        help="在 PORT 提供 Prometheus /metrics (搭配 --daemon)")
+    parser.add_argument("--metrics-textfile", default=None, metavar="PATH",
+                        help="每次執行後寫入 Prometheus textfile (node_exporter textfile collector，cron 模式)")
+    parser.add_argument("--profile", nargs='?', const='profile_live.folded', default=None, metavar="PATH",
+                        help="取樣式 profiler：整次執行的 collapsed stacks 寫入 PATH (預設 profile_live.folded)，結束時列出熱點函式；搭配 --no-cache 量測完整計算")
+    parser.add_argument("--profile-top", type=int, default=25, metavar="N", help="--profile 結束時列出的熱點函式數")
+    parser.add_argument("--profile-interval", type=float, default=5.0, metavar="MS", help="--profile 取樣間隔 (毫秒)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help=f"結束時列出模組載入 / 第一行輸出 / 戰報耗時，超出 {STARTUP_BUDGET_MS}ms / {REPORT_BUDGET_MS}ms 預算時 exit code 1")
+    parser.add_argument("--rebuild-state", action="store_true", help="由 broker_trades.csv + 價格快取重建 state 並與現有 state 比對")
+    parser.add_argument("--apply", action="store_true", help="搭配 --rebuild-state：以重建結果覆寫 state.json")
     args = parser.parse_args()
-    run_live(dry_run=args.dry_run)
+
+    def main():
+        if args.rebuild_state:
+            mark_first_output()
+            run_rebuild(apply=args.apply)
+        else:
+            variants = load_portfolio_configs(args.portfolios) if args.portfolios else None
+            trace = DecisionTrace(args.trace) if args.trace else None
+            timeouts = {k: float(v) or None for k, v in (t.split('=', 1) for t in args.timeout)}
+            run_timeout = timeouts.pop('total', RUN_TIMEOUT_SEC)
+            exporter = None
+            if args.metrics_port or args.metrics_textfile:
+                from vanguard_metrics import MetricsExporter, MetricsServer  # 延遲載入：只有匯出指標時才需要 (http.server)
+                exporter = MetricsExporter(args.metrics_textfile)
+            if args.metrics_port:
+                print(f"📊 Prometheus metrics: {MetricsServer(exporter, port=args.metrics_port).start().url}")
+            if args.daemon: run_daemon(variants=variants, trace=trace, execute=args.execute, dry_run=args.dry_run, memo=not args.no_cache,
+                                       timeouts=timeouts, run_timeout=run_timeout, exporter=exporter)
+            else: run_live(dry_run=args.dry_run, catch_up=args.catch_up, variants=variants, trace=trace, delta=args.delta,
+                           execute=args.execute, memo=not args.no_cache, timeouts=timeouts, run_timeout=run_timeout, exporter=exporter)
+
+    # [OPT-26] --profile：整次執行包在取樣 profiler 內 (flamegraph 用 collapsed stacks + top-N 熱點)
+    if args.profile:
+        from vanguard_profile import profile_call  # 延遲載入：只有 --profile 時才需要
+        profile_call(main, args.profile, args.profile_top, args.profile_interval)
+    else: main()
+    if args.profile_startup and not print_startup_profile(): sys.exit(1)
@@ -13,7 +13,7 @@ import warnings
 import json
 import os
 import argparse
-import requests
+from line_notifier import send_line
 from datetime import datetime
 
 warnings.filterwarnings("ignore")
@@ -510,9 +510,7 @@ def run_live(dry_run=False):
     print(msg)
     if not dry_run and LINE_TOKEN and LINE_USER_ID:
         try:
-            requests.post('https://api.line.me/v2/bot/message/push', 
-                          headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {LINE_TOKEN}'},
-                          json={"to": LINE_USER_ID, "messages": [{"type": "text", "text": msg}]})
+            send_line(msg, LINE_TOKEN, LINE_USER_ID)
         except Exception as e: print(f"LINE 發送失敗: {e}")
 
 if __name__ == "__main__":
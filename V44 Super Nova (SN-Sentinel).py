@@ -11,7 +11,8 @@
 
 import os
 import sys
-import requests
+from line_notifier import LineNotifier
+from run_metrics import RunMetrics, lap, count
 import warnings
 import pandas as pd
 import numpy as np
@@ -30,13 +31,10 @@ def send_line_push(msg):
     if not LINE_TOKEN or not LINE_UID:
         print("⚠️ 未檢測到 LINE 金鑰，僅在終端機輸出結果：")
         print(msg); return
-    url = 'https://api.line.me/v2/bot/message/push'
-    headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {LINE_TOKEN}'}
-    payload = {"to": LINE_UID, "messages": [{"type": "text", "text": msg}]}
-    try:
-        res = requests.post(url, headers=headers, json=payload)
-        if res.status_code == 200: print("✅ LINE 戰報推播成功！")
-    except: print("❌ 網絡錯誤")
+    # 共用 session / 自動分段 / 429·5xx 退避重試 (line_notifier)
+    for to, (ok, detail, _) in LineNotifier(LINE_TOKEN, LINE_UID).push(msg).items():
+        if ok: print("✅ LINE 戰報推播成功！")
+        else: print(f"❌ LINE 發送失敗: {detail}")
 
 try:
     import yfinance as yf
@@ -84,6 +82,7 @@ def analyze_market_v991():
     print(f"📥 正在執行全明星數據抓取與動能排名...")
     start_str = (datetime.now() - timedelta(days=365)).strftime('%Y-%m-%d')
     data = yf.download(tickers, start=start_str, group_by='ticker', progress=False, auto_adjust=True)
+    lap('download'); count('tickers', len(tickers))
     
     data_map = {}
     ticker_to_sector = {t.split('-')[0]: s for s, ts in SATELLITE_POOL.items() for t in ts}
@@ -107,6 +106,7 @@ def analyze_market_v991():
             if symbol == 'BTC': df['Mayer'] = df['Close'] / df['SMA_200']
             data_map[symbol] = df
         except: continue
+    lap('indicators')
 
     today = data_map['BTC'].index[-1]
     vix = data_map['VIX'].loc[today]['Close'] if 'VIX' in data_map else 20
@@ -150,6 +150,7 @@ def analyze_market_v991():
         for i, t in enumerate(top_targets):
             key = f'SAT{i+1}'; tw[key] = (sat_alloc / 2) * exposure_mult; ss[key] = t['sym']
 
+    lap('signals'); count('candidates', len(candidates))
     return tw, ss, vix, row_btc['Mayer'], bull_btc, today, candidates
 
 # ==========================================
@@ -224,9 +225,13 @@ def generate_optimized_report():
     progress = (total_eq * 32 / 30000000) * 100
     msg += f"🚩 衝刺 3000 萬進度: {progress:.1f}%\n"
     msg += f"👉 5% 門檻護航中，省下就是賺到。"
-    
+    lap('report')
     return msg
 
 if __name__ == "__main__":
-    try: send_line_push(generate_optimized_report())
-    except Exception as e: print(f"❌ 執行錯誤: {e}")
+    # [OPT-24] 各階段 wall / CPU / RSS 寫入 run_metrics.jsonl
+    with RunMetrics('V44_Super_Nova') as metrics:
+        try: send_line_push(generate_optimized_report()); lap('notify')
+        except Exception as e:
+            metrics.status = f"error: {str(e)[:120]}"
+            print(f"❌ 執行錯誤: {e}")
@@ -0,0 +1,150 @@
+# =========================================================
+# Exchange Sync (ccxt.async_support)
+# [OPT-17] 交易所持倉同步改為非同步：
+#   - fetch_balance 後，所有新持倉的 fetch_my_trades 以 asyncio.gather 並行查詢
+#     (Semaphore 限制同時請求數，ccxt enableRateLimit 節流器仍負責間隔)
+#   - load_markets() 的 markets/currencies 以 JSON 快取在磁碟 (TTL)，避免每次執行重抓整份市場表
+#   - 單一幣種查詢失敗只影響該幣 (entry=0 並記錄原因)，不再整批靜默吞掉
+#   - FakeExchange：本機假交易所 (可設延遲/失敗)，不需 API 金鑰即可測試
+# =========================================================
+import asyncio
+import json
+import os
+import time
+
+MARKETS_CACHE_FILE = 'markets_cache.json'
+MARKETS_TTL_HOURS = 24
+MAX_CONCURRENT_REQUESTS = 8
+
+
+class MarketCache:
+    """{exchange_id: {'ts': epoch, 'markets': {...}, 'currencies': {...}}}"""
+    def __init__(self, path=MARKETS_CACHE_FILE, ttl_hours=MARKETS_TTL_HOURS):
+        self.path = path
+        self.ttl = ttl_hours * 3600
+
+    def _load(self):
+        if not os.path.exists(self.path): return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f: return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, exchange_id):
+        entry = self._load().get(exchange_id)
+        if entry and time.time() - entry.get('ts', 0) < self.ttl: return entry
+        return None
+
+    def put(self, exchange_id, markets, currencies=None):
+        data = self._load()
+        data[exchange_id] = {'ts': time.time(), 'markets': markets, 'currencies': currencies or {}}
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f: json.dump(data, f, default=str)
+        os.replace(tmp, self.path)
+
+
+async def load_markets_cached(exchange, cache=None):
+    """TTL 內直接以快取 set_markets()；過期或無快取才呼叫 load_markets() 並寫回"""
+    cache = cache or MarketCache()
+    entry = cache.get(exchange.id)
+    if entry:
+        exchange.set_markets(entry['markets'], entry['currencies'] or None)
+        return 'cache'
+    markets = await exchange.load_markets()
+    cache.put(exchange.id, markets, getattr(exchange, 'currencies', None))
+    return 'remote'
+
+
+async def _last_trade_price(exchange, symbol, sem):
+    async with sem:
+        try:
+            trades = await exchange.fetch_my_trades(symbol, limit=1)
+            return (trades[0]['price'] if trades else 0), None
+        except Exception as e:
+            return 0, f"{type(e).__name__}: {str(e)[:40]}"
+
+
+async def fetch_holdings(exchange, to_ticker, symbol_of, known, cache=None, max_concurrent=MAX_CONCURRENT_REQUESTS):
+    """
+    to_ticker(coin, total) → 策略 ticker (不在策略池回傳 None)
+    symbol_of(ticker)      → 交易所交易對 (e.g. 'PEPE/USDT')
+    known: 已記錄的 ticker 集合，只對新持倉查成交價
+    回傳 (holdings {ticker: amount}, entries {ticker: price}, errors {ticker: 說明}, markets 來源)
+    """
+    source = await load_markets_cached(exchange, cache)
+    balance = await exchange.fetch_balance()
+    holdings = {}
+    for coin, total in balance['total'].items():
+        if total and total > 0:
+            ticker = to_ticker(coin, total)
+            if ticker: holdings[ticker] = total
+    new = [t for t in holdings if t not in known]
+    sem = asyncio.Semaphore(max_concurrent)
+    results = await asyncio.gather(*(_last_trade_price(exchange, symbol_of(t), sem) for t in new))
+    entries = {t: price for t, (price, _) in zip(new, results)}
+    errors = {t: err for t, (_, err) in zip(new, results) if err}
+    return holdings, entries, errors, source
+
+
+def run_fetch_holdings(make_exchange, *args, timeout=60, **kwargs):
+    """同步呼叫端入口：建立 async exchange、跑完 fetch_holdings、確保關閉連線"""
+    async def _run():
+        exchange = make_exchange()
+        try:
+            return await asyncio.wait_for(fetch_holdings(exchange, *args, **kwargs), timeout)
+        finally:
+            await exchange.close()
+    return asyncio.run(_run())
+
+
+# =========================
+# 本機假交易所 (測試用)
+# =========================
+class FakeExchange:
+    """
+    模擬 ccxt.async_support 交易所的最小介面。
+        FakeExchange({'BTC': 0.1, 'PEPE': 1e6}, trades={'BTC/USDT': 65000}, latency=0.2, fail={'PEPE/USDT'})
+    calls 記錄每個方法被呼叫次數，max_inflight 記錄最大同時請求數。
+    """
+    id = 'fake'
+
+    def __init__(self, balances, trades=None, latency=0.0, fail=(), markets=None):
+        self.balances = balances
+        self.trades = trades or {}
+        self.latency = latency
+        self.fail = set(fail)
+        self.markets = None
+        self.currencies = None
+        self._markets = markets or {s: {'symbol': s} for s in self.trades}
+        self.calls = {}
+        self._inflight = 0
+        self.max_inflight = 0
+
+    async def _io(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self._inflight += 1
+        self.max_inflight = max(self.max_inflight, self._inflight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self._inflight -= 1
+
+    def set_markets(self, markets, currencies=None):
+        self.markets, self.currencies = markets, currencies
+
+    async def load_markets(self, reload=False):
+        await self._io('load_markets')
+        self.markets, self.currencies = self._markets, {}
+        return self.markets
+
+    async def fetch_balance(self):
+        await self._io('fetch_balance')
+        return {'total': dict(self.balances)}
+
+    async def fetch_my_trades(self, symbol, since=None, limit=None):
+        await self._io('fetch_my_trades')
+        if symbol in self.fail: raise RuntimeError(f"fake failure for {symbol}")
+        return [{'symbol': symbol, 'price': self.trades[symbol]}] if symbol in self.trades else []
+
+    async def close(self):
+        self.calls['close'] = self.calls.get('close', 0) + 1
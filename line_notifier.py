@@ -0,0 +1,392 @@
+# =========================================================
+# LINE Notifier (共用推播模組)
+# [OPT-14] 取代各腳本自帶的 send_line_push / send_line / send_line_messages
+#   - 共用 requests.Session (連線池，keep-alive 重用 TLS 連線)
+#   - 自動分段：每則 ≤ 4900 字 (LINE 上限 5000 保留 buffer)，每次 push ≤ 5 則
+#   - 多收件人並行 (LINE_USER_ID 可用逗號分隔多個 ID)
+#   - 429 / 5xx / 連線錯誤 → 指數退避重試 (尊重 Retry-After)，整體 deadline 上限；其餘 4xx 回報為不可重試
+#   - LINE_API_URL 可覆寫端點；MockLineServer 提供本機假端點供測試
+# [OPT-15] Outbox：訊息先落地 (line_outbox.json)，背景執行緒投遞，失敗者留待下次執行 / --flush-outbox 重送
+#
+#   python line_notifier.py --mock 8765            # 啟動本機假端點，印出收到的訊息
+#   python line_notifier.py --flush-outbox         # 手動重送 outbox 中未送達的訊息
+#   LINE_API_URL=http://127.0.0.1:8765/v2/bot/message/push python V18.00_VANGUARD.py
+# =========================================================
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+LINE_PUSH_URL = 'https://api.line.me/v2/bot/message/push'
+MAX_TEXT_LEN = 4900     # LINE 單則上限 5000 字，保留 buffer
+MAX_PER_PUSH = 5        # LINE push API 每次最多 5 則訊息
+RETRY_STATUS = {429, 500, 502, 503, 504}
+OUTBOX_FILE = 'line_outbox.json'
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def is_retryable(status):
+    """4xx (429 除外) 代表請求本身有問題 (token / 收件人 / 內容)，重送也不會成功"""
+    return status == 429 or not 400 <= status < 500
+
+
+def get_session():
+    """行程內共用的 Session，多次推播 / 多收件人共用連線池"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            # requests 延遲載入：只有真的要推播時才付 import 成本
+            import requests
+            from requests.adapters import HTTPAdapter
+            _session = requests.Session()
+            _session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+            _session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+        return _session
+
+
+def split_text(text, max_len=MAX_TEXT_LEN):
+    """長訊息優先在換行處切段，找不到換行才硬切"""
+    parts = []
+    while len(text) > max_len:
+        split_idx = text.rfind('\n', 0, max_len)
+        if split_idx == -1: split_idx = max_len
+        parts.append(text[:split_idx])
+        text = text[split_idx:].lstrip('\n')
+    if text: parts.append(text)
+    return parts
+
+
+def chunk_messages(texts, max_len=MAX_TEXT_LEN, per_push=MAX_PER_PUSH):
+    """texts (str 或 list[str]) → list[batch]，每個 batch 為一次 push 的 messages 陣列"""
+    if isinstance(texts, str): texts = [texts]
+    msgs = [{'type': 'text', 'text': p} for t in texts for p in split_text(t, max_len)]
+    return [msgs[i:i + per_push] for i in range(0, len(msgs), per_push)]
+
+
+def parse_recipients(value):
+    if not value: return []
+    if isinstance(value, str): value = value.split(',')
+    return [v.strip() for v in value if v and v.strip()]
+
+
+class LineNotifier:
+    def __init__(self, token=None, recipients=None, endpoint=None, timeout=10, max_retries=4,
+                 backoff=1.0, max_backoff=30.0, deadline=60.0, session=None):
+        self.token = token if token is not None else os.getenv('LINE_CHANNEL_ACCESS_TOKEN')
+        self.recipients = parse_recipients(recipients if recipients is not None else os.getenv('LINE_USER_ID'))
+        self.endpoint = endpoint or os.getenv('LINE_API_URL') or LINE_PUSH_URL
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.session = session or get_session()
+
+    @property
+    def enabled(self): return bool(self.token and self.recipients)
+
+    def _retry_delay(self, attempt, response=None):
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try: return min(float(retry_after), self.max_backoff)
+                except ValueError: pass
+        return min(self.backoff * (2 ** attempt), self.max_backoff) * (0.5 + random.random() / 2)
+
+    def _post(self, to, batch, stop_at):
+        """單一 push (一個收件人、≤5 則)；回傳 (ok, 說明, 可否重試)"""
+        from requests import RequestException
+        headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {self.token}'}
+        payload = {'to': to, 'messages': batch}
+        detail = ''
+        for attempt in range(self.max_retries + 1):
+            res = None
+            try:
+                res = self.session.post(self.endpoint, headers=headers, json=payload,
+                                        timeout=min(self.timeout, max(stop_at - time.monotonic(), 1)))
+                if res.status_code == 200: return True, 'ok', False
+                detail = f"HTTP {res.status_code} {res.text[:200]}"
+                if res.status_code not in RETRY_STATUS: return False, detail, is_retryable(res.status_code)
+            except RequestException as e:
+                detail = f"{type(e).__name__}: {e}"
+            if attempt == self.max_retries: break
+            delay = self._retry_delay(attempt, res)
+            if time.monotonic() + delay > stop_at: break
+            time.sleep(delay)
+        return False, detail, True
+
+    def _send_to(self, to, batches, stop_at):
+        # 同一收件人依序送出，維持段落順序
+        for batch in batches:
+            result = self._post(to, batch, stop_at)
+            if not result[0]: return result
+        return True, 'ok', False
+
+    def push(self, texts, recipients=None):
+        """
+        推播 texts (str 或 list[str]) 給所有收件人；多收件人並行。
+        回傳 dict {recipient: (ok, 說明, 可否重試)}；未設定 token/收件人時回傳 {}。
+        """
+        recipients = parse_recipients(recipients) if recipients is not None else self.recipients
+        if not self.token or not recipients: return {}
+        batches = chunk_messages(texts)
+        if not batches: return {}
+        stop_at = time.monotonic() + self.deadline
+        if len(recipients) == 1:
+            return {recipients[0]: self._send_to(recipients[0], batches, stop_at)}
+        with ThreadPoolExecutor(max_workers=min(8, len(recipients))) as pool:
+            futures = {to: pool.submit(self._send_to, to, batches, stop_at) for to in recipients}
+            return {to: f.result() for to, f in futures.items()}
+
+
+def send_line(texts, token=None, recipients=None, **kwargs):
+    """便利函式：以環境變數 (或指定值) 建立 notifier 並推播；全部成功回傳 True"""
+    results = LineNotifier(token, recipients, **kwargs).push(texts)
+    for to, (ok, detail, _) in results.items():
+        if not ok: print(f"❌ LINE 發送失敗 ({to[:5]}...): {detail}")
+    return bool(results) and all(ok for ok, _, _ in results.values())
+
+
+# =========================
+# [OPT-15] Durable Outbox
+# =========================
+def _recipient_key(to):
+    # outbox 檔會隨 state.json 一起 commit，只存收件人雜湊，不落地 user ID
+    return hashlib.sha1(to.encode()).hexdigest()[:12]
+
+
+class Outbox:
+    """
+    line_outbox.json = [{id, created, source, texts, delivered, attempts, last_error}, ...]
+      - enqueue():       同步寫檔 (毫秒級)，不碰網路
+      - deliver_async(): 背景 daemon thread 投遞；同時間只有一個 worker，新訊息由同一 worker 接續處理
+      - wait(timeout):   行程結束前有上限地等待；逾時未送達者留在檔案中，下次執行再送
+    收件人在投遞時由 notifier 決定 (LINE_USER_ID)；delivered 記錄已送達收件人的雜湊，多收件人部分成功不會重送。
+    meta 隨訊息落地；on_delivered(entry) 在該則全部送達後呼叫 (可能是之後某次執行的重送)，放棄的訊息不呼叫。
+    失敗的收件人全部為不可重試 (4xx，429 除外) 時立即放棄該則，不佔用 max_attempts / max_age 的重送次數。
+    """
+    def __init__(self, path=OUTBOX_FILE, max_attempts=30, max_age_hours=72, on_delivered=None):
+        self.path = path
+        self.on_delivered = on_delivered
+        self.max_attempts = max_attempts
+        self.max_age = timedelta(hours=max_age_hours)
+        self._lock = threading.Lock()
+        self._worker = None
+        self._dirty = False
+
+    def _load(self):
+        if not os.path.exists(self.path): return []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f: return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Outbox 讀取失敗 ({e})，改名保留並重新建立")
+            os.replace(self.path, self.path + '.corrupt')
+            return []
+
+    def _save(self, entries):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f: json.dump(entries, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+
+    def pending(self):
+        with self._lock: return self._load()
+
+    def enqueue(self, texts, source='', meta=None):
+        if isinstance(texts, str): texts = [texts]
+        now = datetime.now(timezone.utc)
+        entry = {'id': f"{now.strftime('%Y%m%dT%H%M%S%f')}-{random.randrange(16 ** 4):04x}",
+                 'created': now.isoformat(timespec='seconds'), 'source': source,
+                 'texts': list(texts), 'delivered': [], 'attempts': 0, 'last_error': ''}
+        if meta is not None: entry['meta'] = meta
+        with self._lock:
+            entries = self._load()
+            entries.append(entry)
+            self._save(entries)
+            self._dirty = True
+        return entry['id']
+
+    def _update(self, entry_id, fn):
+        with self._lock:
+            entries = self._load()
+            for k, e in enumerate(entries):
+                if e['id'] == entry_id:
+                    if fn(e) is False: entries.pop(k)
+                    break
+            self._save(entries)
+
+    def deliver(self, notifier=None):
+        """同步投遞所有待送訊息 (依建立順序)；回傳 (送達筆數, 剩餘筆數)"""
+        notifier = notifier or LineNotifier()
+        with self._lock:
+            self._dirty = False
+            entries = self._load()
+            self._save(entries)  # 確保檔案存在，方便 workflow 一併 commit
+        if not notifier.enabled: return 0, len(entries)
+        sent, now = 0, datetime.now(timezone.utc)
+        for e in entries:
+            if now - datetime.fromisoformat(e['created']) > self.max_age or e['attempts'] >= self.max_attempts:
+                print(f"🗑️ Outbox 放棄過期訊息 {e['id']} ({e['source']}, 嘗試 {e['attempts']} 次: {e['last_error']})")
+                self._update(e['id'], lambda x: False)
+                continue
+            todo = [to for to in notifier.recipients if _recipient_key(to) not in e['delivered']]
+            results = notifier.push(e['texts'], recipients=todo) if todo else {}
+            ok_keys = [_recipient_key(to) for to, (ok, _, _) in results.items() if ok]
+            errors = [detail for ok, detail, _ in results.values() if not ok]
+            if errors and not any(retryable for ok, _, retryable in results.values() if not ok):
+                print(f"🗑️ Outbox 放棄無法重送的訊息 {e['id']} ({e['source']}: {errors[0][:200]})")
+                self._update(e['id'], lambda x: False)
+                continue
+
+            def apply(x, ok_keys=ok_keys, errors=errors):
+                if not errors: return False
+                x['delivered'] = sorted(set(x['delivered']) | set(ok_keys))
+                x['attempts'] += 1
+                x['last_error'] = errors[0][:200]
+            self._update(e['id'], apply)
+            if not errors:
+                sent += 1
+                if self.on_delivered is not None:
+                    try: self.on_delivered(e)
+                    except Exception as ex: print(f"⚠️ Outbox 送達回呼失敗 {e['id']}: {ex}")
+        return sent, len(self.pending())
+
+    def _run(self, notifier):
+        while True:
+            try:
+                sent, left = self.deliver(notifier)
+                if sent: print(f"📨 Outbox 已送達 {sent} 筆{f'，{left} 筆待重送' if left else ''}")
+            except Exception as e:
+                print(f"❌ Outbox 投遞錯誤: {e}")
+            with self._lock:
+                if not self._dirty:
+                    self._worker = None
+                    return
+                self._dirty = False
+
+    def deliver_async(self, notifier=None):
+        """啟動 (或喚醒) 背景投遞，立即返回"""
+        notifier = notifier or LineNotifier()
+        with self._lock:
+            self._dirty = True
+            if self._worker is not None: return self._worker
+            self._worker = threading.Thread(target=self._run, args=(notifier,), daemon=True, name='line-outbox')
+            self._worker.start()
+            return self._worker
+
+    def wait(self, timeout=30):
+        """等待背景投遞完成 (上限 timeout 秒)；回傳是否已全部處理完"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock: worker = self._worker
+            if worker is None: return True
+            worker.join(max(deadline - time.monotonic(), 0))
+            if worker.is_alive():
+                print(f"⏳ Outbox 投遞逾時 ({timeout:.0f}s)，未送達訊息保留於 {self.path}，下次執行重送")
+                return False
+
+
+def notify(texts, source='', token=None, recipients=None, outbox_path=OUTBOX_FILE, wait=30, **kwargs):
+    """腳本用：先落地 outbox 再背景投遞 (含先前未送達的訊息)，最多等待 wait 秒"""
+    outbox = Outbox(outbox_path)
+    outbox.enqueue(texts, source)
+    outbox.deliver_async(LineNotifier(token, recipients, **kwargs))
+    return outbox.wait(wait)
+
+
+# =========================
+# 本機假端點 (測試用)
+# =========================
+class MockLineServer:
+    """
+    模擬 LINE push API：記錄收到的請求，可指定前 N 次回傳錯誤碼以測試退避重試。
+        with MockLineServer(fail_first=2, fail_status=429) as srv:
+            LineNotifier('tok', 'U1', endpoint=srv.url, backoff=0.01).push(msg)
+            srv.requests  # [{'to':..., 'messages': [...]}, ...]
+    """
+    def __init__(self, host='127.0.0.1', port=0, fail_first=0, fail_status=500, delay=0.0, verbose=False):
+        self.requests = []
+        self.attempts = 0
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.delay = delay
+        self.verbose = verbose
+        self._lock = threading.Lock()
+        from http.server import ThreadingHTTPServer  # 測試用，延遲載入
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v2/bot/message/push"
+
+    def _handler(self):
+        from http.server import BaseHTTPRequestHandler
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if mock.delay: time.sleep(mock.delay)
+                with mock._lock:
+                    mock.attempts += 1
+                    fail = mock.attempts <= mock.fail_first
+                    if not fail:
+                        payload = json.loads(body or b'{}')
+                        mock.requests.append(payload)
+                status = mock.fail_status if fail else 200
+                if not self.headers.get('Authorization', '').startswith('Bearer '): status = 401
+                if mock.verbose and status == 200:
+                    for m in payload.get('messages', []):
+                        print(f"--- [mock LINE → {payload.get('to')}] ({len(m.get('text', ''))} 字) ---\n{m.get('text', '')}")
+                self.send_response(status)
+                if status == 429: self.send_header('Retry-After', '0')
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(b'{}' if status == 200 else b'{"message":"mock error"}')
+
+            def log_message(self, *args): pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self): return self.start()
+
+    def __exit__(self, *exc): self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LINE 推播工具 / 本機假端點")
+    parser.add_argument("--mock", type=int, metavar="PORT", help="啟動本機假 LINE 端點並印出收到的訊息")
+    parser.add_argument("--send", metavar="TEXT", help="以環境變數中的金鑰推播一則訊息 (可配合 LINE_API_URL)")
+    parser.add_argument("--flush-outbox", nargs='?', const=OUTBOX_FILE, metavar="PATH", help="重送 outbox 中未送達的訊息")
+    args = parser.parse_args()
+    if args.mock is not None:
+        srv = MockLineServer(port=args.mock, verbose=True).start()
+        print(f"🧪 Mock LINE 端點: {srv.url}  (Ctrl+C 結束)")
+        try:
+            while True: time.sleep(3600)
+        except KeyboardInterrupt:
+            srv.stop()
+    elif args.flush_outbox:
+        sent, left = Outbox(args.flush_outbox).deliver()
+        print(f"📨 送達 {sent} 筆，剩餘 {left} 筆")
+    elif args.send:
+        print("✅ 發送成功" if send_line(args.send) else "❌ 發送失敗")
+    else:
+        parser.print_help()
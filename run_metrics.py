@@ -0,0 +1,183 @@
+# =========================================================
+# Run Metrics (結構化執行紀錄)
+# [OPT-24] 每次執行寫一行 JSON 到 run_metrics.jsonl：整次與各階段的 wall / CPU 時間、峰值記憶體 + 計數器
+#   - 階段計時以「打點」方式：lap(name) 記錄自上一個打點以來的時間，不必縮排既有程式碼
+#     phase(name) 為 context manager 版本 (進入時打點)；同名階段重複出現時累加並記錄次數
+#   - 計數器 count(name, n) / 數值 gauge(name, value)：抓取 ticker 數、處理天數、產生委託數...
+#   - 峰值 RSS 取自 getrusage (行程啟動以來的高水位，階段結束時的值；Windows 無 resource 模組時為 null)
+#   - 模組層級函式在沒有進行中的 RunMetrics 時是 no-op：被其他程式 import 呼叫也不會寫檔
+#   - 每個打點僅一次 perf_counter / process_time / getrusage 呼叫 (微秒級)，不影響執行時間
+#
+#   with RunMetrics('vanguard_live', dry_run=True):     # 離開時寫入紀錄 (例外 → status='error: ...')
+#       lap('download'); count('tickers', 120)
+#
+#   python run_metrics.py                  # 最近 10 次執行摘要
+#   python run_metrics.py -n 30 --run V157_Omega
+# =========================================================
+import argparse
+import functools
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRICS_FILE = 'run_metrics.jsonl'
+
+_ACTIVE = []  # 進行中的 RunMetrics (巢狀時記錄到最內層)
+
+
+def peak_rss_mb():
+    """行程峰值常駐記憶體 (MB)；Linux ru_maxrss 單位 KB，macOS 為 bytes"""
+    if resource is None: return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class RunMetrics:
+    def __init__(self, run, path=METRICS_FILE, **meta):
+        self.run = run
+        self.path = path
+        self.meta = meta
+        self.phases = {}
+        self.counters = {}
+        self.status = 'ok'
+        self.started = datetime.now(timezone.utc)
+        self._t0 = self._mark = (time.perf_counter(), time.process_time())
+
+    def lap(self, name):
+        """記錄自上一個打點以來的時間為階段 name"""
+        now = (time.perf_counter(), time.process_time())
+        p = self.phases.setdefault(name, {'wall_s': 0.0, 'cpu_s': 0.0, 'calls': 0})
+        p['wall_s'] += now[0] - self._mark[0]
+        p['cpu_s'] += now[1] - self._mark[1]
+        p['calls'] += 1
+        p['peak_rss_mb'] = peak_rss_mb()
+        self._mark = now
+
+    def skip(self):
+        """丟棄自上一個打點以來的時間 (不計入任何階段)"""
+        self._mark = (time.perf_counter(), time.process_time())
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        self.counters[name] = value
+
+    def record(self):
+        return {
+            'run': self.run,
+            'started': self.started.isoformat(timespec='seconds'),
+            'wall_s': round(time.perf_counter() - self._t0[0], 4),
+            'cpu_s': round(time.process_time() - self._t0[1], 4),
+            'peak_rss_mb': peak_rss_mb(),
+            'status': self.status,
+            'phases': {k: {**v, 'wall_s': round(v['wall_s'], 4), 'cpu_s': round(v['cpu_s'], 4)} for k, v in self.phases.items()},
+            'counters': self.counters,
+            'meta': self.meta,
+        }
+
+    def write(self):
+        rec = self.record()
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f: f.write(json.dumps(rec, ensure_ascii=False, default=str) + '\n')
+        except OSError as e:
+            print(f"⚠️ 無法寫入 {self.path}: {e}")
+        return rec
+
+    def __enter__(self):
+        _ACTIVE.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self in _ACTIVE: _ACTIVE.remove(self)
+        if exc_type is not None:
+            self.status = 'interrupted' if issubclass(exc_type, KeyboardInterrupt) else f"error: {exc_type.__name__}: {str(exc)[:120]}"
+        self.write()
+        return False
+
+
+# =========================
+# 模組層級介面 (無進行中的紀錄時為 no-op)
+# =========================
+def current():
+    return _ACTIVE[-1] if _ACTIVE else None
+
+
+def lap(name):
+    if _ACTIVE: _ACTIVE[-1].lap(name)
+
+
+def skip():
+    if _ACTIVE: _ACTIVE[-1].skip()
+
+
+def count(name, n=1):
+    if _ACTIVE: _ACTIVE[-1].count(name, n)
+
+
+def gauge(name, value):
+    if _ACTIVE: _ACTIVE[-1].gauge(name, value)
+
+
+def set_status(status):
+    if _ACTIVE: _ACTIVE[-1].status = status
+
+
+class phase:
+    """with phase('indicators'): ...  → 進入時打點 (前段時間不算入)，離開時記錄"""
+    def __init__(self, name): self.name = name
+
+    def __enter__(self):
+        skip()
+        return self
+
+    def __exit__(self, *exc):
+        lap(self.name)
+        return False
+
+
+def timed_run(run, **meta):
+    """@timed_run('V157_Omega')：整個函式包在一個 RunMetrics 內"""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with RunMetrics(run, **meta): return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def load_records(path=METRICS_FILE, run=None):
+    if not os.path.exists(path): return []
+    out = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try: rec = json.loads(line)
+            except ValueError: continue
+            if run is None or rec.get('run') == run: out.append(rec)
+    return out
+
+
+def format_record(rec):
+    head = (f"{rec['started']}  {rec['run']:<16} {rec['wall_s']:>8.2f}s wall / {rec['cpu_s']:>7.2f}s cpu"
+            f"  peak {rec['peak_rss_mb'] if rec['peak_rss_mb'] is not None else '-'} MB  [{rec['status']}]")
+    phases = " | ".join(f"{k} {v['wall_s']:.2f}s" for k, v in rec['phases'].items())
+    counters = " ".join(f"{k}={v}" for k, v in rec['counters'].items())
+    return "\n".join(s for s in (head, f"    ⏱ {phases}" if phases else '', f"    # {counters}" if counters else '') if s)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="執行紀錄摘要")
+    parser.add_argument("-n", type=int, default=10, help="顯示最近 N 筆")
+    parser.add_argument("--run", help="只看指定程式 (e.g. vanguard_live / vanguard_backtest / V157_Omega)")
+    parser.add_argument("--file", default=METRICS_FILE)
+    args = parser.parse_args()
+    records = load_records(args.file, args.run)
+    if not records: print(f"(無 {args.file} 紀錄)")
+    for rec in records[-args.n:]: print(format_record(rec))
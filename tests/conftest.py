@@ -0,0 +1,32 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+from vanguard_bench import LIVE_ENGINE, load_engine  # noqa: E402
+from vanguard_synth import engine_market  # noqa: E402
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """每個測試載入一份獨立的 V18.00_VANGUARD 模組 (全域不互相汙染)；工作目錄為 tmp_path，不推播 LINE"""
+    monkeypatch.chdir(tmp_path)
+    mod = load_engine(LIVE_ENGINE, 'test_live_engine')
+    mod.LINE_TOKEN = mod.LINE_USER_ID = None
+    return mod
+
+
+def synth_panel(engine, days=420, seed=0, end=None):
+    """引擎 universe 的合成價格面板 (get_data() 形狀)，預設到昨天為止 (全部為已收盤 bar)"""
+    end = pd.Timestamp(end or datetime.utcnow().date()) - pd.Timedelta(days=1)
+    return engine_market(engine, end - pd.Timedelta(days=days), end, seed).panel(engine.USD_TWD_RATE)
+
+
+def fresh_state(engine, panel, warmup_days=200):
+    """初始資金、無持倉，自面板第 warmup_days 根 bar 之後開始推進 (均線已成形)"""
+    return {'cash': engine.INITIAL_CAPITAL_USD, 'positions': {}, 'orders_queue': [], 'cooldown_dict': {},
+            'last_processed_date': panel[0].index[warmup_days].strftime('%Y-%m-%d')}
@@ -0,0 +1,42 @@
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(__import__('pathlib').Path(__file__).resolve().parents[1]))
+from vanguard_broker import ExecutionAdapter, PaperBrokerAdapter, PaperBrokerServer  # noqa: E402
+
+IDX = pd.to_datetime(['2026-10-13', '2026-10-14', '2026-10-15'])
+BARS = {'open': pd.DataFrame({'AAA': [10.0, np.nan, 12.0], 'BBB': [50.0, 51.0, np.nan]}, index=IDX),
+        'close': pd.DataFrame({'AAA': [10.5, np.nan, 12.5], 'BBB': [50.5, 51.5, np.nan]}, index=IDX)}
+
+
+def test_fill_price_and_slippage():
+    srv = PaperBrokerServer(BARS, slippage_bps=10)
+    buy = srv.fill({'id': 'b', 'side': 'BUY', 'symbol': 'AAA', 'notional': 1200.0}, '2026-10-13')
+    assert (buy['bar_date'], buy['bar'], buy['ref_price']) == ('2026-10-15', 'open', 12.0)  # 跳過無開盤價的 10-14
+    assert buy['price'] == pytest.approx(12.0 * 1.001) and buy['qty'] == pytest.approx(1200.0 / buy['price'])
+    sell = srv.fill({'id': 's', 'side': 'SELL', 'symbol': 'BBB', 'qty': 3.0}, '2026-10-14')
+    assert (sell['bar_date'], sell['bar'], sell['ref_price']) == ('2026-10-14', 'close', 51.5)  # 尚無下一根開盤價
+    assert sell['price'] == pytest.approx(51.5 * 0.999) and sell['qty'] == 3.0
+    assert srv.fill({'side': 'BUY', 'symbol': 'ZZZ', 'notional': 1.0}, '2026-10-13')['status'] == 'REJECTED'
+    assert len(srv.fills) == 2
+
+
+def test_adapter_submits_orders_queue():
+    orders = [{'type': 'SELL', 'symbol': 'BBB', 'reason': 'Zombie'}, {'type': 'SELL', 'symbol': 'GONE'},
+              {'type': 'BUY', 'symbol': 'AAA', 'amount_usd': 600.0, 'reason': 'Swap'}]
+    with PaperBrokerServer(BARS) as srv:
+        adapter = PaperBrokerAdapter(srv.url)
+        fills = adapter.submit(orders, {'BBB': SimpleNamespace(units=4.0)}, pd.Timestamp('2026-10-13'))
+        adapter.close()
+    assert [(f['side'], f['symbol'], f['reason'], f['status']) for f in fills] == [
+        ('SELL', 'BBB', 'Zombie', 'FILLED'), ('BUY', 'AAA', 'Swap', 'FILLED')]  # 無持倉的賣單不送出
+    assert fills[0]['qty'] == 4.0 and fills[0]['price'] == 51.0 and fills[1]['qty'] == pytest.approx(50.0)
+    assert all(f['latency_ms'] >= 0 for f in fills)
+
+
+def test_adapter_requires_submit():
+    with pytest.raises(TypeError): ExecutionAdapter()
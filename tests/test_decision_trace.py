@@ -0,0 +1,25 @@
+import sys
+
+sys.path.insert(0, str(__import__('pathlib').Path(__file__).resolve().parents[1]))
+from vanguard_trace import DecisionTrace, explain_day, load_trace  # noqa: E402
+
+
+def _run(path, dates, account='production', score=1.0):
+    trace = DecisionTrace(str(path))
+    for d in dates:
+        trace.start(d, account)
+        trace.ranking(['AAA', 'BBB'], lambda s: score)
+        trace.summary(15.0, 1.0, False, 1e5 * score, 1e4, 2, 0)
+    trace.save()
+
+
+def test_rerun_replaces_same_day(tmp_path):
+    path = tmp_path / 'trace.npz'
+    _run(path, ['2026-01-01', '2026-01-02'])
+    _run(path, ['2026-01-02', '2026-01-03'], score=2.0)  # 重跑 01-02
+    _run(path, ['2026-01-02'], account='paper')           # 其他帳戶同日不受影響
+    days, events = load_trace(str(path))
+    assert len(days) == 4 and len(events) == 8
+    assert not days.duplicated(['date', 'account']).any()
+    text = explain_day(days, events, '2026-01-02', account='production')
+    assert text.count('#1 ') == 1 and 'score 2.0000' in text and 'score 1.0000' not in text
@@ -0,0 +1,40 @@
+import sys
+
+sys.path.insert(0, str(__import__('pathlib').Path(__file__).resolve().parents[1]))
+from line_notifier import LineNotifier, MockLineServer, Outbox  # noqa: E402
+from vanguard_delta import build_delta, load_snapshot, promote_snapshot  # noqa: E402
+
+
+def _report(orders=(), alerts=(), vix='1.00x'):
+    return {'date': '2026-10-18', 'header': '🦁 Vanguard 實盤指示', 'summary': '🔒 VIX: 20.0',
+            'regime': {'美股': '🐂 牛', 'VIX 加碼': vix}, 'alerts': list(alerts),
+            'orders': {f"BUY:{s}": f"✅ 買入 {s}\n" for s in orders}, 'holdings': {}, 'degraded': []}
+
+
+def test_snapshot_promoted_only_after_delivery(tmp_path):
+    snap = str(tmp_path / 'report_snapshot.json')
+    outbox = Outbox(str(tmp_path / 'outbox.json'), on_delivered=lambda e: promote_snapshot(e, snap))
+    outbox.enqueue('full report', meta={'snapshot': _report(['NVDA'])})
+    with MockLineServer(fail_first=100, fail_status=503) as srv:
+        outbox.deliver(LineNotifier('tok', 'U1', endpoint=srv.url, max_retries=0))
+    assert load_snapshot(snap) is None  # 未送達：下次 delta 仍以上次實際收到的版本比對
+    with MockLineServer() as srv:
+        outbox.deliver(LineNotifier('tok', 'U1', endpoint=srv.url))
+    saved = load_snapshot(snap)
+    assert saved['orders'] == _report(['NVDA'])['orders'] and saved['_sent_at']
+
+
+def test_late_delivery_of_older_message_keeps_newer_snapshot(tmp_path):
+    snap = str(tmp_path / 'report_snapshot.json')
+    promote_snapshot({'created': '2026-10-18T01:00:00+00:00', 'meta': {'snapshot': _report(['NEW'])}}, snap)
+    promote_snapshot({'created': '2026-10-17T01:00:00+00:00', 'meta': {'snapshot': _report(['OLD'])}}, snap)
+    assert list(load_snapshot(snap)['orders']) == ['BUY:NEW']
+
+
+def test_build_delta_only_sends_changes():
+    prev = _report(['NVDA'], alerts=['⚠️ TSLA 於 10/17 盤中觸發: TRAIL_EXIT'])
+    assert build_delta(None, prev) is None
+    assert build_delta(prev, prev) is None  # 同日重跑：指令與盤中觸發都已送過
+    msg = build_delta(prev, _report(['NVDA', 'AMD'], alerts=prev['alerts'], vix='1.15x'))
+    assert '買入 AMD' in msg and '買入 NVDA' not in msg and 'TRAIL_EXIT' not in msg
+    assert 'VIX 加碼 1.00x → 1.15x' in msg
@@ -0,0 +1,35 @@
+import json
+import sys
+
+sys.path.insert(0, str(__import__('pathlib').Path(__file__).resolve().parents[1]))
+from exchange_sync import FakeExchange, MarketCache, run_fetch_holdings  # noqa: E402
+
+
+def _fetch(ex, cache, known=()):
+    return run_fetch_holdings(lambda: ex, lambda coin, total: f"{coin}-USD" if coin != 'USDT' else None,
+                              lambda t: f"{t.split('-')[0]}/USDT", set(known), cache=cache, max_concurrent=2)
+
+
+def test_per_coin_errors_do_not_fail_the_batch(tmp_path):
+    ex = FakeExchange({'BTC': 0.1, 'PEPE': 1e6, 'SOL': 3.0, 'USDT': 50.0, 'DOGE': 0},
+                      trades={'BTC/USDT': 65000.0, 'SOL/USDT': 150.0}, latency=0.01, fail={'PEPE/USDT'})
+    holdings, entries, errors, source = _fetch(ex, MarketCache(str(tmp_path / 'markets.json')), known={'SOL-USD'})
+    assert holdings == {'BTC-USD': 0.1, 'PEPE-USD': 1e6, 'SOL-USD': 3.0}  # USDT 不在策略池、DOGE 餘額 0
+    assert entries == {'BTC-USD': 65000.0, 'PEPE-USD': 0}                 # 只查新持倉；失敗的幣 entry=0
+    assert list(errors) == ['PEPE-USD'] and 'RuntimeError' in errors['PEPE-USD']
+    assert source == 'remote' and ex.calls['fetch_my_trades'] == 2 and ex.max_inflight <= 2
+    assert ex.calls['close'] == 1
+
+
+def test_markets_cache_ttl(tmp_path):
+    path = str(tmp_path / 'markets.json')
+    ex = FakeExchange({'BTC': 0.1}, trades={'BTC/USDT': 65000.0})
+    assert _fetch(ex, MarketCache(path))[3] == 'remote'
+    assert _fetch(ex, MarketCache(path))[3] == 'cache'
+    assert ex.calls['load_markets'] == 1 and ex.markets == {'BTC/USDT': {'symbol': 'BTC/USDT'}}
+
+    with open(path) as f: data = json.load(f)
+    data['fake']['ts'] -= 25 * 3600  # 超過 24h TTL
+    with open(path, 'w') as f: json.dump(data, f)
+    assert _fetch(ex, MarketCache(path))[3] == 'remote' and ex.calls['load_markets'] == 2
+    assert _fetch(ex, MarketCache(path, ttl_hours=0))[3] == 'remote'
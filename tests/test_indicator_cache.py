@@ -0,0 +1,69 @@
+import importlib.util
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(__import__('pathlib').Path(__file__).resolve().parents[1]))
+from vanguard_indicator_cache import IndicatorCache, panel_hash  # noqa: E402
+
+MODULE = '''
+import numpy as np
+import pandas as pd
+
+def compute_indicators(close):
+    return {{'ma20': close.rolling({window}).mean()}}
+
+def compute_scores(close, ind):
+    return pd.DataFrame(np.where(close > ind['ma20'], close.pct_change(5), np.nan), index=close.index, columns=close.columns)
+'''
+
+
+def _load(tmp_path, name, window):
+    path = tmp_path / f"{name}.py"
+    path.write_text(MODULE.format(window=window))
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def _panel():
+    idx = pd.date_range('2024-01-01', periods=120, freq='D')
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0, 0.02, (120, 3)), axis=0)), index=idx, columns=['A', 'B', 'C'])
+
+
+def test_upstream_edit_invalidates_downstream(tmp_path):
+    close = _panel()
+    key = panel_hash(close)
+    v1 = _load(tmp_path, 'ind_v1', 20)
+    cache = IndicatorCache(str(tmp_path / 'cache'))
+    ind = cache.call(v1.compute_indicators, key, close)
+    cache.call(v1.compute_scores, key, close, ind)
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    # 只改上游窗口 (compute_scores 程式碼不變)：兩者都必須重算
+    v2 = _load(tmp_path, 'ind_v2', 25)
+    cache = IndicatorCache(str(tmp_path / 'cache'))
+    ind = cache.call(v2.compute_indicators, key, close)
+    scores = cache.call(v2.compute_scores, key, close, ind)
+    assert (cache.hits, cache.misses) == (0, 2)
+    fresh = v2.compute_scores(close, v2.compute_indicators(close))
+    pd.testing.assert_frame_equal(scores, fresh)
+
+    # 同一版本再跑一次：全部命中，結果與重算相同 (含 dtype)
+    cache = IndicatorCache(str(tmp_path / 'cache'))
+    ind = cache.call(v2.compute_indicators, key, close)
+    scores = cache.call(v2.compute_scores, key, close, ind)
+    assert (cache.hits, cache.misses) == (2, 0)
+    pd.testing.assert_frame_equal(scores, fresh, check_freq=False)  # 讀回的 index 不保留 freq
+
+
+def test_object_dtype_is_not_cached(tmp_path):
+    close = _panel()
+    cache = IndicatorCache(str(tmp_path / 'cache'))
+    make = lambda c: pd.DataFrame(index=c.index, columns=c.columns)  # noqa: E731
+    out = cache.call(make, panel_hash(close), close)
+    assert out.dtypes.eq(object).all()
+    assert cache.entries() == []
@@ -0,0 +1,40 @@
+import sys
+
+sys.path.insert(0, str(__import__('pathlib').Path(__file__).resolve().parents[1]))
+from line_notifier import MAX_PER_PUSH, MAX_TEXT_LEN, LineNotifier, MockLineServer, split_text  # noqa: E402
+
+
+def _long_report(lines=1200):
+    return "\n".join(f"{i:04d} ❌ 賣出 TICKER-{i} (Regime Fail)" for i in range(lines))
+
+
+def test_split_text_prefers_newlines():
+    text = _long_report()
+    parts = split_text(text)
+    assert all(len(p) <= MAX_TEXT_LEN for p in parts) and len(parts) > MAX_PER_PUSH
+    assert "\n".join(parts) == text  # 只在換行處切，不截斷任何一行
+    assert split_text('x' * 25, max_len=10) == ['x' * 10, 'x' * 10, 'x' * 5]
+
+
+def test_long_message_chunked_per_recipient_in_order():
+    text = _long_report()
+    with MockLineServer() as srv:
+        results = LineNotifier('tok', 'U1,U2', endpoint=srv.url, backoff=0.01).push(text)
+    assert results == {'U1': (True, 'ok', False), 'U2': (True, 'ok', False)}
+    for to in ('U1', 'U2'):
+        batches = [r['messages'] for r in srv.requests if r['to'] == to]
+        assert all(1 <= len(b) <= MAX_PER_PUSH for b in batches)
+        assert "\n".join(m['text'] for b in batches for m in b) == text
+
+
+def test_429_is_retried_with_retry_after():
+    with MockLineServer(fail_first=2, fail_status=429) as srv:
+        results = LineNotifier('tok', 'U1', endpoint=srv.url, backoff=5.0).push('hello')  # Retry-After: 0 優先於 backoff
+    assert results == {'U1': (True, 'ok', False)}
+    assert srv.attempts == 3 and [r['messages'][0]['text'] for r in srv.requests] == ['hello']
+
+
+def test_retries_exhausted_reports_retryable_failure():
+    with MockLineServer(fail_first=100, fail_status=429) as srv:
+        (ok, detail, retryable), = LineNotifier('tok', 'U1', endpoint=srv.url, max_retries=2).push('hello').values()
+    assert not ok and retryable and detail.startswith('HTTP 429') and srv.attempts == 3
@@ -0,0 +1,45 @@
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(__import__('pathlib').Path(__file__).resolve().parents[1]))
+from vanguard_analytics import performance_summary  # noqa: E402
+from vanguard_nav import NavTracker  # noqa: E402
+
+
+def _history(days=300, seed=0):
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range('2025-01-02', periods=days)
+    equity = 10000 * np.cumprod(1 + rng.normal(0.0005, 0.02, days))
+    pnl = rng.normal(5, 50, days)
+    sells = rng.random(days) < 0.1
+    trades = pd.DataFrame({'date': idx[sells], 'side': 'SELL', 'gross_pnl': pnl[sells], 'fee': 1.0, 'tax': 0.0})
+    return pd.DataFrame({'total_equity': equity}, index=idx), trades
+
+
+def test_streaming_metrics_match_performance_summary():
+    equity_df, trades = _history()
+    nav = NavTracker()
+    for k, (date, eq) in enumerate(equity_df['total_equity'].items()):
+        if k == 150: nav = NavTracker.from_dict(json.loads(json.dumps(nav.to_dict())))  # 中途存入 state 再還原
+        fills = [{'side': 'SELL', 'pnl': p} for p in trades.loc[trades['date'] == date, 'gross_pnl']]
+        nav.update(date, eq, eq * 0.5, fills)
+    nav.update(equity_df.index[-1], 1.0, 0.0)  # 重跑同一天不重複累計
+
+    s, ref = nav.summary(), performance_summary(equity_df, trades)
+    assert s['days'] == len(equity_df) and s['equity'] == pytest.approx(ref['final_equity'])
+    for key in ('total_return', 'cagr', 'max_drawdown', 'sharpe', 'sortino', 'calmar', 'win_rate'):
+        assert s[key] == pytest.approx(ref[key], rel=1e-9), key
+    assert s['max_drawdown_date'] == ref['max_drawdown_date'].strftime('%Y-%m-%d')
+    assert s['n_trades'] == ref['n_trades'] and s['avg_exposure'] == pytest.approx(0.5)
+
+
+def test_report_line_needs_two_days():
+    nav = NavTracker()
+    nav.update('2026-10-15', 100.0, 100.0)
+    assert nav.report_line() == ""
+    nav.update('2026-10-16', 90.0, 45.0, [{'side': 'SELL', 'pnl': -3.0}, {'side': 'BUY'}])
+    assert nav.report_line() == "📈 NAV 回撤 -10.0% (最大 -10.0%) | Sharpe 0.00 | 勝率 0% (1) | 曝險 50%"
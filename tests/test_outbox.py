@@ -0,0 +1,58 @@
+import sys
+
+sys.path.insert(0, str(__import__('pathlib').Path(__file__).resolve().parents[1]))
+from line_notifier import LineNotifier, MockLineServer, Outbox  # noqa: E402
+
+
+def _notifier(srv, **kw):
+    return LineNotifier('tok', 'U1', endpoint=srv.url, backoff=0.01, **kw)
+
+
+def test_non_retryable_status_drops_entry(tmp_path):
+    delivered = []
+    outbox = Outbox(str(tmp_path / 'outbox.json'), on_delivered=delivered.append)
+    outbox.enqueue('hello')
+    with MockLineServer(fail_first=100, fail_status=400) as srv:
+        assert outbox.deliver(_notifier(srv)) == (0, 0)
+        assert srv.attempts == 1  # 400 不重試，也不留待下次執行
+    assert delivered == []
+
+
+def test_retryable_status_keeps_entry(tmp_path):
+    outbox = Outbox(str(tmp_path / 'outbox.json'))
+    outbox.enqueue('hello')
+    with MockLineServer(fail_first=100, fail_status=503) as srv:
+        assert outbox.deliver(_notifier(srv, max_retries=1)) == (0, 1)
+    entry, = outbox.pending()
+    assert entry['attempts'] == 1 and entry['last_error'].startswith('HTTP 503')
+
+
+def test_async_delivery_in_order(tmp_path):
+    delivered = []
+    outbox = Outbox(str(tmp_path / 'outbox.json'), on_delivered=delivered.append)
+    ids = [outbox.enqueue('first', source='t'), outbox.enqueue(['second', 'third'], source='t')]
+    with MockLineServer() as srv:
+        outbox.deliver_async(_notifier(srv))
+        assert outbox.wait(10)
+    assert [m['text'] for r in srv.requests for m in r['messages']] == ['first', 'second', 'third']
+    assert [e['id'] for e in delivered] == ids and outbox.pending() == []
+
+
+def test_failed_entry_is_resent_next_run(tmp_path):
+    path = str(tmp_path / 'outbox.json')
+    Outbox(path).enqueue('hello')
+    with MockLineServer(fail_first=100, fail_status=503) as srv:
+        assert Outbox(path).deliver(_notifier(srv, max_retries=0)) == (0, 1)
+    with MockLineServer() as srv:  # 下一次執行：新的 Outbox 物件讀回檔案中的未送達訊息
+        assert Outbox(path).deliver(_notifier(srv)) == (1, 0)
+        assert [r['messages'][0]['text'] for r in srv.requests] == ['hello']
+
+
+def test_wait_times_out_and_keeps_entry(tmp_path):
+    outbox = Outbox(str(tmp_path / 'outbox.json'))
+    outbox.enqueue('slow')
+    with MockLineServer(delay=1.0) as srv:
+        outbox.deliver_async(_notifier(srv))
+        assert not outbox.wait(0.1)
+        assert len(outbox.pending()) == 1
+        assert outbox.wait(10) and outbox.pending() == []
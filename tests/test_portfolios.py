@@ -0,0 +1,20 @@
+import json
+
+from conftest import fresh_state, synth_panel
+
+
+def test_first_run_logs_variant_fills(engine, capsys):
+    """首次執行 (portfolios/ 尚不存在) 變體帳戶的成交也要寫入 portfolios/{name}_trades.csv"""
+    panel = synth_panel(engine)
+    engine.save_state(fresh_state(engine, panel))
+    cfg = engine.StrategyConfig.from_overrides('fast', {'MIN_HOLD_DAYS': 1})
+    cfg.state_file = 'fast.json'  # state 放在 portfolios/ 之外：目錄只可能由成交紀錄建立
+    engine.save_state(fresh_state(engine, panel), cfg.state_file)
+    engine.run_live(variants=[cfg], panel_provider=lambda earliest: panel, memo=False, run_timeout=None)
+
+    out = capsys.readouterr().out
+    assert 'log_broker_trade failed' not in out
+    with open('portfolios/fast_trades.csv') as f: rows = f.read().splitlines()
+    assert rows[0] == engine.BROKER_TRADES_HEADER.strip() and len(rows) > 1
+    with open('fast.json') as f: state = json.load(f)
+    assert state['last_processed_date'] == panel[0].index[-1].strftime('%Y-%m-%d')
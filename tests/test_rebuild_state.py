@@ -0,0 +1,38 @@
+import pandas as pd
+
+from conftest import fresh_state, synth_panel
+
+
+def _simulate(engine):
+    """正式帳戶在合成面板上逐日推進 → state.json + broker_trades.csv，價格快取為同一份面板"""
+    panel = synth_panel(engine)
+    engine.save_state(fresh_state(engine, panel))
+    engine.run_live(panel_provider=lambda earliest: panel, memo=False, run_timeout=None)
+    return panel, engine.load_state()
+
+
+def test_rebuild_round_trip(engine):
+    """[OPT-10] simulate → rebuild：重建結果與 run_live 寫出的 state 一致 (含無成交日推進的 last_processed_date)"""
+    panel, state = _simulate(engine)
+    engine.save_price_cache(panel)
+    rebuilt = engine.rebuild_state_from_trades()
+    assert engine.cross_check_state(rebuilt, state) == []
+    assert rebuilt['last_processed_date'] == panel[0].index[-1].strftime('%Y-%m-%d')
+
+
+def test_rebuild_matches_adjusted_opens(engine):
+    """價格快取為還原權值 (開盤價整體位移 0.2%)：成交日仍以容許誤差對回，不沿用前一筆成交日"""
+    panel, state = _simulate(engine)
+    trades = pd.read_csv(engine.BROKER_TRADES_CSV, parse_dates=['timestamp'])
+    trades['reason'] = trades['reason'].fillna('')
+    close, open_, high, low, is_trading_day = panel[:5]
+    exec_dates = engine._match_exec_dates(trades, open_, high, low, is_trading_day, close['^VIX'])
+    # 每日執行的寫法：成交於執行日前最後一根 bar
+    trades['timestamp'] = (exec_dates + pd.Timedelta(days=1, minutes=10)).strftime('%Y-%m-%d %H:%M:%S')
+    trades.to_csv(engine.BROKER_TRADES_CSV, index=False)
+
+    adjusted = tuple(df * 0.998 if k < 4 else df for k, df in enumerate(panel))
+    assert (engine._match_exec_dates(trades.assign(timestamp=pd.to_datetime(trades['timestamp'])), *adjusted[1:5],
+                                     adjusted[0]['^VIX']) == exec_dates).all()
+    engine.save_price_cache(adjusted)
+    assert engine.cross_check_state(engine.rebuild_state_from_trades(), state) == []
@@ -0,0 +1,51 @@
+import sys
+
+sys.path.insert(0, str(__import__('pathlib').Path(__file__).resolve().parents[1]))
+from vanguard_sql import ResultsDB  # noqa: E402
+
+HEADER = "timestamp,symbol,side,qty,signal_price,fill_price,slippage_pct,reason,sector\n"
+
+
+def _row(k, side='BUY'):
+    return f"2026-10-{k:02d} 00:10:00,SYM{k},{side},1.000000,10.000000,10.010000,+0.1000,BUY_QUEUED,US_STOCK\n"
+
+
+def _fills(db):
+    return db.sql("SELECT account, symbol FROM fills ORDER BY rowid").values.tolist()
+
+
+def test_incremental_import_reads_only_new_complete_lines(tmp_path):
+    csv = tmp_path / 'broker_trades.csv'
+    csv.write_text(HEADER + _row(1) + _row(2))
+    sources = [(str(csv), 'production')]
+    with ResultsDB(str(tmp_path / 'results.db')) as db:
+        assert db.import_fills(sources) == 2
+        assert db.import_fills(sources) == 0
+        with open(csv, 'a') as f: f.write(_row(3) + _row(4)[:20])  # 最後一行寫到一半
+        assert db.import_fills(sources) == 1
+        with open(csv, 'a') as f: f.write(_row(4)[20:])
+        assert db.import_fills(sources) == 1
+        assert [s for _, s in _fills(db)] == ['SYM1', 'SYM2', 'SYM3', 'SYM4']
+    with ResultsDB(str(tmp_path / 'results.db')) as db:  # offset 存在 DB：新行程仍只讀新增的行
+        assert db.import_fills(sources) == 0
+
+
+def test_truncated_file_is_reimported(tmp_path):
+    csv = tmp_path / 'broker_trades.csv'
+    csv.write_text(HEADER + _row(1) + _row(2) + _row(3))
+    sources = [(str(csv), 'production')]
+    with ResultsDB(str(tmp_path / 'results.db')) as db:
+        assert db.import_fills(sources) == 3
+        csv.write_text(HEADER + _row(7, 'SELL'))  # 重建 / 截短
+        assert db.import_fills(sources) == 1
+        assert _fills(db) == [['production', 'SYM7']]
+        assert db.sql("SELECT rows FROM sources").iloc[0, 0] == 1
+
+
+def test_variant_account_from_file_name(tmp_path):
+    (tmp_path / 'portfolios').mkdir()
+    (tmp_path / 'portfolios' / 'fast_trades.csv').write_text(HEADER + _row(1))
+    (tmp_path / 'portfolios' / 'slow_trades.csv').write_text(HEADER + _row(2))
+    with ResultsDB(str(tmp_path / 'results.db')) as db:
+        assert db.import_fills([(str(tmp_path / 'portfolios' / '*_trades.csv'), None)]) == 2
+        assert _fills(db) == [['fast', 'SYM1'], ['slow', 'SYM2']]
@@ -0,0 +1,91 @@
+import os
+import threading
+
+from conftest import fresh_state, synth_panel
+from vanguard_stages import Stage, StageCache, StagePipeline, stage_cancelled
+
+
+def _join_worker(name):
+    for t in threading.enumerate():
+        if t.name == f"stage-{name}": t.join(5)
+
+
+def test_timed_out_worker_is_cancelled():
+    release, seen = threading.Event(), {}
+
+    def slow(x):
+        release.wait(5)
+        seen['cancelled'] = stage_cancelled()
+        return {'y': x}
+
+    def fallback(x):
+        release.set()  # fallback 開始後才讓 worker 繼續：此時必須已看得到取消旗標
+        return {'y': -1}
+
+    pipe = StagePipeline([Stage('slow', slow, ('x',), ('y',), fallback=fallback)])
+    ctx = pipe.run({'x': 1}, timeouts={'slow': 0.05})
+    _join_worker('slow')
+    assert ctx['y'] == -1 and [s for _, s, _ in pipe.log] == ['late']
+    assert seen == {'cancelled': True}
+    assert not stage_cancelled()
+
+
+def test_cancelled_download_does_not_write_price_cache(engine):
+    panel = synth_panel(engine, days=60)
+    worker = threading.Thread(target=engine.save_price_cache, args=(panel,))
+    worker.cancel = threading.Event()
+    worker.cancel.set()
+    worker.start(); worker.join()
+    assert not os.path.exists(engine.PRICE_CACHE_FILE)
+    engine.save_price_cache(panel)
+    assert os.listdir('.') == [engine.PRICE_CACHE_FILE]  # 無殘留 tmp 檔
+
+
+def test_failed_check_is_degraded_and_not_cached(tmp_path):
+    calls = []
+
+    def fetch(n):
+        calls.append(n)
+        return {'rows': [] if len(calls) == 1 else [1, 2]}
+
+    stage = Stage('fetch', fetch, ('n',), ('rows',), pure=False, ttl=3600,
+                  check=lambda rows: None if rows else "empty")
+    pipe = StagePipeline([stage], StageCache(str(tmp_path / 'cache')))
+    statuses = []
+    for _ in range(3):
+        ctx = pipe.run({'n': 1})
+        statuses.append(pipe.log[0][1])
+    assert statuses == ['degraded', 'run', 'hit'] and len(calls) == 2
+    assert ctx['rows'] == [1, 2] and ctx['degraded'] == {}
+
+
+class _EmptyYF:
+    def download(self, *args, **kwargs): return __import__('pandas').DataFrame()
+
+
+def test_empty_download_is_not_memoized(engine):
+    engine.yf = _EmptyYF()
+    for _ in range(2):
+        pipe = engine.run_live(dry_run=True, run_timeout=None)
+        assert pipe.log[1][:2] == ('download', 'degraded')
+
+
+def test_download_check_requires_recent_benchmarks(engine):
+    panel = synth_panel(engine, days=60)
+    assert engine.live_download_check(panel) is None
+    stale = panel[4].copy()
+    stale.loc[stale.index[-10]:, 'SPY'] = False
+    assert 'SPY' in engine.live_download_check(panel[:4] + (stale,) + panel[5:])
+
+
+def test_rerun_after_persist_keeps_intraday_alerts(engine, capsys):
+    """盤中觸發寫進 state：同日重跑 (simulate 無新日期可推進) 的戰報仍列出昨日觸發"""
+    panel = synth_panel(engine, seed=3, end='2026-10-18')
+    last = panel[0].index.get_loc(__import__('pandas').Timestamp('2026-09-03'))  # 此日有 TRAIL_EXIT
+    panel = tuple(df.iloc[:last + 1] for df in panel)
+    engine.save_state(fresh_state(engine, panel))
+    for _ in range(2):
+        engine.run_live(panel_provider=lambda earliest: panel, run_timeout=None)
+        assert '盤中觸發: TRAIL_EXIT' in capsys.readouterr().out
+    state = engine.load_state()
+    assert state['intraday_alerts'] and any(f['reason'] == 'TRAIL_EXIT' for f in state['last_fills'])
@@ -0,0 +1,33 @@
+import os
+import re
+import subprocess
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+from conftest import ROOT, synth_panel
+
+ENGINE = ROOT / 'V18.00_VANGUARD.py'
+
+
+def test_dry_run_first_report_within_budget(engine, tmp_path):
+    """
+    [OPT-21] --dry-run --catch-up：價格快取已到今天 → 不下載、不需網路，
+    import → 第一行輸出 / 戰報第一行須在預算內 (--profile-startup 超出時 exit code 1)
+    """
+    engine.save_price_cache(synth_panel(engine, end=pd.Timestamp(datetime.utcnow().date()) + pd.Timedelta(days=1)))
+    env = {k: v for k, v in os.environ.items() if not k.startswith(('LINE_', 'BITGET_'))}  # 不推播、不連交易所
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(ROOT), env.get('PYTHONPATH')]))
+    env['PYTHONDONTWRITEBYTECODE'] = '1'  # 不在工作目錄留下 __pycache__
+    proc = subprocess.run([sys.executable, str(ENGINE), '--dry-run', '--catch-up', '--no-cache', '--profile-startup'],
+                          cwd=tmp_path, env=env, capture_output=True, text=True, timeout=600)
+    log = proc.stdout[-2000:] + proc.stderr[-2000:]
+    assert '補下載缺口' not in proc.stdout and '完整下載' not in proc.stdout, log
+    assert '🦁 Vanguard 實盤指示 (Dry-Run)' in proc.stdout, log
+    for label in ('第一行輸出', '戰報第一行'):
+        m = re.search(rf'import → {label}:\s+([\d.]+) ms \(預算 (\d+) ms\)', proc.stdout)
+        assert m, log
+        assert float(m.group(1)) <= int(m.group(2)), f"{label} {m.group(1)} ms 超出預算 {m.group(2)} ms"
+    assert proc.returncode == 0, log
+    assert sorted(os.listdir(tmp_path)) == [engine.PRICE_CACHE_FILE, 'run_metrics.jsonl']
@@ -0,0 +1,212 @@
+"""[OPT-11] 陣列化 step_day / DayArrays 與原本逐日 pandas 迴圈 (.loc 版 run_live) 的最終 state 與成交紀錄一致"""
+import copy
+import json
+from datetime import datetime
+
+import pandas as pd
+
+from conftest import fresh_state, synth_panel
+
+REFERENCE_TRADES_CSV = 'reference_trades.csv'
+
+
+def _reference_loop(m, panel, state, today_utc):
+    """OPT-11 之前 run_live 的日迴圈 (逐日 DataFrame.loc)，只保留 state 推進與成交紀錄，不含下載與戰報"""
+    close, open_, high, low, is_trading_day, twd_series, raw_high_twd = panel
+    positions = {sym: m.Position.from_dict(d) for sym, d in state['positions'].items()}
+    completed_dates = [d for d in close.index if d.date() < today_utc]
+    cash = state['cash']
+
+    naive_high_idx = high.index.tz_localize(None)
+    for sym, pos in positions.items():
+        if sym in high.columns:
+            mask = naive_high_idx >= pos.entry_date
+            real_max = high.loc[mask, sym].max()
+            if pd.notna(real_max) and real_max > pos.max_price:
+                pos.max_price = real_max
+                if 'TW' in pos.sector and sym in raw_high_twd.columns:
+                    pos.max_price_twd = float(raw_high_twd.loc[mask, sym].max())
+
+    today_ts = pd.Timestamp(today_utc)
+    cooldown_dict = {sym: pd.Timestamp(d) for sym, d in state['cooldown_dict'].items()}
+    cooldown_dict = {sym: d for sym, d in cooldown_dict.items() if d > today_ts}
+    orders_queue = m.sanitize_queue(positions, state['orders_queue'])
+    orders_queue = [o for o in orders_queue
+                    if not (o['type'] == 'SELL' and o['symbol'] not in positions)
+                    and not (o['type'] == 'BUY' and o['symbol'] in positions)]
+
+    last_processed = pd.Timestamp(state['last_processed_date'])
+    dates_to_process = [d for d in completed_dates if d > last_processed]
+
+    ind = m.compute_indicators(close)
+    benchmarks_ma, spy_ma200, qqq_ma200, vix_series, vol_20 = (ind[k] for k in ('benchmarks_ma', 'spy_ma200', 'qqq_ma200', 'vix_series', 'vol_20'))
+    scores = m.compute_scores(close, is_trading_day, ind)
+
+    def log(sym, side, qty, signal_price, fill_price, reason, sector):
+        m.log_broker_trade(sym, side, qty, float(signal_price), float(fill_price), reason, sector, REFERENCE_TRADES_CSV)
+
+    for date in dates_to_process:
+        date_idx = close.index.get_loc(date)
+        signal_date = close.index[date_idx - 1] if date_idx > 0 else date
+        exec_date = date
+
+        sell_orders = [o for o in orders_queue if o['type'] == 'SELL']
+        buy_orders = [o for o in orders_queue if o['type'] == 'BUY']
+        pending_orders = []
+
+        for o in sell_orders:
+            sym = o['symbol']
+            if sym not in positions: continue
+            if not is_trading_day.loc[exec_date, sym] or pd.isna(open_.loc[exec_date, sym]):
+                pending_orders.append(o)
+                continue
+            exec_price = open_.loc[exec_date, sym] * (1 - m.SLIPPAGE_RATE)
+            comm, tax = m.get_costs(positions[sym].sector, sym, positions[sym].units * exec_price, 'SELL')
+            cash += (positions[sym].units * exec_price) - comm - tax
+            log(sym, 'SELL', positions[sym].units, open_.loc[exec_date, sym], exec_price, o.get('reason', 'SELL_QUEUED'), positions[sym].sector)
+            del positions[sym]
+
+        for o in buy_orders:
+            sym, amount = o['symbol'], o['amount_usd']
+            if sym in positions: continue
+            if not is_trading_day.loc[exec_date, sym] or pd.isna(open_.loc[exec_date, sym]):
+                pending_orders.append(o)
+                continue
+            has_pending_sells = any(x['type'] == 'SELL' for x in pending_orders)
+            if cash < amount * 0.90 and has_pending_sells:
+                pending_orders.append(o)
+                continue
+            if cash <= 0 or (open_.loc[exec_date, sym] / close.loc[signal_date, sym]) > (1 + m.GAP_UP_LIMIT):
+                continue
+            exec_price = open_.loc[exec_date, sym] * (1 + m.SLIPPAGE_RATE)
+            temp_comm, _ = m.get_costs(m.get_sector(sym), sym, 1.0, 'BUY')
+            units = min(cash, amount) / (exec_price * (1 + temp_comm))
+            if units * exec_price < 100: continue
+            cost = units * exec_price
+            comm, _ = m.get_costs(m.get_sector(sym), sym, cost, 'BUY')
+            cash -= (cost + comm)
+            positions[sym] = m.Position(sym, exec_date, exec_price, units, m.get_sector(sym))
+            log(sym, 'BUY', units, open_.loc[exec_date, sym], exec_price, o.get('reason', 'BUY_QUEUED'), m.get_sector(sym))
+
+        orders_queue = pending_orders
+
+        cols_to_del = []
+        curr_vix_trail = vix_series.loc[signal_date] if not pd.isna(vix_series.loc[signal_date]) else 20.0
+        for sym, pos in positions.items():
+            if not is_trading_day.loc[exec_date, sym] or pd.isna(low.loc[exec_date, sym]): continue
+            pos.current_price = close.loc[exec_date, sym]
+            triggered, exec_price, reason = pos.check_intraday_exit(open_.loc[exec_date, sym], high.loc[exec_date, sym], low.loc[exec_date, sym], curr_vix_trail)
+            if triggered:
+                signal_exec_price = exec_price
+                exec_price *= (1 - m.SLIPPAGE_RATE)
+                comm, tax = m.get_costs(pos.sector, sym, pos.units * exec_price, 'SELL')
+                cash += (pos.units * exec_price) - comm - tax
+                if 'CRYPTO' in pos.sector or 'LEV' in pos.sector: cooldown_dict[sym] = exec_date + pd.Timedelta(days=1)
+                else: cooldown_dict[sym] = exec_date + pd.Timedelta(days=5)
+                log(sym, 'SELL', pos.units, signal_exec_price, exec_price, reason, pos.sector)
+                cols_to_del.append(sym)
+        for sym in cols_to_del: del positions[sym]
+
+        curr_vix = vix_series.loc[exec_date] if not pd.isna(vix_series.loc[exec_date]) else 20.0
+
+        holdings_to_sell = []
+        for sym, pos in positions.items():
+            if not is_trading_day.loc[exec_date, sym]: continue
+            if curr_vix > 45.0:
+                if not any(o['type'] == 'SELL' and o['symbol'] == sym for o in orders_queue):
+                    orders_queue.append({'type': 'SELL', 'symbol': sym, 'reason': "VIX>45斷路"})
+                holdings_to_sell.append(sym); continue
+            if (exec_date - pos.entry_date).days > pos.get_params()['zombie'] and pos.current_price <= pos.entry_price:
+                if not any(o['type'] == 'SELL' and o['symbol'] == sym for o in orders_queue):
+                    orders_queue.append({'type': 'SELL', 'symbol': sym, 'reason': "Zombie"})
+                holdings_to_sell.append(sym); continue
+            if not m.check_regime(exec_date, sym, close, benchmarks_ma):
+                if not any(o['type'] == 'SELL' and o['symbol'] == sym for o in orders_queue):
+                    orders_queue.append({'type': 'SELL', 'symbol': sym, 'reason': "Regime Fail"})
+                holdings_to_sell.append(sym); continue
+
+        active_holdings = [s for s in positions if s not in holdings_to_sell
+                           and not any(o['type'] == 'SELL' and o['symbol'] == s for o in orders_queue)]
+        candidates = [s for s in scores.loc[exec_date].dropna().sort_values(ascending=False).index
+                      if s not in positions and m.check_regime(exec_date, s, close, benchmarks_ma)
+                      and (s not in cooldown_dict or exec_date > cooldown_dict[s])
+                      and scores.loc[exec_date, s] >= m.MIN_SCORE_THRESHOLD]
+
+        vix_scaler = 0.4 if curr_vix > 40 else 0.7 if curr_vix > 30 else 1.0 if curr_vix > 20 else 1.15 if curr_vix > 15 else 1.3
+        for sym_upd, pos_upd in positions.items():
+            if sym_upd in close.columns and not pd.isna(close.loc[exec_date, sym_upd]):
+                pos_upd.current_price = close.loc[exec_date, sym_upd]
+        total_eq = cash + sum(p.market_value for p in positions.values())
+
+        macro_bearish = False
+        if spy_ma200 is not None and not pd.isna(spy_ma200.loc[exec_date]) and close.loc[exec_date, 'SPY'] < spy_ma200.loc[exec_date]:
+            macro_bearish = True
+        if qqq_ma200 is not None and not pd.isna(qqq_ma200.loc[exec_date]) and close.loc[exec_date, 'QQQ'] < qqq_ma200.loc[exec_date]:
+            macro_bearish = True
+        if macro_bearish: candidates = []
+
+        def get_pos_size(rank):
+            return total_eq * 0.40 * vix_scaler if rank == 0 else total_eq * 0.30 * vix_scaler
+        proj = list(active_holdings)
+
+        def is_allowed(cand): return True if curr_vix < 25.0 else sum(1 for x in proj if m.get_sector(x) == m.get_sector(cand)) < 2
+
+        while active_holdings and candidates:
+            active_holdings.sort(key=lambda x: scores.loc[exec_date, x] if not pd.isna(scores.loc[exec_date, x]) else -999)
+            worst = active_holdings[0]
+            min_hold = m.MIN_HOLD_DAYS_CRYPTO_SPOT if m.ASSET_MAP.get(worst, '') == 'CRYPTO_SPOT' else m.MIN_HOLD_DAYS
+            if (exec_date - positions[worst].entry_date).days < min_hold: active_holdings.pop(0); continue
+            valid_idx = next((i for i, c in enumerate(candidates) if is_allowed(c)), -1)
+            if valid_idx == -1: break
+            best = candidates[valid_idx]
+            w_score = scores.loc[exec_date, worst] if not pd.isna(scores.loc[exec_date, worst]) else 0
+            b_score = scores.loc[exec_date, best]
+            v_hold = vol_20.loc[exec_date, worst] if not pd.isna(vol_20.loc[exec_date, worst]) else 0.0
+            if b_score > w_score * min(2.0, 1.4 + v_hold * 0.1) and b_score > w_score + 0.05:
+                if not any(o['type'] == 'SELL' and o['symbol'] == worst for o in orders_queue):
+                    orders_queue.append({'type': 'SELL', 'symbol': worst, 'reason': f"Swap to {best}"})
+                if not any(o['type'] == 'BUY' and o['symbol'] == best for o in orders_queue):
+                    orders_queue.append({'type': 'BUY', 'symbol': best, 'amount_usd': get_pos_size(0)})
+                proj.remove(worst); proj.append(best); active_holdings.pop(0); candidates.pop(valid_idx)
+            else: break
+
+        pending_sell_count = len([o for o in orders_queue if o['type'] == 'SELL'])
+        pending_buy_count = len([o for o in orders_queue if o['type'] == 'BUY'])
+        open_slots = m.MAX_TOTAL_POSITIONS - (len(positions) - pending_sell_count + pending_buy_count)
+        for _ in range(max(0, open_slots)):
+            if not candidates or curr_vix > m.PANIC_VIX_THRESHOLD: break
+            valid_idx = next((i for i, c in enumerate(candidates) if is_allowed(c)), -1)
+            if valid_idx != -1:
+                cand = candidates.pop(valid_idx)
+                if not any(o['type'] == 'BUY' and o['symbol'] == cand for o in orders_queue):
+                    orders_queue.append({'type': 'BUY', 'symbol': cand, 'amount_usd': get_pos_size(len(positions))})
+                proj.append(cand)
+
+        orders_queue = m.sanitize_queue(positions, orders_queue)
+        if cash > 0: cash *= ((1 + 0.04) ** (1 / 365))
+        state['last_processed_date'] = exec_date.strftime('%Y-%m-%d')
+
+    state['cash'] = cash
+    state['positions'] = {sym: pos.to_dict() for sym, pos in positions.items()}
+    state['orders_queue'] = orders_queue
+    state['cooldown_dict'] = {sym: d.strftime('%Y-%m-%d') for sym, d in cooldown_dict.items()}
+    return state
+
+
+def _trades(path):
+    """去掉 timestamp (寫入時間) 後的成交列"""
+    with open(path) as f: return [line.split(',', 1)[1] for line in f.read().splitlines()[1:]]
+
+
+def test_step_day_matches_reference_loop(engine):
+    panel = synth_panel(engine, days=600, seed=1)
+    start = fresh_state(engine, panel)
+    expected = _reference_loop(engine, panel, copy.deepcopy(start), datetime.utcnow().date())
+
+    engine.save_state(start)
+    engine.run_live(panel_provider=lambda earliest: panel, memo=False, run_timeout=None)
+    with open(engine.STATE_FILE) as f: actual = json.load(f)
+
+    assert {k: actual[k] for k in expected} == json.loads(json.dumps(expected, default=float))
+    trades = _trades(engine.BROKER_TRADES_CSV)
+    assert len(trades) > 20 and trades == _trades(REFERENCE_TRADES_CSV)
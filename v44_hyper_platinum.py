@@ -15,7 +15,8 @@
 
 import os
 import sys
-import requests
+from line_notifier import LineNotifier
+from run_metrics import RunMetrics, lap, count
 import json
 import warnings
 import pandas as pd
@@ -51,25 +52,10 @@ def send_line_push(msg):
         print("⚠️ 跳過發送：金鑰不完整")
         return
 
-    url = 'https://api.line.me/v2/bot/message/push'
-    headers = {
-        'Content-Type': 'application/json',
-        'Authorization': f'Bearer {FINAL_TOKEN}'
-    }
-    payload = {
-        "to": FINAL_USER_ID,
-        "messages": [{"type": "text", "text": msg}]
-    }
-    
-    try:
-        print("📤 正在推送 LINE 訊息...")
-        response = requests.post(url, headers=headers, json=payload)
-        if response.status_code == 200:
-            print("✅ 發送成功！")
-        else:
-            print(f"❌ 發送失敗: {response.status_code} {response.text}")
-    except Exception as e:
-        print(f"❌ 網絡錯誤: {e}")
+    print("📤 正在推送 LINE 訊息...")
+    for to, (ok, detail, _) in LineNotifier(FINAL_TOKEN, FINAL_USER_ID).push(msg).items():
+        if ok: print("✅ 發送成功！")
+        else: print(f"❌ 發送失敗: {detail}")
 
 # 自動安裝依賴
 try:
@@ -386,15 +372,24 @@ def print_dashboard_preview(msg):
 # 主程式
 # ==========================================
 if __name__ == "__main__":
-    try:
-        raw = fetch_data()
-        processed = process_data(raw)
-        if processed and 'BTC' in processed:
-            stat, today = analyze_market(processed)
-            line_msg = generate_report(stat, today)
-            # print(line_msg) # 本地測試用
-            send_line_push(line_msg)
-        else:
-            print("❌ 無法獲取數據")
-    except Exception as e:
-        print(f"❌ 錯誤: {e}")
+    # [OPT-24] 各階段 wall / CPU / RSS 寫入 run_metrics.jsonl
+    with RunMetrics('V44_Platinum') as metrics:
+        try:
+            raw = fetch_data()
+            lap('download')
+            processed = process_data(raw)
+            lap('indicators'); count('tickers', len(processed or {}))
+            if processed and 'BTC' in processed:
+                stat, today = analyze_market(processed)
+                lap('signals')
+                line_msg = generate_report(stat, today)
+                lap('report')
+                # print(line_msg) # 本地測試用
+                send_line_push(line_msg)
+                lap('notify')
+            else:
+                metrics.status = 'no data'
+                print("❌ 無法獲取數據")
+        except Exception as e:
+            metrics.status = f"error: {str(e)[:120]}"
+            print(f"❌ 錯誤: {e}")
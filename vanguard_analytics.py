@@ -0,0 +1,341 @@
+# =========================================================
+# Vanguard Analytics
+# [OPT-29] 回測績效分析：全部以向量化運算產生結構化表格，文字報表 / 熱力圖只是其上的渲染層
+#   - 取代 print_performance / print_diagnostics 內的 groupby lambda、iterrows 與手工月報酬 dict
+#   - symbol / market / reason 轉 category 後 groupby (observed)，勝場數為預先算好的布林欄加總
+#   - 持有天數：每筆 SELL 對應同標的前一筆 BUY (引擎同一標的最多一個部位)，以 groupby ffill 一次配對
+#   - 數百萬筆的參數掃描 trade log 亦可在數秒內完成 (load_trade_log 只讀需要的欄位並直接轉 category)
+#
+#   tables = analyze(equity_df, trade_log_df)
+#   tables['monthly']       # 年 × 月報酬 pivot (+ Annual)
+#   tables['sectors']       # 板塊歸因 (損益、佔比、對初始資金的報酬貢獻)
+#   tables['symbols']       # 各標的損益
+#   tables['holding']       # 持有天數分布
+#   tables['exit_reasons']  # 出場原因組成
+#
+#   python vanguard_analytics.py trade_log.csv equity_curve.csv --out analytics/ --heatmap monthly.png
+# =========================================================
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+TRADE_COLUMNS = ['fill_time', 'market', 'symbol', 'side', 'fee', 'tax', 'gross_pnl', 'net_pnl', 'reason']
+# 持有天數分箱 (右閉)：當日進出 / 1 天 / 2-3 / ...
+HOLDING_BINS = [-np.inf, 0, 1, 3, 5, 10, 20, 60, np.inf]
+HOLDING_LABELS = ['0', '1', '2-3', '4-5', '6-10', '11-20', '21-60', '61+']
+HEATMAP_THRESHOLD = 0.05
+REASON_TARGET_RE = r' (?:to|from) \S+$'  # "Swap to NVDA" → "Swap"：出場原因組成不依換股對象拆分
+
+
+def load_trade_log(path):
+    """trade_log.csv → DataFrame (只讀分析所需欄位；字串欄直接讀成 category)"""
+    header = pd.read_csv(path, nrows=0).columns
+    usecols = [c for c in TRADE_COLUMNS + ['timestamp', 'entry_time'] if c in header]
+    dtype = {c: 'category' for c in ('market', 'symbol', 'side', 'reason') if c in usecols}
+    return pd.read_csv(path, usecols=usecols, dtype=dtype)
+
+
+def load_equity_curve(path):
+    return pd.read_csv(path, index_col='date', parse_dates=['date'])
+
+
+# =========================
+# 平倉紀錄
+# =========================
+def prepare_trades(trade_log_df):
+    """
+    SELL 紀錄 → symbol / market / reason (category)、fill_time、損益、win、holding_days
+    reason 去掉換股對象 (只在 category 層級處理，不逐筆字串運算)
+    trade log 有 entry_time 欄時直接使用，否則以同標的前一筆 BUY 的成交日配對
+    """
+    cols = ['symbol', 'market', 'reason', 'fill_time', 'gross_pnl', 'net_pnl', 'fee', 'tax', 'win', 'holding_days']
+    if trade_log_df is None or trade_log_df.empty: return pd.DataFrame(columns=cols)
+    df = trade_log_df
+    side = df['side'].to_numpy()
+    is_sell = side == 'SELL'
+    fill = pd.to_datetime(df['fill_time' if 'fill_time' in df else 'timestamp'])
+    symbol = df['symbol'].astype('category')
+    if 'entry_time' in df:
+        entry = pd.to_datetime(df['entry_time'])
+    else:
+        entry = fill.where(side == 'BUY').groupby(symbol.cat.codes.to_numpy()).ffill()
+    holding = (fill - entry).dt.days
+    reason = df['reason'].fillna('').astype('category')
+    kinds = reason.cat.categories.str.replace(REASON_TARGET_RE, '', regex=True)
+    reason = pd.Series(pd.Categorical(kinds.to_numpy()[reason.cat.codes.to_numpy()]), index=df.index)
+    out = pd.DataFrame({
+        'symbol': symbol[is_sell],
+        'market': df['market'].astype('category')[is_sell],
+        'reason': reason[is_sell],
+        'fill_time': fill[is_sell],
+        'gross_pnl': df['gross_pnl'][is_sell].astype(float),
+        'net_pnl': df['net_pnl'][is_sell].astype(float),
+        'fee': df['fee'][is_sell].astype(float),
+        'tax': df['tax'][is_sell].astype(float),
+        'holding_days': holding[is_sell],
+    })
+    out['win'] = out['gross_pnl'].to_numpy() > 0
+    return out[cols].reset_index(drop=True)
+
+
+def _pnl_table(sells, key, sort='total_gross_pnl'):
+    g = sells.groupby(key, observed=True)
+    out = g.agg(
+        n_trades=('gross_pnl', 'count'),
+        total_gross_pnl=('gross_pnl', 'sum'),
+        avg_gross_pnl=('gross_pnl', 'mean'),
+        total_net_pnl=('net_pnl', 'sum'),
+        win_count=('win', 'sum'),
+        avg_holding_days=('holding_days', 'mean'),
+    )
+    out['win_rate'] = out['win_count'] / out['n_trades']
+    return out.sort_values(sort, ascending=False)
+
+
+def symbol_pnl(sells):
+    """各標的損益 (依總 Gross PnL 由高至低)"""
+    out = _pnl_table(sells, 'symbol')
+    out.insert(0, 'sector', sells.groupby('symbol', observed=True)['market'].first().reindex(out.index).astype(str))
+    return out
+
+
+def sector_attribution(sells, initial_equity=None):
+    """板塊歸因：pnl_share = 佔全部 Gross PnL 比例；contribution = Net PnL / 初始資金"""
+    out = _pnl_table(sells, 'market')
+    out['costs'] = sells.groupby('market', observed=True)[['fee', 'tax']].sum().sum(axis=1).reindex(out.index)
+    total = out['total_gross_pnl'].sum()
+    out['pnl_share'] = out['total_gross_pnl'] / total if total else np.nan
+    out['contribution'] = out['total_net_pnl'] / initial_equity if initial_equity else np.nan
+    return out
+
+
+def holding_distribution(sells):
+    """持有天數分布 (無法配對進場日的平倉不列入)"""
+    bucket = pd.cut(sells['holding_days'], HOLDING_BINS, labels=HOLDING_LABELS)
+    g = sells.groupby(bucket, observed=False)
+    out = g.agg(
+        n_trades=('gross_pnl', 'count'),
+        total_gross_pnl=('gross_pnl', 'sum'),
+        avg_gross_pnl=('gross_pnl', 'mean'),
+        win_count=('win', 'sum'),
+    )
+    out.index.name = 'holding_days'
+    out['share'] = out['n_trades'] / max(out['n_trades'].sum(), 1)
+    out['win_rate'] = out['win_count'] / out['n_trades'].replace(0, np.nan)
+    return out
+
+
+def exit_reasons(sells):
+    """出場原因組成 (依筆數由多至少)"""
+    out = _pnl_table(sells, 'reason', sort='n_trades')
+    out['share'] = out['n_trades'] / max(len(sells), 1)
+    return out
+
+
+# =========================
+# Equity curve
+# =========================
+def performance_summary(equity_df, trade_log_df=None):
+    """print_performance 的全部指標 (dict)"""
+    eq = equity_df['total_equity']
+    initial_eq, final_eq = eq.iloc[0], eq.iloc[-1]
+    total_return = (final_eq / initial_eq) - 1
+    n_days = (eq.index[-1] - eq.index[0]).days
+    n_years = n_days / 365.25 if n_days > 0 else 1
+    cagr = (final_eq / initial_eq) ** (1 / n_years) - 1 if n_years > 0 else 0
+    drawdown = (eq - eq.cummax()) / eq.cummax()
+    max_dd = drawdown.min()
+    daily_ret = eq.pct_change().dropna()
+    sharpe = daily_ret.mean() / daily_ret.std() * np.sqrt(252) if daily_ret.std() > 0 else 0
+    downside = daily_ret[daily_ret < 0]
+    sortino = daily_ret.mean() / downside.std() * np.sqrt(252) if len(downside) > 0 and downside.std() > 0 else 0
+    n_trades = n_wins = 0
+    total_fees = total_tax = 0
+    if trade_log_df is not None and not trade_log_df.empty:
+        is_sell = trade_log_df['side'].to_numpy() == 'SELL'
+        n_trades = int(is_sell.sum())
+        n_wins = int((trade_log_df['gross_pnl'].to_numpy()[is_sell] > 0).sum())
+        total_fees = trade_log_df['fee'].sum()
+        total_tax = trade_log_df['tax'].sum()
+    return {
+        'start': eq.index[0], 'end': eq.index[-1], 'n_days': n_days,
+        'initial_equity': initial_eq, 'final_equity': final_eq,
+        'total_return': total_return, 'cagr': cagr, 'max_drawdown': max_dd,
+        'max_drawdown_date': drawdown.idxmin(),
+        'sharpe': sharpe, 'sortino': sortino, 'calmar': cagr / abs(max_dd) if max_dd != 0 else 0,
+        'n_trades': n_trades, 'win_rate': n_wins / n_trades if n_trades > 0 else 0,
+        'total_fees': total_fees, 'total_tax': total_tax,
+    }
+
+
+def yearly_returns(equity_df):
+    """各年度：年初至年末報酬、年內最大回撤、年末資產"""
+    eq = equity_df['total_equity']
+    year = eq.index.year
+    g = eq.groupby(year)
+    out = pd.DataFrame({
+        'return': g.last() / g.first() - 1,
+        'max_drawdown': (eq / g.cummax() - 1).groupby(year).min(),
+        'end_equity': g.last(),
+    })
+    out.index.name = 'year'
+    return out
+
+
+def monthly_returns(equity_df):
+    """年 × 月 (1..12) 報酬 pivot (月初至月末)；Annual = 各月連乘"""
+    eq = equity_df['total_equity']
+    g = eq.groupby([eq.index.year, eq.index.month])
+    pivot = (g.last() / g.first() - 1).unstack().reindex(columns=range(1, 13))
+    pivot.index.name, pivot.columns.name = 'year', 'month'
+    pivot['Annual'] = (1 + pivot).prod(axis=1) - 1
+    return pivot
+
+
+def analyze(equity_df, trade_log_df):
+    """全部表格：summary / yearly / monthly / symbols / sectors / holding / exit_reasons"""
+    sells = prepare_trades(trade_log_df)
+    tables = {'sells': sells}
+    if equity_df is not None and not equity_df.empty:
+        tables['summary'] = performance_summary(equity_df, trade_log_df)
+        tables['yearly'] = yearly_returns(equity_df)
+        tables['monthly'] = monthly_returns(equity_df)
+    initial = tables['summary']['initial_equity'] if 'summary' in tables else None
+    tables['symbols'] = symbol_pnl(sells)
+    tables['sectors'] = sector_attribution(sells, initial)
+    tables['holding'] = holding_distribution(sells)
+    tables['exit_reasons'] = exit_reasons(sells)
+    return tables
+
+
+# =========================
+# 渲染層 (文字報表)
+# =========================
+def render_performance(s):
+    print("\n" + "=" * 60)
+    print("📊 績效報表 (Performance Report)")
+    print("=" * 60)
+    print(f"\n📅 回測期間: {s['start'].strftime('%Y-%m-%d')} ~ {s['end'].strftime('%Y-%m-%d')} ({s['n_days']} 天)")
+    print(f"💰 初始資金: ${s['initial_equity']:,.2f}")
+    print(f"💰 最終資產: ${s['final_equity']:,.2f}")
+    print(f"📈 累積報酬: {s['total_return']:.2%}")
+    print(f"📈 CAGR: {s['cagr']:.2%}")
+    print(f"📉 Max Drawdown: {s['max_drawdown']:.2%} (於 {s['max_drawdown_date'].strftime('%Y-%m-%d')})")
+    print(f"📊 Sharpe Ratio: {s['sharpe']:.2f}")
+    print(f"📊 Sortino Ratio: {s['sortino']:.2f}")
+    print(f"🔄 總交易筆數 (賣出): {s['n_trades']}")
+    print(f"✅ 勝率: {s['win_rate']:.1%}")
+    print(f"💸 總手續費: ${s['total_fees']:,.2f}")
+    print(f"💸 總交易稅: ${s['total_tax']:,.2f}")
+    print(f"💸 總成本: ${s['total_fees'] + s['total_tax']:,.2f}")
+    print(f"📊 Calmar Ratio: {s['calmar']:.2f}")
+
+
+def _print_symbols(title, table):
+    print(f"\n{title}")
+    print(f"{'Symbol':<16} {'Sector':<14} {'Trades':>6} {'Gross PnL':>12} {'Net PnL':>12} {'WinRate':>8}")
+    print("-" * 70)
+    for sym, r in zip(table.index, table.itertuples(index=False)):
+        print(f"{sym:<16} {r.sector:<14} {r.n_trades:>6} ${r.total_gross_pnl:>10,.2f} ${r.total_net_pnl:>10,.2f} {r.win_rate:>7.0%}")
+
+
+def render_heatmap(monthly):
+    """月度報酬熱力圖 (文字版)：|r| > 5% 以 🟢 / 🔴 標示"""
+    print("\n📊 月度報酬熱力圖")
+    header = f"{'Year':<8}" + "".join(f"{'M'+str(m):>8}" for m in range(1, 13)) + f"{'Annual':>10}"
+    print(header)
+    print("-" * len(header))
+    for year, row in zip(monthly.index, monthly.to_numpy()):
+        line = f"{year:<8}"
+        for r in row[:12]:
+            if np.isnan(r): line += f"{'---':>8}"
+            elif r > HEATMAP_THRESHOLD: line += f"{'🟢'+f'{r:.1%}':>8}"
+            elif r < -HEATMAP_THRESHOLD: line += f"{'🔴'+f'{r:.1%}':>8}"
+            else: line += f"{r:>7.1%} "
+        print(line + f"{row[12]:>9.1%}")
+
+
+def render_diagnostics(tables):
+    print("\n" + "=" * 60)
+    print("🔬 板塊深度診斷 (Sector Diagnostics)")
+    print("=" * 60)
+    symbols = tables['symbols']
+    _print_symbols("🏆 Top 10 標的 (依總 Gross PnL)", symbols.head(10))
+    _print_symbols("💀 Bottom 10 標的 (依總 Gross PnL)", symbols.tail(10))
+    print("\n📊 板塊彙總")
+    print(f"{'Sector':<16} {'Trades':>6} {'Total PnL':>12} {'Avg PnL':>10} {'WinRate':>8} {'Share':>8} {'Contrib':>9}")
+    print("-" * 75)
+    for sec, r in zip(tables['sectors'].index, tables['sectors'].itertuples(index=False)):
+        print(f"{sec:<16} {r.n_trades:>6} ${r.total_gross_pnl:>10,.2f} ${r.avg_gross_pnl:>8,.2f} {r.win_rate:>7.0%} {r.pnl_share:>7.0%} {r.contribution:>8.1%}")
+    if 'yearly' in tables:
+        print("\n📅 年度報酬率")
+        print(f"{'Year':<8} {'Return':>10} {'MaxDD':>10} {'EndEquity':>14}")
+        print("-" * 45)
+        for year, r in zip(tables['yearly'].index, tables['yearly'].itertuples(index=False)):
+            print(f"{year:<8} {r[0]:>9.2%} {r[1]:>9.2%} ${r[2]:>12,.2f}")
+        render_heatmap(tables['monthly'])
+    print("\n⏳ 持有天數分布")
+    print(f"{'Days':<8} {'Trades':>6} {'Share':>7} {'Total PnL':>12} {'Avg PnL':>10} {'WinRate':>8}")
+    print("-" * 56)
+    for bucket, r in zip(tables['holding'].index, tables['holding'].itertuples(index=False)):
+        if not r.n_trades: continue
+        print(f"{bucket:<8} {r.n_trades:>6} {r.share:>6.0%} ${r.total_gross_pnl:>10,.2f} ${r.avg_gross_pnl:>8,.2f} {r.win_rate:>7.0%}")
+    print("\n🚪 出場原因")
+    print(f"{'Reason':<20} {'Trades':>6} {'Share':>7} {'Total PnL':>12} {'Avg PnL':>10} {'WinRate':>8} {'AvgDays':>8}")
+    print("-" * 77)
+    for reason, r in zip(tables['exit_reasons'].index, tables['exit_reasons'].itertuples(index=False)):
+        print(f"{str(reason)[:20]:<20} {r.n_trades:>6} {r.share:>6.0%} ${r.total_gross_pnl:>10,.2f} ${r.avg_gross_pnl:>8,.2f} {r.win_rate:>7.0%} {r.avg_holding_days:>8.1f}")
+
+
+def plot_monthly_heatmap(monthly, path):
+    """月度報酬熱力圖 (PNG)"""
+    import matplotlib  # 延遲載入：只有輸出圖檔時才需要
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    data = monthly.drop(columns='Annual').to_numpy(dtype=float)
+    limit = np.nanmax(np.abs(data)) if np.isfinite(data).any() else 0.1
+    fig, ax = plt.subplots(figsize=(12, 0.6 * len(monthly) + 1.5))
+    im = ax.imshow(data, cmap='RdYlGn', vmin=-limit, vmax=limit, aspect='auto')
+    ax.set_xticks(range(12), [f"M{m}" for m in range(1, 13)])
+    ax.set_yticks(range(len(monthly)), monthly.index)
+    for (i, j), r in np.ndenumerate(data):
+        if not np.isnan(r): ax.text(j, i, f"{r:.1%}", ha='center', va='center', fontsize=8)
+    fig.colorbar(im, ax=ax, format=lambda x, _: f"{x:.0%}")
+    ax.set_title("Monthly Returns")
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    plt.close(fig)
+    return path
+
+
+def write_tables(tables, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    for name, table in tables.items():
+        if name == 'sells' or not isinstance(table, pd.DataFrame): continue
+        path = os.path.join(out_dir, f"{name}.csv")
+        table.to_csv(path)
+        written.append(path)
+    if 'summary' in tables:
+        path = os.path.join(out_dir, 'summary.csv')
+        pd.Series(tables['summary']).to_csv(path, header=['value'])
+        written.append(path)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="回測績效分析 (trade_log.csv / equity_curve.csv)")
+    parser.add_argument("trades", help="trade_log.csv")
+    parser.add_argument("equity", nargs='?', help="equity_curve.csv (省略時只分析交易)")
+    parser.add_argument("--out", metavar="DIR", help="各表格輸出為 DIR/<table>.csv")
+    parser.add_argument("--heatmap", metavar="PNG", help="月度報酬熱力圖輸出路徑 (需 matplotlib)")
+    parser.add_argument("--quiet", action="store_true", help="不印文字報表")
+    args = parser.parse_args()
+    tables = analyze(load_equity_curve(args.equity) if args.equity else None, load_trade_log(args.trades))
+    if not args.quiet:
+        if 'summary' in tables: render_performance(tables['summary'])
+        render_diagnostics(tables)
+    if args.out: print(f"\n📁 表格已輸出: {', '.join(write_tables(tables, args.out))}")
+    if args.heatmap and 'monthly' in tables: print(f"📁 熱力圖: {plot_monthly_heatmap(tables['monthly'], args.heatmap)}")
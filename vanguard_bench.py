@@ -0,0 +1,256 @@
+# =========================================================
+# Vanguard Benchmark Suite
+# [OPT-27] 離線可重現的效能基準：固定 seed 的 vanguard_synth 合成市場 (引擎 universe) 當作 yfinance，不需網路
+#   - get_data       : yf.download 結果 → 面板 reshape / 台股匯率換算 / 價格快取寫入
+#   - indicators     : compute_indicators (均線 / 動能 / 波動)
+#   - scores         : compute_scores (分數矩陣 + 非交易日遮蔽)
+#   - run_live_30d   : run_live 補跑 30 個交易日 (dry-run、不讀寫 stage 快取)
+#   - backtest       : 回測引擎 2021-11-01 ~ 2026-02-26 完整 run_backtest
+#   - report         : print_performance + print_diagnostics (回測結果)
+#   每個 case 重複 N 次取 median / p95；另跑一次 tracemalloc 量測 Python 配置峰值 (numpy 陣列亦計入)
+#   基準檔記錄 fixture 雜湊：fixture 產生方式改變時拒絕比較 (需重新 --save)
+#
+#   python vanguard_bench.py                          # 執行全部並與 bench_baseline.json 比較 (超出門檻 exit 1)
+#   python vanguard_bench.py --save                   # 寫入 / 更新基準
+#   python vanguard_bench.py --cases scores,backtest --repeat 3 --threshold 10
+#   bench_baseline.json 為本機開發基準；CI (V180_Omega_workflow.yml 的 bench job) 另以 runner 自己的快取基準比較
+# =========================================================
+import argparse
+import contextlib
+import gc
+import importlib.util
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from importlib.machinery import SourceFileLoader
+
+import numpy as np
+import pandas as pd
+
+from vanguard_stages import content_hash
+from vanguard_synth import engine_market
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LIVE_ENGINE = os.path.join(HERE, 'V18.00_VANGUARD.py')
+BACKTEST_ENGINE = os.path.join(HERE, 'V18.00 VANGUARD BACKTEST ENGINE')
+BASELINE_FILE = 'bench_baseline.json'
+REGRESSION_THRESHOLD_PCT = 15.0
+FIXTURE_SEED = 2026
+FIXTURE_VERSION = 2  # 2: fixture 改由 vanguard_synth.engine_market 產生
+
+BACKTEST_START, BACKTEST_END = '2021-11-01', '2026-02-26'
+LIVE_FIXTURE_DAYS = 420       # ≥ DATA_DOWNLOAD_DAYS (350) + 30 天補跑
+CATCH_UP_DAYS = 30
+
+
+def load_engine(path, name):
+    loader = SourceFileLoader(name, path)
+    spec = importlib.util.spec_from_loader(name, loader)
+    mod = importlib.util.module_from_spec(spec)
+    loader.exec_module(mod)
+    return mod
+
+
+# =========================
+# Cases：setup (不計時) 回傳要計時的無參數函式
+# =========================
+class Suite:
+    def __init__(self, workdir, seed=FIXTURE_SEED):
+        self.workdir, self.seed = workdir, seed
+        self._memo = {}
+
+    def _get(self, key, build):
+        if key not in self._memo: self._memo[key] = build()
+        return self._memo[key]
+
+    @property
+    def live(self):
+        return self._get('live', lambda: load_engine(LIVE_ENGINE, 'bench_live'))
+
+    @property
+    def bt(self):
+        return self._get('bt', lambda: load_engine(BACKTEST_ENGINE, 'bench_backtest'))
+
+    @property
+    def live_fixture(self):
+        """SyntheticMarket：download() 與 yf.download 相容，直接設為 engine.yf"""
+        start = pd.Timestamp(BACKTEST_END) - pd.Timedelta(days=LIVE_FIXTURE_DAYS)
+        return self._get('live_fixture', lambda: engine_market(self.live, start, BACKTEST_END, self.seed))
+
+    @property
+    def bt_fixture(self):
+        start = pd.Timestamp(BACKTEST_START) - pd.Timedelta(days=200)
+        return self._get('bt_fixture', lambda: engine_market(self.bt, start, BACKTEST_END, self.seed))
+
+    def fixture_hash(self):
+        return content_hash(FIXTURE_VERSION, self.live_fixture.raw, self.bt_fixture.raw)[:16]
+
+    def panel(self):
+        def build():
+            self.live.yf = self.live_fixture
+            return self.live.get_data(start_date=self.live_fixture.raw.index[0])
+        return self._get('panel', build)
+
+    def backtest_result(self):
+        def build():
+            self.bt.yf = self.bt_fixture
+            return self.bt.run_backtest(BACKTEST_START, BACKTEST_END)
+        return self._get('backtest_result', build)
+
+    # ---- cases ----
+    def case_get_data(self):
+        m = self.live
+        m.yf = self.live_fixture
+        start = self.live_fixture.raw.index[0]
+        def run():
+            if os.path.exists(m.PRICE_CACHE_FILE): os.remove(m.PRICE_CACHE_FILE)  # 每次都是首次寫入，不受前一次合併影響
+            m.get_data(start_date=start)
+        return run
+
+    def case_indicators(self):
+        close = self.panel()[0]
+        return lambda: self.live.compute_indicators(close)
+
+    def case_scores(self):
+        close, is_trading_day = self.panel()[0], self.panel()[4]
+        ind = self.live.compute_indicators(close)
+        return lambda: self.live.compute_scores(close, is_trading_day, ind)
+
+    def case_run_live_30d(self):
+        m, panel = self.live, self.panel()
+        dates = panel[0].index
+        state = {'cash': m.INITIAL_CAPITAL_USD, 'positions': {}, 'orders_queue': [], 'cooldown_dict': {},
+                 'last_processed_date': dates[-CATCH_UP_DAYS - 1].strftime('%Y-%m-%d')}
+        with open(m.STATE_FILE, 'w') as f: json.dump(state, f)
+        return lambda: m.run_live(dry_run=True, memo=False, panel_provider=lambda earliest: panel, run_timeout=None)
+
+    def case_backtest(self):
+        m = self.bt
+        m.yf = self.bt_fixture
+        m.INDICATOR_CACHE.enabled = False  # 量測完整計算 (重複執行不讀 .indicator_cache)
+        def run(): self._memo['backtest_result'] = m.run_backtest(BACKTEST_START, BACKTEST_END)  # report case 沿用
+        return run
+
+    def case_report(self):
+        equity_df, trade_log_df = self.backtest_result()
+        def run():
+            self.bt.print_performance(equity_df, trade_log_df)
+            self.bt.print_diagnostics(equity_df, trade_log_df)
+        return run
+
+
+CASES = {  # name: 預設重複次數
+    'get_data': 7,
+    'indicators': 7,
+    'scores': 7,
+    'run_live_30d': 5,
+    'backtest': 3,
+    'report': 7,
+}
+
+
+def measure(fn, repeat, memory=True):
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        finally:
+            tracemalloc.stop()
+    times = np.array(times)
+    return {'n': repeat, 'median_s': float(np.median(times)), 'p95_s': float(np.percentile(times, 95)),
+            'min_s': float(times.min()), 'peak_mb': peak}
+
+
+def run_suite(cases, repeat=None, memory=True, seed=FIXTURE_SEED):
+    workdir = tempfile.mkdtemp(prefix='vanguard_bench_')
+    cwd = os.getcwd()
+    results = {}
+    try:
+        os.chdir(workdir)  # state.json / price_cache.pkl / run_metrics.jsonl 都寫在暫存目錄
+        suite = Suite(workdir, seed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            fixture = suite.fixture_hash()
+        for name in cases:
+            with contextlib.redirect_stdout(io.StringIO()):
+                fn = getattr(suite, f"case_{name}")()
+                results[name] = measure(lambda: fn(), repeat or CASES[name], memory)
+            r = results[name]
+            print(f"   ⏱️ {name:<14} median {r['median_s'] * 1000:9.1f} ms", file=sys.stderr)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {'fixture': fixture, 'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'machine': platform.machine(), 'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'cases': results}
+
+
+def compare(report, baseline, threshold_pct):
+    """回傳 (表格列, 是否有退步)；fixture 不同時不比較"""
+    rows, regressed = [], False
+    same_fixture = baseline is not None and baseline.get('fixture') == report['fixture']
+    limit = 1 + threshold_pct / 100
+    rows.append(f"{'case':<14} {'n':>3} {'median':>10} {'p95':>10} {'peak MB':>9}   {'baseline':>10} {'Δ median':>9} {'Δ peak':>8}")
+    for name, r in report['cases'].items():
+        peak = '-' if r['peak_mb'] is None else f"{r['peak_mb']:.1f}"
+        line = f"{name:<14} {r['n']:>3} {r['median_s'] * 1000:>8.1f}ms {r['p95_s'] * 1000:>8.1f}ms {peak:>9}"
+        b = baseline['cases'].get(name) if same_fixture else None
+        if b:
+            dt = r['median_s'] / b['median_s'] - 1
+            dm = r['peak_mb'] / b['peak_mb'] - 1 if r['peak_mb'] and b.get('peak_mb') else None
+            bad = r['median_s'] > b['median_s'] * limit or (dm is not None and dm + 1 > limit)
+            regressed |= bad
+            line += (f"   {b['median_s'] * 1000:>8.1f}ms {dt:>+9.1%} {'' if dm is None else f'{dm:+.1%}':>8}"
+                     f"  {'❌ 退步' if bad else '✅'}")
+        rows.append(line)
+    if baseline is not None and not same_fixture:
+        rows.append(f"⚠️ 基準的 fixture ({baseline.get('fixture')}) 與本次 ({report['fixture']}) 不同，未比較；請以 --save 重建基準")
+    return rows, regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vanguard 離線效能基準")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"逗號分隔：{', '.join(CASES)}")
+    parser.add_argument("--repeat", type=int, default=None, help="每個 case 重複次數 (預設依 case)")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save", action="store_true", help="將本次結果寫入基準檔 (保留未執行 case 的舊基準)")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD_PCT, help="median / peak 超出基準多少 %% 視為退步")
+    parser.add_argument("--no-memory", action="store_true", help="略過 tracemalloc 峰值量測 (較快)")
+    parser.add_argument("--json", metavar="PATH", help="另存本次結果 JSON")
+    args = parser.parse_args()
+
+    cases = [c.strip() for c in args.cases.split(',') if c.strip()]
+    unknown = [c for c in cases if c not in CASES]
+    if unknown: parser.error(f"未知 case: {', '.join(unknown)}")
+    print(f"🏁 Vanguard Benchmark ({len(cases)} cases, fixture seed {FIXTURE_SEED})", file=sys.stderr)
+    report = run_suite(cases, args.repeat, memory=not args.no_memory)
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f: baseline = json.load(f)
+    rows, regressed = compare(report, None if args.save else baseline, args.threshold)
+    print("\n".join(rows))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f: json.dump(report, f, indent=2)
+    if args.save:
+        if baseline is not None and baseline.get('fixture') == report['fixture']:
+            report['cases'] = {**baseline['cases'], **report['cases']}
+        with open(args.baseline, 'w', encoding='utf-8') as f: json.dump(report, f, indent=2)
+        print(f"💾 基準已寫入 {args.baseline}")
+    elif baseline is None:
+        print(f"ℹ️ 尚無基準 ({args.baseline})，以 --save 建立")
+    elif regressed:
+        print(f"❌ 效能退步超過 {args.threshold:.0f}%")
+        sys.exit(1)
@@ -0,0 +1,242 @@
+# =========================================================
+# Vanguard Execution Adapter + Local Paper Broker
+# [OPT-19] orders_queue → 下單介面 (ExecutionAdapter)，附本機紙上券商模擬器
+#   - PaperBrokerServer: HTTP (JSON) 接單，以快取 K 棒成交 (as_of 之後第一根開盤價；尚無下一根則用最後收盤)
+#                        可設定延遲 (latency_ms ± jitter) 與滑價 (slippage_bps，買加賣減)
+#   - PaperBrokerAdapter: 將 BUY(amount_usd)/SELL(持倉 units) 轉為委託，逐筆並行送出並量測往返延遲
+#   - 未來接 Alpaca / Binance 只需實作同樣的 submit() 介面
+#
+#   python vanguard_broker.py --serve 8700 --latency-ms 50 --slippage-bps 5   # 啟動模擬器
+#   python vanguard_broker.py --bench 500 --latency-ms 20                     # 延遲 / 吞吐量測試
+#   python V18.00_VANGUARD.py --execute paper                                  # 實盤流程送單到內建模擬器
+# =========================================================
+import abc
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+PRICE_CACHE_FILE = 'price_cache.pkl'
+
+
+class ExecutionAdapter(abc.ABC):
+    """下單介面：submit(orders, positions, as_of) → list[fill dict]"""
+    name = 'base'
+
+    @abc.abstractmethod
+    def submit(self, orders, positions, as_of): ...
+
+    def close(self): pass
+
+
+def to_broker_orders(orders, positions):
+    """orders_queue → 委託：SELL 以持倉 units 全數賣出，BUY 以 amount_usd 金額下單；孤兒賣單略過"""
+    out = []
+    for k, o in enumerate(orders):
+        if o['type'] == 'SELL':
+            if o['symbol'] not in positions: continue
+            out.append({'id': f"{k}-{o['symbol']}", 'side': 'SELL', 'symbol': o['symbol'],
+                        'qty': float(positions[o['symbol']].units), 'reason': o.get('reason', '')})
+        else:
+            out.append({'id': f"{k}-{o['symbol']}", 'side': 'BUY', 'symbol': o['symbol'],
+                        'notional': float(o['amount_usd']), 'reason': o.get('reason', '')})
+    return out
+
+
+class PaperBrokerAdapter(ExecutionAdapter):
+    name = 'paper'
+
+    def __init__(self, url, timeout=10, max_workers=8, server=None):
+        import requests  # 延遲載入：只有 --execute 時才需要
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._server = server  # 內建模擬器 (make_adapter('paper') 時由 adapter 負責關閉)
+
+    def _send(self, order, as_of):
+        t0 = time.perf_counter()
+        res = self.session.post(f"{self.url}/orders", json={'as_of': as_of, 'orders': [order]}, timeout=self.timeout)
+        res.raise_for_status()
+        fill = res.json()['fills'][0]
+        fill['latency_ms'] = (time.perf_counter() - t0) * 1000
+        fill['reason'] = order.get('reason', '')
+        return fill
+
+    def submit(self, orders, positions, as_of):
+        as_of = pd.Timestamp(as_of).strftime('%Y-%m-%d')
+        futures = [self.pool.submit(self._send, o, as_of) for o in to_broker_orders(orders, positions)]
+        fills = []
+        for f in futures:
+            try: fills.append(f.result())
+            except Exception as e: fills.append({'status': 'ERROR', 'error': str(e)[:80], 'latency_ms': np.nan})
+        return fills
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+        if self._server is not None: self._server.stop()
+
+
+def make_adapter(spec, **server_kwargs):
+    """'paper' = 以本地價格快取啟動內建模擬器；'http://host:port' = 連線到既有模擬器"""
+    if spec == 'paper':
+        srv = PaperBrokerServer(**server_kwargs).start()
+        return PaperBrokerAdapter(srv.url, server=srv)
+    return PaperBrokerAdapter(spec)
+
+
+# =========================
+# 本機紙上券商模擬器
+# =========================
+class _BrokerHTTPServer(ThreadingHTTPServer):
+    request_queue_size = 128  # 預設 5：並行送單時 SYN 佇列滿會觸發 1 秒重送，污染延遲量測
+    daemon_threads = True
+
+
+def load_bars(path=PRICE_CACHE_FILE):
+    cached = pd.read_pickle(path)
+    return {k: cached[k] for k in ('open', 'close')}
+
+
+class PaperBrokerServer:
+    """
+    POST /orders {"as_of": "YYYY-MM-DD", "orders": [{"id","side","symbol","qty"|"notional"}]}
+      → {"fills": [{"id","symbol","side","qty","price","ref_price","bar_date","bar","status"}], "server_ms"}
+    GET  /fills  → 累積成交紀錄；GET /health
+    """
+    def __init__(self, bars=None, host='127.0.0.1', port=0, latency_ms=0.0, jitter_ms=0.0, slippage_bps=0.0):
+        bars = bars if bars is not None else load_bars()
+        self.open_px, self.close_px = bars['open'], bars['close']
+        self._dates = self.open_px.index.values.astype('datetime64[ns]')
+        self.latency_ms, self.jitter_ms, self.slippage_bps = latency_ms, jitter_ms, slippage_bps
+        self.fills = []
+        self._lock = threading.Lock()
+        self._server = _BrokerHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _price(self, symbol, as_of):
+        """as_of 之後第一根有開盤價的 K 棒；沒有則退回 as_of 當日 (含) 之前最後收盤"""
+        if symbol not in self.open_px.columns: return None
+        start = np.searchsorted(self._dates, np.datetime64(pd.Timestamp(as_of), 'ns'), side='right')
+        opens = self.open_px[symbol].values[start:]
+        ok = np.flatnonzero(~np.isnan(opens))
+        if len(ok): return float(opens[ok[0]]), self.open_px.index[start + ok[0]], 'open'
+        closes = self.close_px[symbol].values[:start]
+        ok = np.flatnonzero(~np.isnan(closes))
+        if len(ok): return float(closes[ok[-1]]), self.close_px.index[ok[-1]], 'close'
+        return None
+
+    def fill(self, order, as_of):
+        px = self._price(order['symbol'], as_of)
+        if px is None: return {'id': order.get('id'), 'symbol': order['symbol'], 'side': order['side'], 'status': 'REJECTED', 'error': 'no price'}
+        ref, bar_date, bar = px
+        slip = self.slippage_bps / 10000.0
+        price = ref * (1 + slip) if order['side'] == 'BUY' else ref * (1 - slip)
+        qty = order['qty'] if 'qty' in order else order['notional'] / price
+        fill = {'id': order.get('id'), 'symbol': order['symbol'], 'side': order['side'], 'qty': qty, 'price': price,
+                'ref_price': ref, 'bar_date': bar_date.strftime('%Y-%m-%d'), 'bar': bar, 'status': 'FILLED'}
+        with self._lock: self.fills.append(fill)
+        return fill
+
+    def _handler(self):
+        broker = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == '/health': self._reply(200, {'ok': True})
+                elif self.path == '/fills':
+                    with broker._lock: self._reply(200, {'fills': list(broker.fills)})
+                else: self._reply(404, {'error': 'not found'})
+
+            def do_POST(self):
+                if self.path != '/orders': return self._reply(404, {'error': 'not found'})
+                t0 = time.perf_counter()
+                try:
+                    req = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                    delay = broker.latency_ms + random.uniform(-broker.jitter_ms, broker.jitter_ms)
+                    if delay > 0: time.sleep(delay / 1000.0)
+                    fills = [broker.fill(o, req['as_of']) for o in req.get('orders', [])]
+                except (KeyError, ValueError) as e:
+                    return self._reply(400, {'error': str(e)})
+                self._reply(200, {'fills': fills, 'server_ms': (time.perf_counter() - t0) * 1000})
+
+            def log_message(self, *args): pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self): return self.start()
+
+    def __exit__(self, *exc): self.stop()
+
+
+def latency_summary(fills):
+    lat = np.array([f['latency_ms'] for f in fills if f.get('status') == 'FILLED'])
+    if not len(lat): return "無成交"
+    return f"成交 {len(lat)}/{len(fills)} | 延遲 p50 {np.percentile(lat, 50):.1f}ms / p95 {np.percentile(lat, 95):.1f}ms / max {lat.max():.1f}ms"
+
+
+def run_bench(n_orders, bars, latency_ms=0.0, jitter_ms=0.0, slippage_bps=0.0, workers=8):
+    syms = [c for c in bars['open'].columns if bars['open'][c].notna().any()]
+    as_of = bars['open'].index[-2].strftime('%Y-%m-%d')
+    with PaperBrokerServer(bars, latency_ms=latency_ms, jitter_ms=jitter_ms, slippage_bps=slippage_bps) as srv:
+        adapter = PaperBrokerAdapter(srv.url, max_workers=workers)
+        orders = [{'type': 'BUY', 'symbol': random.choice(syms), 'amount_usd': 1000.0} for _ in range(n_orders)]
+        t0 = time.perf_counter()
+        fills = adapter.submit(orders, {}, as_of)
+        elapsed = time.perf_counter() - t0
+        adapter.close()
+    print(f"📈 {n_orders} 筆委託 / {workers} 並行 | 總耗時 {elapsed:.2f}s | 吞吐 {n_orders / elapsed:.0f} 筆/秒")
+    print(f"   {latency_summary(fills)}")
+    return fills
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本機紙上券商模擬器")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="啟動模擬器 (以 price_cache.pkl 成交)")
+    parser.add_argument("--bench", type=int, metavar="N", help="送出 N 筆隨機委託，量測延遲與吞吐")
+    parser.add_argument("--bars", default=PRICE_CACHE_FILE)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--slippage-bps", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+    if args.serve is not None:
+        srv = PaperBrokerServer(load_bars(args.bars), port=args.serve, latency_ms=args.latency_ms,
+                                jitter_ms=args.jitter_ms, slippage_bps=args.slippage_bps).start()
+        print(f"🧪 Paper broker: {srv.url}  (Ctrl+C 結束)")
+        try:
+            while True: time.sleep(3600)
+        except KeyboardInterrupt:
+            srv.stop()
+    elif args.bench:
+        run_bench(args.bench, load_bars(args.bars), args.latency_ms, args.jitter_ms, args.slippage_bps, args.workers)
+    else:
+        parser.print_help()
@@ -0,0 +1,71 @@
+# =========================================================
+# Vanguard Cooldown Tracker
+# [OPT-09] cooldown_dict (symbol → Timestamp) 改為 min-heap + 到期陣列
+#   - set():      O(log n) 插入 (heap push)
+#   - advance():  模擬時鐘前進時批次移除已到期標的
+#   - allowed_mask(): 與 ticker index 對齊的向量化「已冷卻」遮罩
+#   - to_dict():  序列化回 state.json 既有 cooldown_dict 格式
+# =========================================================
+import heapq
+
+import numpy as np
+import pandas as pd
+
+_NO_COOLDOWN = np.iinfo(np.int64).min  # 無冷卻 = 到期時間為 -∞
+
+
+class CooldownTracker:
+    def __init__(self, tickers, cooldowns=None):
+        self.index = pd.Index(tickers)
+        self._expiry_ns = np.full(len(self.index), _NO_COOLDOWN, dtype=np.int64)
+        self._expiry = {}   # sym -> Timestamp (含不在 index 內的標的)
+        self._heap = []     # (expiry_ns, sym)，允許過期殘留項，advance() 時惰性清除
+        for sym, d in (cooldowns or {}).items():
+            self.set(sym, d)
+
+    @classmethod
+    def from_dict(cls, tickers, data):
+        """由 state['cooldown_dict'] ({sym: 'YYYY-MM-DD'}) 還原"""
+        return cls(tickers, {sym: pd.Timestamp(d) for sym, d in data.items()})
+
+    def to_dict(self):
+        return {sym: d.strftime('%Y-%m-%d') for sym, d in self._expiry.items()}
+
+    def __len__(self): return len(self._expiry)
+
+    def __contains__(self, sym): return sym in self._expiry
+
+    def __getitem__(self, sym): return self._expiry[sym]
+
+    def items(self): return self._expiry.items()
+
+    def set(self, sym, until):
+        """冷卻至 until (含當日)；重複設定以最後一次為準"""
+        until = pd.Timestamp(until)
+        self._expiry[sym] = until
+        heapq.heappush(self._heap, (until.value, sym))
+        loc = self.index.get_indexer([sym])[0]
+        if loc >= 0: self._expiry_ns[loc] = until.value
+
+    def advance(self, now):
+        """時鐘推進到 now：移除所有 expiry < now 的標的 (now 當日起已可再進場)"""
+        now_ns = pd.Timestamp(now).value
+        expired = []
+        while self._heap and self._heap[0][0] < now_ns:
+            expiry_ns, sym = heapq.heappop(self._heap)
+            d = self._expiry.get(sym)
+            if d is None or d.value != expiry_ns: continue  # 已被覆寫的殘留項
+            del self._expiry[sym]
+            expired.append(sym)
+        if expired:
+            locs = self.index.get_indexer(expired)
+            self._expiry_ns[locs[locs >= 0]] = _NO_COOLDOWN
+        return expired
+
+    def is_cooled_down(self, sym, now):
+        d = self._expiry.get(sym)
+        return d is None or pd.Timestamp(now) > d
+
+    def allowed_mask(self, now):
+        """與 self.index 對齊的 bool 陣列：True = 不在冷卻期 (now > expiry)"""
+        return self._expiry_ns < pd.Timestamp(now).value
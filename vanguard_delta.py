@@ -0,0 +1,80 @@
+# =========================================================
+# Vanguard Delta Report
+# [OPT-16] 只推播「與上次送出的戰報相比有變化」的段落，節省 LINE 月推播額度
+#   - run_live 產生戰報時同步整理成結構化 dict (regime / 盤中觸發 / 指令 / 持倉停損價)
+#   - 與 report_snapshot.json (上次實際送出的版本) 比對：
+#       狀態翻轉 (板塊牛熊、MA200 巨觀開關、VIX 級距)、新指令、停損價移動超過門檻、新增/出清持倉
+#   - 無任何變化時不推播，snapshot 維持上次送出的版本 (小幅移動會累積到超過門檻才通知)
+#   - snapshot 隨 outbox 訊息落地，確認送達後才由 promote_snapshot 寫入；被 outbox 放棄的訊息不更新 snapshot，
+#     下次的 delta 仍以收件人實際收到的版本比對
+# =========================================================
+import json
+import os
+
+SNAPSHOT_FILE = 'report_snapshot.json'
+STOP_DELTA_PCT = 0.01   # 停損/觸發價相對上次通知移動 ≥ 1% 才通知
+
+
+def load_snapshot(path=SNAPSHOT_FILE):
+    if not os.path.exists(path): return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_snapshot(report, path=SNAPSHOT_FILE):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f: json.dump(report, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def promote_snapshot(entry, path=SNAPSHOT_FILE):
+    """Outbox.on_delivered：送達的訊息若帶 snapshot 則寫入 (較舊的訊息晚送達時不覆蓋較新的 snapshot)"""
+    report = (entry.get('meta') or {}).get('snapshot')
+    if report is None: return
+    prev = load_snapshot(path)
+    if prev is not None and prev.get('_sent_at', '') > entry['created']: return
+    save_snapshot({**report, '_sent_at': entry['created']}, path)
+
+
+def _stop_moved(old, new, threshold):
+    if old is None: return True
+    if old.get('pct') != new.get('pct'): return True
+    o, n = old.get('stop'), new.get('stop')
+    if not o or not n: return o != n
+    return abs(n - o) / o >= threshold
+
+
+def build_delta(prev, report, threshold=STOP_DELTA_PCT):
+    """
+    prev / report: run_live 產生的結構化戰報。回傳只含變化段落的訊息；無變化回傳 None。
+    prev 為 None (首次執行) 時回傳 None，由呼叫端改送完整戰報。
+    """
+    if prev is None: return None
+    parts = []
+
+    if report.get('degraded'):  # [OPT-23] 降級執行 (舊價格 / 日迴圈未跑完 / 戰報省略) 一律通知
+        parts.append("⚠️ 【降級執行】\n" + "\n".join(report['degraded']) + "\n")
+
+    flips = [f"{k} {prev['regime'].get(k, '—')} → {v}" for k, v in report['regime'].items() if prev['regime'].get(k) != v]
+    if flips: parts.append("🔀 【狀態翻轉】\n" + "\n".join(flips) + "\n")
+
+    alerts = [a for a in report['alerts'] if a not in prev.get('alerts', [])]  # 同日重跑不重複通知
+    if alerts:
+        parts.append("🚨 【昨日盤中防禦觸發】(系統已記帳)\n" + "\n".join(alerts) + "\n")
+
+    new_orders = [k for k in report['orders'] if k not in prev.get('orders', {})]
+    sells = [report['orders'][k] for k in new_orders if k.startswith('SELL:')]
+    buys = [report['orders'][k] for k in new_orders if k.startswith('BUY:')]
+    if sells: parts.append("🔴 【新賣出指令】(請於開盤賣出)\n" + "".join(sells))
+    if buys: parts.append("🟢 【新買入指令】(請於開盤買入)\n" + "".join(buys))
+
+    prev_hold = prev.get('holdings', {})
+    moved = [h['text'] for sym, h in report['holdings'].items() if _stop_moved(prev_hold.get(sym), h, threshold)]
+    gone = [sym for sym in prev_hold if sym not in report['holdings']]
+    if moved: parts.append(f"🛡️ 【掛單需更新】(停損價移動 ≥ {threshold:.0%} / 新持倉)\n" + "".join(moved))
+    if gone: parts.append("✅ 已出清：" + ", ".join(gone) + "\n")
+
+    if not parts: return None
+    return report['header'] + "\n" + report['summary'] + "\n━━━━━━━━━━━━━━\n" + "--------------------\n".join(parts)
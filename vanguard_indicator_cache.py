@@ -0,0 +1,231 @@
+# =========================================================
+# Vanguard Indicator Cache
+# [OPT-31] 衍生矩陣 (均線 / 動能 / 波動 / 分數) 的內容定址磁碟快取，供 live / 回測 / 掃描 worker 共用
+#   - key = 函式名稱 + 程式碼指紋 (窗口長度等常數寫在函式內，改窗口即失效) + 價格面板雜湊 + 每個輸入矩陣 + 參數 (universe)
+#     輸入矩陣若是本快取先前的輸出 (scores 的 ind)，以其 key 代表 → 上游函式改動時下游一併失效；其餘輸入以內容雜湊
+#   - 每個矩陣一個 .npy，讀取時 np.load(mmap_mode='r')：不反序列化、不複製，多個行程共用 OS page cache
+#   - 結果可為 DataFrame / Series / dict (巢狀) / None / 純量；object dtype 不快取 (讀回的型別會不同)
+#   - 寫入先寫暫存目錄再 rename (並行 worker 同時算同一份時先完成者勝出，另一份丟棄)
+#   - LRU：命中時更新 manifest mtime；寫入後總大小超過上限則由最久未用的項目開始刪除
+#   - 取回的矩陣為唯讀 (mmap)：呼叫端若需就地修改請先 .copy()
+#
+#   cache = IndicatorCache()
+#   key = panel_hash(close, is_trading_day)
+#   ind = cache.call(compute_indicators, key, close)
+#   scores = cache.call(compute_scores, key, close, is_trading_day, ind, asset_map=..., tier_1=...)
+#
+#   python vanguard_indicator_cache.py            # 列出快取項目 (大小 / 最近使用)
+#   python vanguard_indicator_cache.py --clear
+# =========================================================
+import argparse
+import json
+import os
+import shutil
+import time
+import weakref
+
+import numpy as np
+import pandas as pd
+
+import run_metrics
+from vanguard_stages import code_fingerprint, content_hash
+
+INDICATOR_CACHE_DIR = '.indicator_cache'
+INDICATOR_CACHE_MAX_MB = 2048
+MANIFEST = 'manifest.json'
+PRODUCED_KEEP = 8  # 記住最近 N 個輸出的 key (供下游 call 的輸入使用；持有參考，不宜過多)
+
+class _FrameHashes:
+    """id(frame) → (weakref, 雜湊)：同一個面板物件只雜湊一次 (輸入視為不可變)；frame 被回收時自動移除"""
+    def __init__(self): self.known = {}
+
+    def __call__(self, frame):
+        known = self.known.get(id(frame))
+        if known is not None and known[0]() is frame: return known[1]
+        h = content_hash(frame)
+        try: ref = weakref.ref(frame, lambda _, i=id(frame): self.known.pop(i, None))
+        except TypeError: return h  # dict 等不支援 weakref：不記憶
+        self.known[id(frame)] = (ref, h)
+        return h
+
+
+frame_hash = _FrameHashes()
+
+
+def panel_hash(*frames):
+    """價格面板雜湊 (各 frame 的內容雜湊組合；call() 的同一批 frame 不再重算)"""
+    return content_hash(*[frame_hash(f) for f in frames])
+
+
+def _save_index(idx, d, n):
+    np.save(os.path.join(d, f"index{n}.npy"), idx.values)  # datetime64 (保留時間單位；有時區時為 UTC)
+    return {'tz': str(idx.tz) if getattr(idx, 'tz', None) is not None else None, 'name': idx.name}
+
+
+def _load_index(d, n, meta):
+    idx = pd.DatetimeIndex(np.load(os.path.join(d, f"index{n}.npy")), name=meta['name'])
+    return idx.tz_localize('UTC').tz_convert(meta['tz']) if meta['tz'] else idx
+
+
+class _Writer:
+    def __init__(self, d):
+        self.d, self.n, self.bytes = d, 0, 0
+        self.indexes, self.index_meta = [], []
+
+    def _index(self, idx):
+        for k, known in enumerate(self.indexes):
+            if idx is known or idx.equals(known): return k
+        if not isinstance(idx, pd.DatetimeIndex): raise TypeError(f"不支援的 index 型別: {type(idx).__name__}")
+        self.index_meta.append(_save_index(idx, self.d, len(self.indexes)))
+        self.indexes.append(idx)
+        return len(self.indexes) - 1
+
+    def _array(self, values):
+        if values.dtype == object: raise TypeError("object dtype 矩陣 (請先轉成數值型別)")
+        arr = np.ascontiguousarray(values)
+        name = f"{self.n}.npy"
+        self.n += 1
+        np.save(os.path.join(self.d, name), arr)
+        self.bytes += arr.nbytes
+        return name
+
+    def node(self, v):
+        if v is None: return {'t': 'none'}
+        if isinstance(v, pd.DataFrame):
+            return {'t': 'frame', 'file': self._array(v.to_numpy()), 'index': self._index(v.index), 'columns': [str(c) for c in v.columns]}
+        if isinstance(v, pd.Series):
+            return {'t': 'series', 'file': self._array(v.to_numpy()), 'index': self._index(v.index), 'name': v.name}
+        if isinstance(v, dict):
+            return {'t': 'dict', 'items': [[str(k), self.node(x)] for k, x in v.items()]}
+        if isinstance(v, (bool, int, float, str, np.generic)):
+            return {'t': 'value', 'v': v.item() if isinstance(v, np.generic) else v}
+        raise TypeError(f"不支援快取的型別: {type(v).__name__}")
+
+
+def _read(node, d, indexes):
+    t = node['t']
+    if t == 'none': return None
+    if t == 'value': return node['v']
+    if t == 'dict': return {k: _read(x, d, indexes) for k, x in node['items']}
+    arr = np.load(os.path.join(d, node['file']), mmap_mode='r')
+    if t == 'frame': return pd.DataFrame(arr, index=indexes[node['index']], columns=node['columns'], copy=False)
+    return pd.Series(arr, index=indexes[node['index']], name=node['name'], copy=False)
+
+
+class IndicatorCache:
+    def __init__(self, root=INDICATOR_CACHE_DIR, max_mb=INDICATOR_CACHE_MAX_MB, enabled=True):
+        self.root, self.max_bytes, self.enabled = root, int(max_mb * 1024 * 1024), enabled
+        self.hits = self.misses = 0
+        self._fingerprints = {}
+        self._produced = {}  # id(輸出) → (輸出, key)：持有參考避免 id 被重用
+
+    def frame_key(self, frame):
+        """輸入矩陣的代表雜湊：本快取的輸出用其 key (涵蓋上游函式的程式碼)，其餘以內容雜湊"""
+        produced = self._produced.get(id(frame))
+        if produced is not None and produced[0] is frame: return produced[1]
+        return frame_hash(frame)
+
+    def key(self, fn, panel_key, frames=(), params=None):
+        fp = self._fingerprints.get(fn)
+        if fp is None: fp = self._fingerprints[fn] = code_fingerprint(fn)
+        return content_hash(fn.__name__, fp, panel_key, [self.frame_key(f) for f in frames], params or {})
+
+    def _remember(self, value, key):
+        if value is None: return
+        self._produced[id(value)] = (value, key)
+        while len(self._produced) > PRODUCED_KEEP: del self._produced[next(iter(self._produced))]
+
+    def _dir(self, key): return os.path.join(self.root, key[:24])
+
+    def get(self, key):
+        d = self._dir(key)
+        try:
+            with open(os.path.join(d, MANIFEST), 'r', encoding='utf-8') as f: meta = json.load(f)
+            if meta['key'] != key: return None
+            indexes = [_load_index(d, n, m) for n, m in enumerate(meta['indexes'])]
+            value = _read(meta['value'], d, indexes)
+        except (OSError, ValueError, KeyError):
+            return None
+        try: os.utime(os.path.join(d, MANIFEST))  # LRU：命中視同最近使用
+        except OSError: pass
+        return value
+
+    def put(self, key, value):
+        d = self._dir(key)
+        if os.path.exists(os.path.join(d, MANIFEST)): return
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f"{d}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        try:
+            w = _Writer(tmp)
+            node = w.node(value)
+            with open(os.path.join(tmp, MANIFEST), 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'created': time.time(), 'bytes': w.bytes, 'indexes': w.index_meta, 'value': node}, f)
+            os.rename(tmp, d)
+        except OSError:  # 其他 worker 已先寫入同一份 (目錄已存在) 或磁碟錯誤：略過快取
+            return
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)  # rename 成功時已不存在；不支援的型別 (TypeError) 亦清掉暫存
+        self.evict(keep=d)
+
+    def call(self, fn, panel_key, *frames, **params):
+        """fn(*frames, **params) 的快取版本；每個 frame 與 params (窗口 / universe) 都納入 key"""
+        if not self.enabled: return fn(*frames, **params)
+        key = self.key(fn, panel_key, frames, params)
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            run_metrics.count('indicator_cache_hits')
+        else:
+            self.misses += 1
+            value = fn(*frames, **params)
+            try: self.put(key, value)
+            except TypeError as e: print(f"⚠️ {fn.__name__} 結果無法快取: {e}")
+        self._remember(value, key)
+        return value
+
+    def entries(self):
+        """[(目錄, bytes, 最近使用時間)]，由舊到新"""
+        if not os.path.isdir(self.root): return []
+        out = []
+        for name in os.listdir(self.root):
+            manifest = os.path.join(self.root, name, MANIFEST)
+            try:
+                with open(manifest, 'r', encoding='utf-8') as f: size = json.load(f)['bytes']
+                out.append((os.path.join(self.root, name), size, os.path.getmtime(manifest)))
+            except (OSError, ValueError, KeyError):
+                continue
+        return sorted(out, key=lambda e: e[2])
+
+    def evict(self, keep=None):
+        """總大小超過上限時刪除最久未使用的項目 (keep 為剛寫入的項目，不刪)"""
+        entries = self.entries()
+        total = sum(e[1] for e in entries)
+        for d, size, _ in entries:
+            if total <= self.max_bytes: break
+            if d == keep: continue
+            shutil.rmtree(d, ignore_errors=True)
+            total -= size
+        return total
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="指標快取內容")
+    parser.add_argument("--dir", default=INDICATOR_CACHE_DIR)
+    parser.add_argument("--clear", action="store_true", help="清空快取")
+    parser.add_argument("--max-mb", type=float, default=None, help="依 LRU 縮減至指定大小")
+    args = parser.parse_args()
+    cache = IndicatorCache(args.dir, args.max_mb if args.max_mb is not None else INDICATOR_CACHE_MAX_MB)
+    if args.clear:
+        cache.clear(); print(f"🗑️ 已清空 {args.dir}")
+    else:
+        if args.max_mb is not None: cache.evict()
+        entries = cache.entries()
+        now = time.time()
+        for d, size, used in entries:
+            print(f"   {os.path.basename(d)}  {size / 1024 / 1024:>8.1f} MB  {(now - used) / 3600:>7.1f}h 前使用")
+        print(f"📦 {len(entries)} 項，共 {sum(e[1] for e in entries) / 1024 / 1024:.1f} MB (上限 {cache.max_bytes / 1024 / 1024:.0f} MB)")
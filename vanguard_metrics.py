@@ -0,0 +1,243 @@
+# =========================================================
+# Vanguard Prometheus Exporter
+# [OPT-25] 實盤引擎的監控指標 (Prometheus text exposition format，不需 prometheus_client)
+#   - daemon 模式：MetricsServer 在背景提供 GET /metrics，常駐行程內累計 counter
+#   - cron 模式：每次執行後原子寫入 textfile (node_exporter --collector.textfile.directory)；
+#                啟動時讀回上一份 textfile：counter (*_total) 接續累加不歸零；例外中止時 gauge 保留最後已知值
+#   - 資料新鮮度以「各 ticker 最後一根有效 K 棒的時間戳」輸出，告警時以 time() - 值 計算落後秒數
+#
+#   python V18.00_VANGUARD.py --metrics-textfile /var/lib/node_exporter/vanguard.prom     # cron
+#   python V18.00_VANGUARD.py --daemon --metrics-port 9108                                 # daemon
+#   python vanguard_metrics.py vanguard.prom                                               # 印出 textfile 摘要
+#
+#   告警範例：
+#     time() - vanguard_ticker_last_bar_timestamp_seconds{ticker="SPY"} > 4 * 86400
+#     vanguard_stage_duration_seconds{stage="simulate"} > 60
+#     increase(vanguard_errors_total[1d]) > 0
+# =========================================================
+import calendar
+import os
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from vanguard_nav import NavTracker
+
+# name: (type, help)
+METRICS = {
+    'vanguard_run_duration_seconds': ('gauge', '最近一次評估的總耗時'),
+    'vanguard_run_cpu_seconds': ('gauge', '最近一次評估的 CPU 時間'),
+    'vanguard_peak_rss_bytes': ('gauge', '行程峰值常駐記憶體'),
+    'vanguard_last_run_timestamp_seconds': ('gauge', '最近一次評估結束時間 (epoch)'),
+    'vanguard_last_success_timestamp_seconds': ('gauge', '最近一次成功評估結束時間 (epoch)'),
+    'vanguard_stage_duration_seconds': ('gauge', '最近一次評估各 stage 耗時'),
+    'vanguard_stage_cache_hit': ('gauge', '最近一次評估各 stage 是否命中 .stage_cache (1/0)'),
+    'vanguard_ticker_last_bar_timestamp_seconds': ('gauge', '各 ticker 最後一根有效收盤 K 棒的時間 (epoch)'),
+    'vanguard_last_processed_timestamp_seconds': ('gauge', 'state.last_processed_date (epoch)'),
+    'vanguard_days_processed': ('gauge', '最近一次評估推進的交易日數'),
+    'vanguard_orders_queue_depth': ('gauge', '待執行掛單數 (orders_queue)'),
+    'vanguard_positions': ('gauge', '持倉檔數'),
+    'vanguard_cash_usd': ('gauge', '現金 (USD)'),
+    'vanguard_equity_usd': ('gauge', '總資產估算 (現金 + 持倉市值，USD)'),
+    'vanguard_nav_drawdown_ratio': ('gauge', '淨值相對高水位的目前回撤 (state.nav，負值)'),
+    'vanguard_nav_max_drawdown_ratio': ('gauge', '淨值最大回撤 (state.nav，負值)'),
+    'vanguard_nav_sharpe': ('gauge', '日報酬年化 Sharpe (state.nav 串流計算)'),
+    'vanguard_nav_win_rate': ('gauge', '平倉勝率 (state.nav)'),
+    'vanguard_nav_exposure_ratio': ('gauge', '持倉市值 / 總資產 (最近處理日)'),
+    'vanguard_runs_total': ('counter', '評估次數 (依結果 ok / halt / error)'),
+    'vanguard_days_processed_total': ('counter', '累計推進的交易日數'),
+    'vanguard_errors_total': ('counter', '拋出例外的次數 (依 stage)'),
+    'vanguard_degraded_total': ('counter', '逾時或降級執行的次數 (依 stage)'),
+}
+
+# 每次評估整組覆寫的 gauge (stage / ticker 集合可能變動，避免殘留舊 series)
+_PER_RUN = ('vanguard_stage_duration_seconds', 'vanguard_stage_cache_hit')
+
+_LINE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)$')
+_LABEL_RE = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def _escape(v):
+    return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _unescape(v):
+    return re.sub(r'\\(.)', lambda m: '\n' if m.group(1) == 'n' else m.group(1), v)
+
+
+def parse_text(text):
+    """Prometheus text format → {(name, ((label, value), ...)): float}"""
+    out = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'): continue
+        m = _LINE_RE.match(line.strip())
+        if not m: continue
+        labels = tuple(sorted((k, _unescape(v)) for k, v in _LABEL_RE.findall(m.group(2) or '')))
+        try: out[(m.group(1), labels)] = float(m.group(3))
+        except ValueError: continue
+    return out
+
+
+def last_bar_timestamps(is_trading_day):
+    """各欄最後一根實際 K 棒的 index 時間 (epoch 秒)；close 已 ffill，故以 is_trading_day 判斷；從未交易者略過"""
+    valid = is_trading_day.values.astype(bool)
+    if not valid.size: return {}
+    last = len(valid) - 1 - valid[::-1].argmax(axis=0)
+    epoch = is_trading_day.index.values.astype('datetime64[s]').astype(np.int64)
+    return {col: float(epoch[k]) for col, k, ok in zip(is_trading_day.columns, last, valid.any(axis=0)) if ok}
+
+
+class MetricsExporter:
+    """
+    exporter = MetricsExporter(textfile='vanguard.prom')
+    exporter.observe(run_metrics_record, ctx, pipe)   # run_live 每次評估結束 (含例外) 呼叫
+    exporter.render()                                 # text exposition
+    """
+    def __init__(self, textfile=None):
+        self.textfile = textfile
+        self._lock = threading.Lock()
+        self.values = {}
+        if textfile and os.path.exists(textfile):
+            with open(textfile, 'r', encoding='utf-8') as f:
+                self.values = {k: v for k, v in parse_text(f.read()).items() if k[0] in METRICS and k[0] not in _PER_RUN}
+
+    def set(self, name, value, **labels):
+        if value is None: return
+        self.values[(name, tuple(sorted((k, str(v)) for k, v in labels.items())))] = float(value)
+
+    def clear(self, name):
+        for key in [k for k in self.values if k[0] == name]: del self.values[key]
+
+    def inc(self, name, n=1, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        self.values[key] = self.values.get(key, 0.0) + n
+
+    def observe(self, record, ctx=None, pipe=None):
+        """record: RunMetrics.record()；ctx: StagePipeline.run 的結果 (例外時可能為空)"""
+        ctx = ctx or {}
+        now = time.time()
+        status = record['status'].split(':', 1)[0]
+        counters = record['counters']
+        with self._lock:
+            for name in _PER_RUN: self.clear(name)
+            self.set('vanguard_run_duration_seconds', record['wall_s'])
+            self.set('vanguard_run_cpu_seconds', record['cpu_s'])
+            if record['peak_rss_mb'] is not None: self.set('vanguard_peak_rss_bytes', int(record['peak_rss_mb'] * 1024 * 1024))
+            self.set('vanguard_last_run_timestamp_seconds', now)
+            if status == 'ok': self.set('vanguard_last_success_timestamp_seconds', now)
+            self.inc('vanguard_runs_total', status=status)
+            for stage, p in record['phases'].items():
+                self.set('vanguard_stage_duration_seconds', p['wall_s'], stage=stage)
+            if pipe is not None:
+                for stage, st, _ in pipe.log: self.set('vanguard_stage_cache_hit', int(st == 'hit'), stage=stage)
+                if pipe.failed: self.inc('vanguard_errors_total', stage=pipe.failed)
+            elif status == 'error': self.inc('vanguard_errors_total', stage='unknown')
+            for stage in ctx.get('degraded', {}): self.inc('vanguard_degraded_total', stage=stage)
+            if 'days_processed' in counters:
+                self.set('vanguard_days_processed', counters['days_processed'])
+                self.inc('vanguard_days_processed_total', counters['days_processed'])
+            if 'panel' in ctx:
+                self.clear('vanguard_ticker_last_bar_timestamp_seconds')
+                for ticker, ts in last_bar_timestamps(ctx['panel'][4]).items():
+                    self.set('vanguard_ticker_last_bar_timestamp_seconds', ts, ticker=ticker)
+            state = ctx.get('state')
+            if state is not None:
+                pos_value = sum(p['units'] * p['current_price'] for p in state['positions'].values())
+                self.set('vanguard_orders_queue_depth', len(state['orders_queue']))
+                self.set('vanguard_positions', len(state['positions']))
+                self.set('vanguard_cash_usd', state['cash'])
+                self.set('vanguard_equity_usd', state['cash'] + pos_value)
+                self.set('vanguard_last_processed_timestamp_seconds', calendar.timegm(time.strptime(state['last_processed_date'], '%Y-%m-%d')))
+                nav = NavTracker.from_dict(state.get('nav')).summary()
+                if nav:
+                    self.set('vanguard_nav_drawdown_ratio', nav['drawdown'])
+                    self.set('vanguard_nav_max_drawdown_ratio', nav['max_drawdown'])
+                    self.set('vanguard_nav_sharpe', nav['sharpe'])
+                    self.set('vanguard_nav_win_rate', nav['win_rate'])
+                    self.set('vanguard_nav_exposure_ratio', nav['exposure'])
+        if self.textfile: self.write_textfile()
+
+    def render(self):
+        with self._lock: items = sorted(self.values.items())
+        lines, seen = [], set()
+        for (name, labels), value in items:
+            if name not in seen:
+                seen.add(name)
+                kind, help_ = METRICS.get(name, ('untyped', ''))
+                lines += [f"# HELP {name} {help_}", f"# TYPE {name} {kind}"]
+            label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            value = str(int(value)) if value.is_integer() else repr(value)
+            lines.append(f"{name}{{{label_str}}} {value}" if labels else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path=None):
+        """tmp + os.replace：node_exporter 不會讀到寫一半的檔案"""
+        path = path or self.textfile
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f: f.write(self.render())
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"⚠️ 無法寫入 metrics textfile {path}: {e}")
+
+
+# =========================
+# HTTP /metrics (daemon 模式)
+# =========================
+class _MetricsHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class MetricsServer:
+    def __init__(self, exporter, host='0.0.0.0', port=9108):
+        self.exporter = exporter
+        self._server = _MetricsHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def _handler(self):
+        exporter = self.exporter
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_response(404); self.end_headers(); return
+                body = exporter.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args): pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name='metrics-http')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法: python vanguard_metrics.py <textfile.prom>")
+        sys.exit(1)
+    with open(sys.argv[1], 'r', encoding='utf-8') as f: samples = parse_text(f.read())
+    now = time.time()
+    for (name, labels), value in sorted(samples.items()):
+        label_str = ",".join(f"{k}={v}" for k, v in labels)
+        extra = f"  (落後 {(now - value) / 3600:.1f}h)" if name.endswith('timestamp_seconds') else ''
+        print(f"{name}{'{' + label_str + '}' if labels else ''} = {value:g}{extra}")
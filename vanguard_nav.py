@@ -0,0 +1,123 @@
+# =========================================================
+# Vanguard NAV Tracker
+# [OPT-30] 實盤淨值的串流績效指標：每處理一個交易日 O(1) 更新，整份存於 state['nav']，不需保留淨值歷史
+#   - 高水位 / 目前回撤 / 最大回撤 (含日期)
+#   - 日報酬 Welford 平均數與變異數 → 年化波動、Sharpe；負報酬另一組 Welford → Sortino
+#   - 平倉勝率 (gross PnL > 0，與回測 print_performance 同定義)、獲利因子
+#   - 曝險：持倉市值 / 總資產，累計平均與最近一日
+#   年化以 252 交易日 (與 vanguard_analytics.performance_summary 一致)；CAGR 以日曆天數
+#
+#   nav = NavTracker.from_dict(state.get('nav'))
+#   nav.update(date, equity, cash, fills)      # run_live 日迴圈每個帳戶每天一次
+#   state['nav'] = nav.to_dict(); nav.summary()
+#
+#   python vanguard_nav.py                      # 印出 state.json 的績效儀表板
+#   python vanguard_nav.py portfolios/*.json
+# =========================================================
+import json
+import math
+import sys
+
+import pandas as pd
+
+TRADING_DAYS = 252
+
+_FIELDS = {
+    'start_date': None, 'last_date': None, 'days': 0,
+    'initial_equity': None, 'equity': None, 'peak': None, 'peak_date': None,
+    'drawdown': 0.0, 'max_drawdown': 0.0, 'max_drawdown_date': None,
+    'ret_n': 0, 'ret_mean': 0.0, 'ret_m2': 0.0,          # 日報酬 Welford
+    'down_n': 0, 'down_mean': 0.0, 'down_m2': 0.0,       # 負報酬 Welford (Sortino)
+    'wins': 0, 'losses': 0, 'gross_win': 0.0, 'gross_loss': 0.0,
+    'exposure': 0.0, 'exposure_sum': 0.0,
+}
+
+
+def _welford(n, mean, m2, x):
+    n += 1
+    delta = x - mean
+    mean += delta / n
+    return n, mean, m2 + delta * (x - mean)
+
+
+class NavTracker:
+    def __init__(self, **fields):
+        for k, default in _FIELDS.items(): setattr(self, k, fields.get(k, default))
+
+    @classmethod
+    def from_dict(cls, data):
+        """由 state['nav'] 還原 (舊 state 沒有此欄位 → 從下一個交易日開始累計)"""
+        return cls(**(data or {}))
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in _FIELDS}
+
+    def update(self, date, equity, cash, fills=()):
+        """date 收盤後的總資產 / 現金；fills 為 step_day 當日成交 (SELL 帶 pnl)"""
+        date = pd.Timestamp(date).strftime('%Y-%m-%d')
+        if self.last_date is not None and date <= self.last_date: return  # 重跑同一天不重複累計
+        equity = float(equity)
+        if self.equity is None:
+            self.start_date, self.initial_equity, self.peak, self.peak_date = date, equity, equity, date
+        elif self.equity > 0:
+            r = equity / self.equity - 1
+            self.ret_n, self.ret_mean, self.ret_m2 = _welford(self.ret_n, self.ret_mean, self.ret_m2, r)
+            if r < 0: self.down_n, self.down_mean, self.down_m2 = _welford(self.down_n, self.down_mean, self.down_m2, r)
+        if equity > self.peak: self.peak, self.peak_date = equity, date
+        self.drawdown = equity / self.peak - 1 if self.peak > 0 else 0.0
+        if self.drawdown < self.max_drawdown: self.max_drawdown, self.max_drawdown_date = self.drawdown, date
+        for f in fills:
+            pnl = f.get('pnl')
+            if f['side'] != 'SELL' or pnl is None: continue
+            if pnl > 0: self.wins += 1; self.gross_win += pnl
+            else: self.losses += 1; self.gross_loss -= pnl
+        self.exposure = 1 - cash / equity if equity > 0 else 0.0
+        self.exposure_sum += self.exposure
+        self.equity, self.last_date = equity, date
+        self.days += 1
+
+    def summary(self):
+        if self.equity is None: return {}
+        n_days = (pd.Timestamp(self.last_date) - pd.Timestamp(self.start_date)).days
+        cagr = (self.equity / self.initial_equity) ** (365.25 / n_days) - 1 if n_days > 0 and self.initial_equity > 0 else 0.0
+        std = math.sqrt(self.ret_m2 / (self.ret_n - 1)) if self.ret_n > 1 else 0.0
+        down_std = math.sqrt(self.down_m2 / (self.down_n - 1)) if self.down_n > 1 else 0.0
+        n_trades = self.wins + self.losses
+        return {
+            'start_date': self.start_date, 'last_date': self.last_date, 'days': self.days,
+            'equity': self.equity, 'total_return': self.equity / self.initial_equity - 1 if self.initial_equity else 0.0,
+            'cagr': cagr, 'peak': self.peak, 'drawdown': self.drawdown,
+            'max_drawdown': self.max_drawdown, 'max_drawdown_date': self.max_drawdown_date,
+            'volatility': std * math.sqrt(TRADING_DAYS),
+            'sharpe': self.ret_mean / std * math.sqrt(TRADING_DAYS) if std > 0 else 0.0,
+            'sortino': self.ret_mean / down_std * math.sqrt(TRADING_DAYS) if down_std > 0 else 0.0,
+            'calmar': cagr / abs(self.max_drawdown) if self.max_drawdown else 0.0,
+            'n_trades': n_trades, 'win_rate': self.wins / n_trades if n_trades else 0.0,
+            'profit_factor': self.gross_win / self.gross_loss if self.gross_loss > 0 else None,
+            'exposure': self.exposure, 'avg_exposure': self.exposure_sum / self.days if self.days else 0.0,
+        }
+
+    def report_line(self):
+        """戰報用一行摘要 (累計不足兩天時為空字串)"""
+        if self.ret_n < 1: return ""
+        s = self.summary()
+        return (f"📈 NAV 回撤 {s['drawdown']:.1%} (最大 {s['max_drawdown']:.1%}) | Sharpe {s['sharpe']:.2f}"
+                f" | 勝率 {s['win_rate']:.0%} ({s['n_trades']}) | 曝險 {s['exposure']:.0%}")
+
+
+def print_dashboard(name, nav):
+    s = nav.summary()
+    if not s:
+        print(f"\n📈 {name}: 尚無淨值紀錄")
+        return
+    pf = f"{s['profit_factor']:.2f}" if s['profit_factor'] is not None else '-'
+    print(f"\n📈 {name}: {s['start_date']} ~ {s['last_date']} ({s['days']} 個交易日)")
+    print(f"   淨值 ${s['equity']:,.2f} | 累積 {s['total_return']:.2%} | CAGR {s['cagr']:.2%}")
+    print(f"   高水位 ${s['peak']:,.2f} | 回撤 {s['drawdown']:.2%} | 最大回撤 {s['max_drawdown']:.2%} ({s['max_drawdown_date'] or '-'})")
+    print(f"   年化波動 {s['volatility']:.2%} | Sharpe {s['sharpe']:.2f} | Sortino {s['sortino']:.2f} | Calmar {s['calmar']:.2f}")
+    print(f"   平倉 {s['n_trades']} 筆 | 勝率 {s['win_rate']:.1%} | 獲利因子 {pf} | 曝險 {s['exposure']:.0%} (平均 {s['avg_exposure']:.0%})")
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:] or ['state.json']:
+        with open(path, 'r') as f: print_dashboard(path, NavTracker.from_dict(json.load(f).get('nav')))
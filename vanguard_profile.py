@@ -0,0 +1,157 @@
+# =========================================================
+# Vanguard Sampling Profiler
+# [OPT-26] 低開銷取樣式 profiler (純標準庫)：背景執行緒每 interval 讀一次 sys._current_frames()
+#   - 只取樣主執行緒與 stage-* 執行緒 (StagePipeline 的逾時保護 worker)，閒置的 HTTP / 投遞執行緒不列入
+#   - 輸出 collapsed stacks ("root;caller;callee 次數")，可直接餵給 flamegraph.pl / speedscope / inferno
+#   - 結束時列出 top-N：self (取樣時正在該函式內) 與 total (呼叫堆疊中含該函式) 佔比
+#   - 不像 cProfile 攔截每次函式呼叫：開銷與呼叫次數無關，日迴圈中的 .loc 等熱點比例不失真
+#
+#   python V18.00_VANGUARD.py --dry-run --profile                     # → profile_live.folded
+#   python "V18.00 VANGUARD BACKTEST ENGINE" --profile --profile-top 40
+#   flamegraph.pl profile_live.folded > live.svg
+#   python vanguard_profile.py profile_live.folded -n 30              # 重新列出既有檔案的 top-N
+# =========================================================
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+DEFAULT_INTERVAL_MS = 5.0
+DEFAULT_TOP_N = 25
+
+
+def _short_path(path):
+    """site-packages 以下保留套件相對路徑 (pandas/core/indexing.py)，其餘只留檔名"""
+    norm = path.replace('\\', '/')
+    for marker in ('site-packages/', 'dist-packages/'):
+        if marker in norm: return norm.split(marker, 1)[1]
+    return os.path.basename(norm)
+
+
+class SamplingProfiler:
+    """
+    with SamplingProfiler() as prof:
+        run_live(...)
+    prof.write_collapsed('profile_live.folded'); prof.print_top(25)
+    """
+    def __init__(self, interval_ms=DEFAULT_INTERVAL_MS, thread_prefixes=('stage-',)):
+        self.interval = interval_ms / 1000.0
+        self.thread_prefixes = thread_prefixes
+        self.stacks = Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._t0 = None
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            name = getattr(code, 'co_qualname', code.co_name)
+            label = f"{name} ({_short_path(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+            self._labels[code] = label
+        return label
+
+    def _targets(self):
+        main = threading.main_thread().ident
+        names = {t.ident: t.name for t in threading.enumerate()}
+        return {ident: name for ident, name in names.items()
+                if ident == main or name.startswith(self.thread_prefixes)}
+
+    def _sample(self):
+        own = threading.get_ident()
+        targets, refresh = self._targets(), time.monotonic() + 0.5
+        while not self._stop.wait(self.interval):
+            if time.monotonic() > refresh: targets, refresh = self._targets(), time.monotonic() + 0.5
+            for ident, frame in sys._current_frames().items():
+                if ident == own or ident not in targets: continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(targets[ident])
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._t0 = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, daemon=True, name='profiler')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None: self._thread.join()
+        self.elapsed = time.perf_counter() - self._t0
+        return self
+
+    def __enter__(self): return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def write_collapsed(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{';'.join(stack)} {n}\n")
+        return path
+
+    def top(self, n=DEFAULT_TOP_N):
+        return top_functions(self.stacks, n)
+
+    def print_top(self, n=DEFAULT_TOP_N):
+        print(f"\n🔥 Profile: {self.samples} 次取樣 / {self.elapsed:.1f}s (每 {self.interval * 1000:.0f}ms)")
+        print_top(self.stacks, n)
+
+
+def top_functions(stacks, n=DEFAULT_TOP_N):
+    """回傳 [(function, self 次數, total 次數)]，依 self 排序；total 對遞迴只計一次"""
+    self_counts, total_counts = Counter(), Counter()
+    for stack, k in stacks.items():
+        frames = stack[1:]  # 第一層為執行緒名稱
+        if not frames: continue
+        self_counts[frames[-1]] += k
+        for fn in set(frames): total_counts[fn] += k
+    return [(fn, c, total_counts[fn]) for fn, c in self_counts.most_common(n)]
+
+
+def print_top(stacks, n=DEFAULT_TOP_N):
+    total = sum(stacks.values())
+    if not total:
+        print("   (無取樣資料：執行時間短於取樣間隔)")
+        return
+    print(f"   {'self':>6} {'total':>6}  function")
+    for fn, s, t in top_functions(stacks, n):
+        print(f"   {s / total:>6.1%} {t / total:>6.1%}  {fn}")
+
+
+def load_collapsed(path):
+    stacks = Counter()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack: stacks[tuple(stack.split(';'))] += int(count)
+    return stacks
+
+
+def profile_call(fn, path, top_n=DEFAULT_TOP_N, interval_ms=DEFAULT_INTERVAL_MS):
+    """以取樣 profiler 執行 fn()；結束 (含例外 / Ctrl+C) 時寫出 collapsed stacks 並列出 top-N"""
+    prof = SamplingProfiler(interval_ms).start()
+    try:
+        return fn()
+    finally:
+        prof.stop()
+        prof.print_top(top_n)
+        print(f"📁 Collapsed stacks: {prof.write_collapsed(path)} (flamegraph.pl / speedscope)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="列出 collapsed stacks 檔的熱點函式")
+    parser.add_argument("path")
+    parser.add_argument("-n", type=int, default=DEFAULT_TOP_N)
+    args = parser.parse_args()
+    print_top(load_collapsed(args.path), args.n)
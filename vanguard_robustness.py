@@ -0,0 +1,183 @@
+# =========================================================
+# Vanguard Robustness Runner
+# [OPT-33] 多起始日穩健度：每個月初 (或每 N 個月) 起跑到同一個結束日，比較 CAGR / MaxDD / Sharpe 的分布
+#   - 價格面板只下載一次 (最早起始日前 200 天 ~ 結束日)，經 run_backtest(panel=...) 共用
+#   - 指標 / 分數先在主行程寫入 .indicator_cache，worker 以 mmap 讀取 (同一份面板 → 同一個 key)
+#   - ProcessPoolExecutor 平行：fork 平台上面板直接繼承 (copy-on-write)，不逐 run 序列化；每個 worker 的輸出丟棄
+#   - 起始日太接近結束日 (< --min-years) 的不跑：短期間的 CAGR 年化後只是雜訊
+#   - 結果：每個起始日一列 (robustness.csv) + 分布摘要 (分位數、CAGR>0 比例)；預設同時寫入 vanguard_results.db
+#   注意：各起始日的暖機資料比單獨執行回測更長 (共用最早起始日的面板)，均線在起始日皆已成形，數值可能與單跑有細微差異
+#
+#   python vanguard_robustness.py                                     # 2021-11-01 起每月初 → 2026-02-26
+#   python vanguard_robustness.py --first 2020-01-01 --stride 3 --workers 8
+#   python vanguard_robustness.py --fixture 2026                      # 離線：vanguard_synth 合成市場 (引擎 universe，固定 seed)
+# =========================================================
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import run_metrics
+from run_metrics import RunMetrics, count, lap
+from vanguard_analytics import performance_summary
+from vanguard_bench import BACKTEST_ENGINE, load_engine
+from vanguard_synth import engine_market
+
+DEFAULT_FIRST, DEFAULT_END = '2021-11-01', '2026-02-26'
+WARMUP_DAYS = 200  # 與 run_backtest 的 data_start 相同
+MIN_YEARS = 1.0
+OUTPUT_CSV = 'robustness.csv'
+METRICS = ['cagr', 'max_drawdown', 'sharpe', 'sortino', 'calmar', 'total_return', 'n_trades', 'win_rate']
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+_engine = _panel = None  # worker 內的回測模組與共用面板 (fork 時由主行程繼承)
+
+
+def start_dates(first, end, stride=1, min_years=MIN_YEARS):
+    """first 起每 stride 個月的月初 (first 本身若非月初亦納入)，且距 end 至少 min_years 年"""
+    first, end = pd.Timestamp(first), pd.Timestamp(end)
+    last = end - pd.Timedelta(days=int(round(min_years * 365.25)))
+    dates = pd.date_range(first, last, freq=f"{stride}MS")
+    if first <= last and (len(dates) == 0 or dates[0] != first): dates = dates.insert(0, first)
+    return list(dates)
+
+
+def _init_worker(engine_path, panel, indicator_cache):
+    global _engine, _panel
+    run_metrics._ACTIVE.clear()  # fork 繼承的 RunMetrics 只屬於主行程
+    if _engine is None: _engine = load_engine(engine_path, 'robustness_backtest')
+    _engine.INDICATOR_CACHE.enabled = indicator_cache
+    _panel = panel
+
+
+def _run_one(start, end, capital):
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        equity_df, trade_log_df = _engine.run_backtest(start, end, capital, panel=_panel)
+    return start, equity_df, trade_log_df, time.perf_counter() - t0
+
+
+def summarize(results):
+    """每個起始日的績效 → DataFrame (index = start)"""
+    rows = []
+    for start, equity_df, trade_log_df, seconds in results:
+        if equity_df is None or equity_df.empty: continue
+        s = performance_summary(equity_df, trade_log_df)
+        rows.append({'start': pd.Timestamp(start), 'years': s['n_days'] / 365.25, **{k: s[k] for k in METRICS},
+                     'final_equity': s['final_equity'], 'seconds': seconds})
+    return pd.DataFrame(rows).set_index('start').sort_index() if rows else pd.DataFrame()
+
+
+def distribution(table):
+    """CAGR / MaxDD / Sharpe / Calmar 的分布 (平均、標準差、分位數、最差 / 最佳)"""
+    cols = ['cagr', 'max_drawdown', 'sharpe', 'calmar']
+    out = table[cols].quantile(QUANTILES).T
+    out.columns = [f"p{int(q * 100)}" for q in QUANTILES]
+    out.insert(0, 'std', table[cols].std())
+    out.insert(0, 'mean', table[cols].mean())
+    out['min'], out['max'] = table[cols].min(), table[cols].max()
+    return out
+
+
+def render(table, dist):
+    print(f"\n{'Start':<12}{'Years':>6}{'CAGR':>9}{'MaxDD':>9}{'Sharpe':>8}{'Calmar':>8}{'Trades':>8}")
+    print("-" * 60)
+    for start, r in table.iterrows():
+        print(f"{start:%Y-%m-%d}  {r['years']:>5.1f}{r['cagr']:>9.1%}{r['max_drawdown']:>9.1%}{r['sharpe']:>8.2f}"
+              f"{r['calmar']:>8.2f}{int(r['n_trades']):>8}")
+    print(f"\n📊 {len(table)} 個起始日的分布")
+    print(f"{'':<14}{'Mean':>8}{'Std':>8}{'P5':>8}{'P25':>8}{'Median':>8}{'P75':>8}{'P95':>8}{'Min':>8}{'Max':>8}")
+    for name, r in dist.iterrows():
+        fmt = (lambda v: f"{v:>8.1%}") if name in ('cagr', 'max_drawdown') else (lambda v: f"{v:>8.2f}")
+        print(f"{name:<14}" + "".join(fmt(r[c]) for c in ['mean', 'std', 'p5', 'p25', 'p50', 'p75', 'p95', 'min', 'max']))
+    worst, best = table['cagr'].idxmin(), table['cagr'].idxmax()
+    print(f"\n   CAGR > 0 比例 {(table['cagr'] > 0).mean():.0%} | 最差起始日 {worst:%Y-%m-%d} ({table.loc[worst, 'cagr']:.1%})"
+          f" | 最佳起始日 {best:%Y-%m-%d} ({table.loc[best, 'cagr']:.1%})")
+
+
+def run(first=DEFAULT_FIRST, end=DEFAULT_END, stride=1, min_years=MIN_YEARS, workers=None, capital=None,
+        fixture_seed=None, indicator_cache=True, engine_path=BACKTEST_ENGINE):
+    """全部起始日的回測結果 [(start, equity_df, trade_log_df, 秒數)] 與回測模組"""
+    starts = start_dates(first, end, stride, min_years)
+    if not starts: raise ValueError(f"{first} ~ {end} 沒有距結束日 {min_years} 年以上的起始日")
+    engine = load_engine(engine_path, 'robustness_backtest')
+    engine.INDICATOR_CACHE.enabled = indicator_cache
+    data_start = starts[0] - pd.Timedelta(days=WARMUP_DAYS)
+    if fixture_seed is not None: engine.yf = engine_market(engine, data_start, end, fixture_seed)
+    print(f"📥 載入價格面板 {data_start:%Y-%m-%d} ~ {end} ...")
+    panel = engine.get_data(start_date=data_start)
+    lap('download'); count('tickers', len(panel[0].columns))
+    # 先在主行程算好指標 / 分數寫入快取，worker 只需 mmap 讀取
+    if indicator_cache:
+        key = engine.panel_hash(panel[0], panel[4])
+        ind = engine.INDICATOR_CACHE.call(engine.compute_indicators, key, panel[0])
+        engine.INDICATOR_CACHE.call(engine.compute_scores, key, panel[0], panel[4], ind)
+        lap('indicators')
+    workers = max(1, min(workers or os.cpu_count() or 1, len(starts)))
+    capital = capital if capital is not None else 100000.0 / engine.USD_TWD_RATE
+    print(f"🚀 {len(starts)} 個起始日 ({starts[0]:%Y-%m-%d} ~ {starts[-1]:%Y-%m-%d}，每 {stride} 個月) → {end}，{workers} 個 worker")
+    results = []
+    global _engine
+    _engine = engine  # fork 的 worker 直接沿用，不重新載入模組
+    if workers == 1:
+        _init_worker(engine_path, panel, indicator_cache)
+        for s in starts:
+            results.append(_run_one(s.strftime('%Y-%m-%d'), end, capital))
+            print(f"   ✅ {s:%Y-%m-%d} ({results[-1][3]:.1f}s)")
+    else:
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(engine_path, panel, indicator_cache)) as pool:
+            # 長期間先送：避免最後只剩一個長 run 在跑
+            futures = [pool.submit(_run_one, s.strftime('%Y-%m-%d'), end, capital) for s in starts]
+            for f in as_completed(futures):
+                results.append(f.result())
+                print(f"   ✅ {results[-1][0]} ({results[-1][3]:.1f}s) [{len(results)}/{len(starts)}]")
+    lap('backtests'); count('runs', len(results))
+    return results, engine
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="多起始日穩健度 (平行回測)")
+    parser.add_argument("--first", default=DEFAULT_FIRST, help="最早起始日")
+    parser.add_argument("--end", default=DEFAULT_END, help="共同結束日")
+    parser.add_argument("--stride", type=int, default=1, metavar="MONTHS", help="起始日間隔月數")
+    parser.add_argument("--min-years", type=float, default=MIN_YEARS, help="起始日至結束日的最短年數")
+    parser.add_argument("--workers", type=int, default=None, help="平行行程數 (預設 CPU 核心數)")
+    parser.add_argument("--fixture", type=int, default=None, metavar="SEED", help="使用離線價格 fixture (不下載)")
+    parser.add_argument("--out", default=OUTPUT_CSV)
+    parser.add_argument("--label", default=None, help="寫入結果庫的標籤 (預設 robustness:<結束日>)")
+    parser.add_argument("--no-results-db", action="store_true", help="不寫入 vanguard_results.db")
+    parser.add_argument("--no-indicator-cache", action="store_true", help="不讀寫 .indicator_cache (每個 worker 自行重算)")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    with RunMetrics('vanguard_robustness', first=args.first, end=args.end, stride=args.stride) as metrics:
+        results, engine = run(args.first, args.end, args.stride, args.min_years, args.workers,
+                              fixture_seed=args.fixture, indicator_cache=not args.no_indicator_cache)
+        table = summarize(results)
+        if table.empty:
+            metrics.status = 'no data'
+            print("❌ 所有起始日皆無回測結果")
+        else:
+            render(table, distribution(table))
+            table.to_csv(args.out)
+            print(f"\n📁 各起始日結果已儲存: {args.out} ({len(table)} 筆)")
+            lap('report')
+            if not args.no_results_db:
+                from vanguard_sql import RESULTS_DB, ResultsDB, strategy_params  # 延遲載入
+                params = strategy_params(vars(engine))
+                label = args.label or f"robustness:{args.end}"
+                with ResultsDB() as db:
+                    for start, equity_df, trade_log_df, _ in sorted(results, key=lambda r: r[0]):
+                        if equity_df is not None and not equity_df.empty:
+                            db.record_run(equity_df, trade_log_df, {**params, 'START_DATE': start, 'END_DATE': args.end}, label=label)
+                print(f"🗄️ {len(table)} 次回測已寫入 {RESULTS_DB} (label={label})")
+                lap('results_db')
+    print(f"⏱️ 總耗時 {time.perf_counter() - t0:.1f}s")
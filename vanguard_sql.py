@@ -0,0 +1,276 @@
+# =========================================================
+# Vanguard SQL
+# [OPT-32] 本機嵌入式 SQL 分析：回測結果庫 + 實盤成交紀錄放在同一個 SQLite 檔 (vanguard_results.db)
+#   - runs：每次回測一列 (參數 JSON + 績效摘要)；trades / equity：該次回測的 trade log 與淨值曲線
+#   - fills：broker_trades.csv (production) / paper_trades.csv (paper) / portfolios/*_trades.csv (變體名稱)
+#     依 byte offset 增量匯入 (sources 表記錄讀到哪裡)，檔案被截短 / 重建則整份重匯
+#   - view：v_fills (成本 bps = 逆向滑價，BUY 買貴 / SELL 賣便宜為正)、v_exits (平倉 + 該次回測參數)
+#   - 預先寫好的查詢 (QUERIES，具名參數綁定，sqlite3 連線內快取已編譯的 statement)：
+#     slippage_by_sector / exit_reason_profit / run_leaderboard / param_surface
+#   - trades 依 (side, reason_kind) 與 run_id 建索引、runs 參數以 json_extract 取值：數千次回測的彙總查詢在一秒內
+#   只用標準庫 sqlite3 (不需額外服務或套件)；pd.read_sql_query 直接回傳 DataFrame
+#
+#   with ResultsDB() as db:
+#       run_id = db.record_run(equity_df, trade_log_df, strategy_params(vars(engine)), label='sweep')
+#       db.import_fills()
+#       db.query('slippage_by_sector', account='production')
+#       db.param_surface('MIN_HOLD_DAYS', 'GAP_UP_LIMIT', metric='sharpe')
+#
+#   python vanguard_sql.py --import                       # 匯入成交紀錄
+#   python vanguard_sql.py slippage_by_sector --account paper
+#   python vanguard_sql.py exit_reason_profit --label sweep
+#   python vanguard_sql.py param_surface --x MIN_HOLD_DAYS --y GAP_UP_LIMIT --metric cagr
+#   python vanguard_sql.py --sql "SELECT label, COUNT(*) FROM runs GROUP BY label"
+# =========================================================
+import argparse
+import glob
+import io
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from vanguard_analytics import REASON_TARGET_RE, performance_summary, prepare_trades
+
+RESULTS_DB = 'vanguard_results.db'
+# 成交紀錄來源：(glob, 帳戶名稱；None = 由檔名 {name}_trades.csv 取)
+FILL_SOURCES = [('broker_trades.csv', 'production'), ('paper_trades.csv', 'paper'), ('portfolios/*_trades.csv', None)]
+RUN_METRICS = ['initial_equity', 'final_equity', 'total_return', 'cagr', 'max_drawdown', 'sharpe', 'sortino', 'calmar',
+               'n_trades', 'win_rate', 'total_fees', 'total_tax']
+TRADE_COLUMNS = ['fill_time', 'signal_time', 'market', 'symbol', 'side', 'qty', 'price', 'fee', 'slippage', 'tax',
+                 'gross_pnl', 'net_pnl', 'reason']
+FILL_COLUMNS = ['timestamp', 'symbol', 'side', 'qty', 'signal_price', 'fill_price', 'slippage_pct', 'reason', 'sector']
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    label TEXT, engine TEXT, created TEXT, start_date TEXT, end_date TEXT,
+    params TEXT,
+    {', '.join(f'{c} REAL' for c in RUN_METRICS)}
+);
+CREATE INDEX IF NOT EXISTS runs_label ON runs(label);
+CREATE TABLE IF NOT EXISTS trades (
+    run_id INTEGER NOT NULL,
+    fill_time TEXT, signal_time TEXT, market TEXT, symbol TEXT, side TEXT,
+    qty REAL, price REAL, fee REAL, slippage REAL, tax REAL, gross_pnl REAL, net_pnl REAL,
+    reason TEXT, reason_kind TEXT, holding_days REAL
+);
+CREATE INDEX IF NOT EXISTS trades_run ON trades(run_id);
+CREATE INDEX IF NOT EXISTS trades_exit ON trades(side, reason_kind, gross_pnl, holding_days, run_id);
+CREATE TABLE IF NOT EXISTS equity (
+    run_id INTEGER NOT NULL, date TEXT NOT NULL, total_equity REAL,
+    PRIMARY KEY (run_id, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS fills (
+    account TEXT, source TEXT,
+    timestamp TEXT, symbol TEXT, side TEXT, qty REAL, signal_price REAL, fill_price REAL, slippage_pct REAL,
+    reason TEXT, sector TEXT
+);
+CREATE INDEX IF NOT EXISTS fills_sector ON fills(sector, account);
+CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, offset INTEGER, rows INTEGER, imported TEXT);
+CREATE VIEW IF NOT EXISTS v_fills AS
+    SELECT *, (CASE side WHEN 'BUY' THEN slippage_pct ELSE -slippage_pct END) * 100 AS cost_bps,
+           qty * fill_price AS notional
+    FROM fills;
+CREATE VIEW IF NOT EXISTS v_exits AS
+    SELECT t.*, r.label, r.params FROM trades t JOIN runs r USING (run_id) WHERE t.side = 'SELL';
+"""
+
+QUERIES = {
+    # 實盤 / paper 成交的滑價成本 (bps，逆向為正)：名目金額加權
+    'slippage_by_sector': """
+        SELECT sector, COUNT(*) AS fills, SUM(notional) AS notional,
+               AVG(cost_bps) AS avg_cost_bps, SUM(cost_bps * notional) / SUM(notional) AS wavg_cost_bps,
+               MAX(cost_bps) AS worst_cost_bps
+        FROM v_fills
+        WHERE (:account IS NULL OR account = :account) AND timestamp >= COALESCE(:since, '')
+        GROUP BY sector ORDER BY wavg_cost_bps DESC""",
+    # 出場原因獲利能力 (跨所有 / 指定 label 的回測)
+    'exit_reason_profit': """
+        SELECT reason_kind AS reason, COUNT(*) AS n_trades, COUNT(DISTINCT run_id) AS runs,
+               SUM(gross_pnl) AS total_gross_pnl, AVG(gross_pnl) AS avg_gross_pnl,
+               AVG(gross_pnl > 0) AS win_rate, AVG(holding_days) AS avg_holding_days
+        FROM trades
+        WHERE side = 'SELL' AND (:label IS NULL OR run_id IN (SELECT run_id FROM runs WHERE label = :label))
+        GROUP BY reason_kind ORDER BY total_gross_pnl DESC""",
+    'run_leaderboard': """
+        SELECT run_id, label, start_date, end_date, cagr, max_drawdown, sharpe, calmar, n_trades, win_rate
+        FROM runs WHERE (:label IS NULL OR label = :label)
+        ORDER BY sharpe DESC LIMIT :limit""",
+    # 參數敏感度：兩個參數 (JSON path) 組合下的平均績效；param_surface() 再 pivot 成 x × y
+    'param_surface': """
+        SELECT json_extract(params, :x) AS x, json_extract(params, :y) AS y, COUNT(*) AS runs,
+               AVG(cagr) AS cagr, AVG(max_drawdown) AS max_drawdown, AVG(sharpe) AS sharpe,
+               AVG(calmar) AS calmar, AVG(win_rate) AS win_rate, MIN(cagr) AS worst_cagr
+        FROM runs WHERE (:label IS NULL OR label = :label)
+        GROUP BY 1, 2 ORDER BY 1, 2""",
+}
+QUERY_DEFAULTS = {'account': None, 'since': None, 'label': None, 'limit': 20}
+# 不屬於策略參數的大寫常數：檔案路徑 / universe 對照表
+PARAM_EXCLUDE_SUFFIXES = ('_MAP', '_DB', '_CSV', '_DIR', '_FILE', '_PATH')
+
+
+def strategy_params(namespace):
+    """模組全域的大寫純量 / dict 常數 (SLIPPAGE_RATE、MIN_HOLD_DAYS、SECTOR_PARAMS...) → 可 JSON 化的 dict
+    dict 的 float key 轉成字串 (SECTOR_PARAMS.trail)；json_extract 路徑例如 '$.SECTOR_PARAMS.US_STOCK.stop'"""
+    out = {}
+    for k, v in namespace.items():
+        if not k.isupper() or k.startswith('_') or k.endswith(PARAM_EXCLUDE_SUFFIXES): continue
+        if isinstance(v, (bool, int, float, str)): out[k] = v
+        elif isinstance(v, dict):
+            try: out[k] = json.loads(json.dumps(v, default=str))
+            except (TypeError, ValueError): continue
+    return out
+
+
+def _param_path(name):
+    return name if name.startswith('$') else f"$.{name}"
+
+
+def _text_time(s):
+    s = pd.to_datetime(s)
+    return s.dt.strftime('%Y-%m-%d %H:%M:%S').where(s.notna(), None)
+
+
+class ResultsDB:
+    def __init__(self, path=RESULTS_DB):
+        self.path = path
+        self.con = sqlite3.connect(path, timeout=60)  # 平行回測 worker 同時寫入時等待鎖
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        self.con.executescript(SCHEMA)
+
+    def __enter__(self): return self
+
+    def __exit__(self, *exc): self.close()
+
+    def close(self):
+        self.con.close()
+
+    # ---------- 回測結果 ----------
+    def record_run(self, equity_df, trade_log_df=None, params=None, label=None, engine='vanguard_backtest', summary=None):
+        """一次回測 → runs / trades / equity，回傳 run_id (summary 為 performance_summary 結果，可重用)"""
+        s = summary or performance_summary(equity_df, trade_log_df)
+        row = {'label': label, 'engine': engine, 'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+               'start_date': pd.Timestamp(equity_df.index[0]).strftime('%Y-%m-%d'),
+               'end_date': pd.Timestamp(equity_df.index[-1]).strftime('%Y-%m-%d'),
+               'params': json.dumps(params or {}, sort_keys=True, default=str)}
+        row.update({k: float(s[k]) for k in RUN_METRICS})
+        with self.con:
+            cur = self.con.execute(f"INSERT INTO runs ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})", list(row.values()))
+            run_id = cur.lastrowid
+            eq = pd.DataFrame({'run_id': run_id, 'date': equity_df.index.strftime('%Y-%m-%d'),
+                               'total_equity': equity_df['total_equity'].to_numpy(dtype=float)})
+            eq.to_sql('equity', self.con, if_exists='append', index=False)
+            if trade_log_df is not None and not trade_log_df.empty:
+                self._trades(run_id, trade_log_df).to_sql('trades', self.con, if_exists='append', index=False, chunksize=50000)
+        return run_id
+
+    @staticmethod
+    def _trades(run_id, trade_log_df):
+        df = trade_log_df.reindex(columns=TRADE_COLUMNS).copy()
+        df['fill_time'] = _text_time(trade_log_df['fill_time' if 'fill_time' in trade_log_df else 'timestamp'])
+        df['signal_time'] = _text_time(df['signal_time'])
+        reason = df['reason'].fillna('').astype(str)
+        df['reason_kind'] = reason.str.replace(REASON_TARGET_RE, '', regex=True)
+        # 持有天數只對 SELL 有意義 (與 vanguard_analytics 相同配對方式)
+        holding = np.full(len(df), np.nan)
+        holding[trade_log_df['side'].to_numpy() == 'SELL'] = prepare_trades(trade_log_df)['holding_days'].to_numpy(dtype=float)
+        df['holding_days'] = holding
+        df.insert(0, 'run_id', run_id)
+        return df
+
+    def delete_run(self, run_id):
+        with self.con:
+            for table in ('trades', 'equity', 'runs'): self.con.execute(f"DELETE FROM {table} WHERE run_id = ?", (run_id,))
+
+    # ---------- 實盤成交 ----------
+    def import_fills(self, sources=None):
+        """增量匯入成交 CSV；回傳新增筆數"""
+        added = 0
+        for pattern, account in sources or FILL_SOURCES:
+            for path in sorted(glob.glob(pattern)):
+                name = account or os.path.basename(path)[:-len('_trades.csv')]
+                added += self._import_file(path, name)
+        return added
+
+    def _import_file(self, path, account):
+        key = os.path.abspath(path)
+        row = self.con.execute("SELECT offset, rows FROM sources WHERE path = ?", (key,)).fetchone()
+        offset, rows = row or (0, 0)
+        size = os.path.getsize(path)
+        if size < offset:  # 被截短 / 重建：整份重匯
+            with self.con:
+                self.con.execute("DELETE FROM fills WHERE source = ?", (key,))
+                self.con.execute("DELETE FROM sources WHERE path = ?", (key,))
+            offset, rows = 0, 0
+        if size == offset: return 0
+        with open(path, 'rb') as f:
+            header = f.readline()
+            f.seek(max(offset, len(header)))
+            data = f.read()
+        end = data.rfind(b'\n') + 1  # 只讀到最後一個完整行 (寫入中的半行下次再讀)
+        if end == 0: return 0
+        df = pd.read_csv(io.BytesIO(header + data[:end]), dtype={'symbol': str, 'reason': str, 'sector': str})
+        df = df.reindex(columns=FILL_COLUMNS)
+        df.insert(0, 'source', key)
+        df.insert(0, 'account', account)
+        new_offset = max(offset, len(header)) + end
+        with self.con:
+            df.to_sql('fills', self.con, if_exists='append', index=False)
+            self.con.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)",
+                             (key, new_offset, rows + len(df), time.strftime('%Y-%m-%d %H:%M:%S')))
+        return len(df)
+
+    # ---------- 查詢 ----------
+    def sql(self, text, params=()):
+        return pd.read_sql_query(text, self.con, params=params)
+
+    def query(self, name, **params):
+        """QUERIES[name]，未給的具名參數用 QUERY_DEFAULTS"""
+        if name not in QUERIES: raise KeyError(f"未知查詢 {name} (可用: {', '.join(QUERIES)})")
+        return self.sql(QUERIES[name], {**QUERY_DEFAULTS, **params})
+
+    def param_surface(self, x, y, metric='sharpe', label=None):
+        """x × y 參數組合的平均 metric (pivot；缺少的組合為 NaN)"""
+        df = self.query('param_surface', x=_param_path(x), y=_param_path(y), label=label)
+        pivot = df.pivot(index='x', columns='y', values=metric)
+        pivot.index.name, pivot.columns.name = x, y
+        return pivot
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="回測結果 / 實盤成交 SQL 分析")
+    parser.add_argument("query", nargs='?', choices=sorted(QUERIES), help="預先寫好的查詢")
+    parser.add_argument("--db", default=RESULTS_DB)
+    parser.add_argument("--import", dest="import_fills", action="store_true", help="先增量匯入成交 CSV")
+    parser.add_argument("--sql", default=None, help="直接執行 SQL")
+    parser.add_argument("--account", default=None)
+    parser.add_argument("--since", default=None, metavar="YYYY-MM-DD")
+    parser.add_argument("--label", default=None)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--x", default=None, help="param_surface 的列參數 (例如 MIN_HOLD_DAYS)")
+    parser.add_argument("--y", default=None, help="param_surface 的欄參數")
+    parser.add_argument("--metric", default='sharpe', choices=['cagr', 'max_drawdown', 'sharpe', 'calmar', 'win_rate', 'worst_cagr', 'runs'])
+    args = parser.parse_args()
+    pd.set_option('display.width', 200)
+    pd.set_option('display.max_columns', 20)
+    with ResultsDB(args.db) as db:
+        if args.import_fills:
+            print(f"📥 匯入 {db.import_fills()} 筆成交")
+        t0 = time.perf_counter()
+        if args.sql:
+            out = db.sql(args.sql)
+        elif args.query == 'param_surface':
+            if not (args.x and args.y): parser.error("param_surface 需要 --x 與 --y")
+            out = db.param_surface(args.x, args.y, args.metric, args.label)
+        elif args.query:
+            out = db.query(args.query, account=args.account, since=args.since, label=args.label, limit=args.limit)
+        else:
+            out = db.sql("SELECT (SELECT COUNT(*) FROM runs) AS runs, (SELECT COUNT(*) FROM trades) AS trades, "
+                         "(SELECT COUNT(*) FROM fills) AS fills")
+        print(out.to_string())
+        print(f"\n⏱️ {(time.perf_counter() - t0) * 1000:.0f} ms")
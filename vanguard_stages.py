@@ -0,0 +1,311 @@
+# =========================================================
+# Vanguard Stage DAG
+# [OPT-22] 將流程拆成具名 stage (宣告 inputs / outputs)，依內容雜湊把每段結果記憶在磁碟
+#   - key = stage 名稱 + 程式碼指紋 + 各輸入指紋
+#       程式碼指紋：stage 函式本體，遞迴納入其引用的同目錄函式/類別與全域常數 (改參數/改邏輯即失效)
+#       輸入指紋：來源資料 (state / 價格面板) 以內容雜湊；純函數 stage 的輸出直接由上游 key 推導，不必重算大矩陣
+#   - pure=False (下載) 搭配 ttl：快取逾時才重跑；重跑結果內容不變時下游仍然命中
+#   - stage 回傳 None 代表流程提前結束 (例如沒有已收盤的交易日)
+#   - 中途失敗後重跑 / 只改戰報格式：前段全部命中快取，只重跑後段
+# [OPT-23] 時間預算：run(timeouts={stage: 秒}, deadline=整次上限)，逾時降級而非整批失敗
+#   - 宣告 'deadline' 輸入的 stage 自行在安全點檢查 (協作式，例如日迴圈在日與日之間停下)
+#   - 其餘有 fallback 的 stage 在 daemon thread 執行，逾時改用 fallback(**inputs) 的結果 (原執行緒放棄)
+#     放棄的執行緒仍會跑完：寫共用檔案 (價格快取) 前以 stage_cancelled() 檢查，逾時後不再寫入
+#   - 輸出可附 '_degraded': 說明文字 → 記錄於 ctx['degraded'][stage]，且該次結果不寫入快取
+#   - check(**outputs) → 說明文字 / None：輸出健檢 (例如下載到空面板)，不通過同樣視為降級、不寫入快取
+# [OPT-24] 每個 stage 以 run_metrics 打點 (有進行中的 RunMetrics 時記錄 wall / CPU / RSS)
+#
+#   python vanguard_stages.py            # 列出 .stage_cache 內各 stage 的快取檔
+# =========================================================
+import hashlib
+import os
+import pickle
+import threading
+import time
+import types
+
+import numpy as np
+import pandas as pd
+
+import run_metrics
+
+STAGE_CACHE_DIR = '.stage_cache'
+STAGE_CACHE_KEEP = 4   # 每個 stage 保留最近 N 份結果，其餘刪除
+
+_DATA_TYPES = (bool, int, float, str, dict, list, tuple, set, frozenset)
+
+
+# =========================
+# 內容雜湊
+# =========================
+def _feed(h, v):
+    if isinstance(v, pd.DataFrame):
+        h.update(b'DF'); _feed(h, [str(c) for c in v.columns]); _feed(h, [str(t) for t in v.dtypes]); h.update(str(v.index.dtype).encode())
+        h.update(pd.util.hash_pandas_object(v, index=True).to_numpy().tobytes())
+    elif isinstance(v, pd.Series):
+        h.update(b'S'); _feed(h, str(v.name)); h.update(f"{v.dtype}|{v.index.dtype}".encode())
+        h.update(pd.util.hash_pandas_object(v, index=True).to_numpy().tobytes())
+    elif isinstance(v, np.ndarray):
+        h.update(f"A{v.dtype}{v.shape}".encode())
+        h.update(pickle.dumps(v) if v.dtype == object else np.ascontiguousarray(v).tobytes())
+    elif isinstance(v, dict):
+        h.update(f"D{len(v)}".encode())
+        for k in sorted(v, key=repr): _feed(h, k); _feed(h, v[k])
+    elif isinstance(v, (list, tuple)):
+        h.update(f"L{len(v)}".encode())
+        for x in v: _feed(h, x)
+    elif isinstance(v, (set, frozenset)):
+        h.update(repr(sorted(map(repr, v))).encode())
+    elif v is None or isinstance(v, (bool, int, float, str, np.generic, pd.Timestamp, pd.Timedelta)) or hasattr(v, 'isoformat'):
+        h.update(f"{type(v).__name__}:{v!r}".encode())
+    elif hasattr(v, '__dict__'):
+        h.update(type(v).__name__.encode()); _feed(h, vars(v))
+    else:
+        h.update(pickle.dumps(v))
+
+
+def content_hash(*values):
+    h = hashlib.sha1()
+    for v in values: _feed(h, v)
+    return h.hexdigest()
+
+
+# =========================
+# 程式碼指紋
+# =========================
+def _local_code(obj, root):
+    obj = getattr(obj, '__func__', obj)
+    code = getattr(obj, '__code__', None)
+    if code is None or os.path.dirname(os.path.abspath(code.co_filename)) != root: return None
+    return code
+
+
+def _feed_code(h, code, globs, root, seen, skip):
+    h.update(code.co_code)
+    for c in code.co_consts:
+        if isinstance(c, types.CodeType): _feed_code(h, c, globs, root, seen, skip)
+        else: h.update(repr(sorted(map(repr, c)) if isinstance(c, frozenset) else c).encode())
+    for name in code.co_names:
+        h.update(name.encode())
+        if name in skip or name not in globs: continue
+        _feed_global(h, globs[name], root, seen, skip)
+
+
+def _feed_global(h, obj, root, seen, skip):
+    if id(obj) in seen: return
+    seen.add(id(obj))
+    if isinstance(obj, _DATA_TYPES):
+        _feed(h, obj)
+    elif isinstance(obj, type):
+        members = {a: m.fget if isinstance(m, property) else m for a, m in vars(obj).items()}
+        if not any(_local_code(m, root) for m in members.values()): return  # 第三方類別
+        for attr, member in sorted(members.items()):
+            code = _local_code(member, root)
+            if code is not None:
+                h.update(attr.encode()); _feed_code(h, code, getattr(member, '__func__', member).__globals__, root, seen, skip)
+            elif isinstance(member, _DATA_TYPES) and not attr.startswith('__'):
+                h.update(attr.encode()); _feed(h, member)
+    else:
+        code = _local_code(obj, root)
+        if code is not None:
+            _feed(h, obj.__defaults__)
+            _feed_code(h, code, obj.__globals__, root, seen, skip)
+
+
+def code_fingerprint(fn, skip=()):
+    """
+    fn 本體 + 遞迴引用的同目錄函式/類別 (方法) + 引用的全域常數 (數值/字串/dict/list…)。
+    模組、第三方函式與 None 不納入；skip 為執行期會變動、與計算結果無關的全域名稱。
+    """
+    root = os.path.dirname(os.path.abspath(fn.__code__.co_filename))
+    h = hashlib.sha1()
+    _feed_global(h, fn, root, set(), set(skip))
+    return h.hexdigest()
+
+
+# =========================
+# Stage / 快取 / 執行器
+# =========================
+class Stage:
+    """
+    fn(**inputs) → {output: value} (None = 流程提前結束)
+    key:   參與雜湊的輸入 (預設全部 inputs；不可雜湊的物件如 callback 需排除)
+    cache: False = 每次重跑 (有副作用的 stage：存檔 / 推播)
+    pure:  False = 外部資料 (下載)，輸出以內容雜湊；ttl 為快取有效秒數
+    fallback: fallback(**inputs) → 逾時時的降級輸出 (None = 無可用降級結果)
+    check: check(**outputs) → 不可用的說明 (None = 通過)；不通過的結果標記降級且不寫入快取
+    """
+    def __init__(self, name, fn, inputs=(), outputs=(), key=None, cache=True, pure=True, ttl=None, fallback=None, check=None):
+        self.name, self.fn = name, fn
+        self.inputs, self.outputs = tuple(inputs), tuple(outputs)
+        self.key = tuple(k for k in key if k != 'deadline') if key is not None else tuple(k for k in self.inputs if k != 'deadline')
+        self.cache, self.pure, self.ttl, self.fallback, self.check = cache, pure, ttl, fallback, check
+
+    def __repr__(self): return f"Stage({self.name}: {', '.join(self.inputs)} → {', '.join(self.outputs)})"
+
+
+def stage_cancelled():
+    """在 stage 的 worker thread 內呼叫：該 stage 已逾時 (結果改用 fallback) 時為 True；主執行緒一律 False"""
+    event = getattr(threading.current_thread(), 'cancel', None)
+    return event is not None and event.is_set()
+
+
+class StageCache:
+    def __init__(self, root=STAGE_CACHE_DIR, keep=STAGE_CACHE_KEEP):
+        self.root, self.keep = root, keep
+
+    def _path(self, name, key): return os.path.join(self.root, f"{name}-{key[:16]}.pkl")
+
+    def get(self, name, key, ttl=None):
+        path = self._path(name, key)
+        if not os.path.exists(path): return None
+        try:
+            with open(path, 'rb') as f: entry = pickle.load(f)
+        except Exception:
+            return None
+        if entry.get('key') != key: return None
+        if ttl is not None and time.time() - entry['ts'] > ttl: return None
+        os.utime(path)  # 命中視同最近使用，清理時保留
+        return entry
+
+    def put(self, name, key, outputs):
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(name, key)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f: pickle.dump({'key': key, 'ts': time.time(), 'outputs': outputs}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        files = sorted((os.path.join(self.root, fn) for fn in os.listdir(self.root) if fn.startswith(name + '-') and fn.endswith('.pkl')),
+                       key=os.path.getmtime, reverse=True)
+        for old in files[self.keep:]:
+            try: os.remove(old)
+            except OSError: pass
+
+
+def order_stages(stages, provided=()):
+    """依宣告的 inputs / outputs 拓撲排序 (同層維持宣告順序)；缺少來源或循環依賴時報錯"""
+    producer = {o: s.name for s in stages for o in s.outputs}
+    done, ordered, pending = set(provided), [], list(stages)
+    while pending:
+        ready = [s for s in pending if all(k in done for k in s.inputs)]
+        if not ready:
+            missing = {k for s in pending for k in s.inputs if k not in done and k not in producer}
+            raise ValueError(f"stage 輸入缺少來源: {sorted(missing)}" if missing else
+                             f"stage 循環依賴: {[s.name for s in pending]}")
+        for s in ready:
+            ordered.append(s); pending.remove(s); done.update(s.outputs)
+    return ordered
+
+
+class StagePipeline:
+    """
+    pipe = StagePipeline(stages, StageCache())
+    ctx = pipe.run({'dry_run': True, ...}, fresh={'download'})   # fresh: 本次強制重跑且不讀快取的 stage
+    pipe.log: [(name, 'run' | 'hit' | 'halt' | 'degraded' | 'late', 秒數)]；pipe.age: {name: 命中快取的資料年齡 (秒)}
+    pipe.failed: 拋出例外的 stage 名稱 (None = 無)
+    """
+    def __init__(self, stages, cache=None, skip_globals=()):
+        self.stages = list(stages)
+        self.cache = cache
+        self.skip_globals = skip_globals
+        self.log = []
+        self.age = {}
+        self.halted = None
+        self.failed = None
+        self._code = {}
+
+    def _fingerprint(self, stage):
+        if stage.name not in self._code: self._code[stage.name] = code_fingerprint(stage.fn, self.skip_globals)
+        return self._code[stage.name]
+
+    def _budget(self, stage, timeouts, deadline):
+        """本 stage 可用秒數：自身預算與整次剩餘時間取小；只對能降級的 stage 生效"""
+        if 'deadline' not in stage.inputs and stage.fallback is None: return None
+        budget = timeouts.get(stage.name)
+        if deadline is not None:
+            remaining = max(deadline - time.monotonic(), 0)
+            budget = remaining if budget is None else min(budget, remaining)
+        return budget
+
+    def _call(self, stage, kwargs, budget):
+        """回傳 (out, late)；有 fallback 與預算時在 daemon thread 執行，逾時即放棄等待"""
+        if stage.fallback is None or budget is None: return stage.fn(**kwargs), False
+        box = {}
+        def target():
+            try: box['out'] = stage.fn(**kwargs)
+            except BaseException as e: box['err'] = e
+        worker = threading.Thread(target=target, daemon=True, name=f"stage-{stage.name}")
+        worker.cancel = threading.Event()
+        worker.start()
+        worker.join(budget)
+        if worker.is_alive():
+            worker.cancel.set()  # 先通知放棄，fallback 讀取共用檔案時 worker 不再寫入
+            out = stage.fallback(**kwargs)
+            if out is None: raise TimeoutError(f"stage {stage.name} 超出時間預算 {budget:.0f}s，且無可用降級結果")
+            return out, True
+        if 'err' in box: raise box['err']
+        return box['out'], False
+
+    def run(self, ctx, fresh=(), timeouts=None, deadline=None):
+        """timeouts: {stage: 秒}；deadline: time.monotonic() 絕對時間，整次執行上限"""
+        ctx, fp, timeouts = dict(ctx), {}, timeouts or {}
+        ctx.setdefault('deadline', None)
+        ctx['degraded'] = {}
+        self.log, self.age, self.halted, self.failed = [], {}, None, None
+        for stage in order_stages(self.stages, ctx):
+            t0 = time.perf_counter()
+            run_metrics.skip()
+            use_cache = self.cache is not None and stage.cache and stage.name not in fresh
+            key = out = None
+            if use_cache:
+                for k in stage.key:
+                    if k not in fp: fp[k] = content_hash(ctx[k])
+                key = content_hash(stage.name, self._fingerprint(stage), [fp[k] for k in stage.key])
+                entry = self.cache.get(stage.name, key, stage.ttl)
+                if entry is not None: out, self.age[stage.name] = entry['outputs'], time.time() - entry['ts']
+            status = 'hit' if out is not None else 'run'
+            if out is None:
+                budget = self._budget(stage, timeouts, deadline)
+                if 'deadline' in stage.inputs: ctx['deadline'] = time.monotonic() + budget if budget is not None else None
+                try: out, late = self._call(stage, {k: ctx[k] for k in stage.inputs}, budget)
+                except BaseException:
+                    self.failed = stage.name
+                    raise
+                if out is None:
+                    self.log.append((stage.name, 'halt', time.perf_counter() - t0))
+                    run_metrics.lap(stage.name)
+                    self.halted = stage.name
+                    return ctx
+                out = dict(out)
+                note = out.pop('_degraded', None)
+                if set(out) != set(stage.outputs):
+                    raise ValueError(f"stage {stage.name} 輸出 {sorted(out)} 與宣告 {list(stage.outputs)} 不符")
+                if stage.check is not None and not late and not note: note = stage.check(**out)
+                if note or late:
+                    ctx['degraded'][stage.name] = note or f"⏳ {stage.name} 逾時，改用降級結果"
+                    status, use_cache = ('late' if late else 'degraded'), False
+                    print(ctx['degraded'][stage.name])
+                if use_cache: self.cache.put(stage.name, key, out)
+            for o in stage.outputs:
+                ctx[o] = out[o]
+                if use_cache and stage.pure: fp[o] = content_hash(key, o)
+                else: fp.pop(o, None)
+            self.log.append((stage.name, status, time.perf_counter() - t0))
+            run_metrics.lap(stage.name)
+            if status == 'hit': run_metrics.count('stage_cache_hits')
+        return ctx
+
+    def summary(self):
+        def _fmt(name, status, sec):
+            tag = (f" ✅({self.age[name] / 60:.0f}m)" if status == 'hit' else ' ⏹' if status == 'halt'
+                   else ' ⏳' if status in ('late', 'degraded') else '')
+            return f"{name}{tag} {sec * 1000:.0f}ms"
+        return " | ".join(_fmt(*entry) for entry in self.log)
+
+
+if __name__ == "__main__":
+    if not os.path.isdir(STAGE_CACHE_DIR):
+        print(f"(無 {STAGE_CACHE_DIR})")
+    else:
+        for fn in sorted(os.listdir(STAGE_CACHE_DIR), key=lambda f: os.path.getmtime(os.path.join(STAGE_CACHE_DIR, f))):
+            path = os.path.join(STAGE_CACHE_DIR, fn)
+            print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(os.path.getmtime(path)))}  {os.path.getsize(path) / 1024:>9.1f} KB  {fn}")
@@ -0,0 +1,320 @@
+# =========================================================
+# Vanguard Synthetic Market
+# [OPT-28] 合成市場產生器：規模 / 壓力測試用，輸出與 get_data() 完全相同形狀的面板
+#   - 全域 regime (多頭 / 空頭 / 危機) 為 Markov chain，各市場共用 (危機同時發生)
+#   - 各市場因子 (crypto / US / TW) 為 regime 切換的 GBM；個股 = beta × 市場因子 + 個別波動 + 跳空 (Poisson 跳躍)
+#   - 交易日曆：crypto 每天；美股 / 台股 週一至五扣除各自假日 (台股含農曆年連假)；部分標的中途上市
+#     → raw Close 為 NaN 的日子即 is_trading_day=False，可驗證 CR-02 非交易日遮蔽
+#   - ^VIX：依 regime 水位的 OU 過程 + 危機跳升；TWD=X：均值回歸匯率
+#   - 固定 seed 完全可重現；100 ~ 10,000 檔、1 ~ 20 年，依標的分塊產生以控制暫存記憶體
+#     記憶體 ≈ 檔數 × 日數 × 8 bytes × 約 10 (原始四欄 + 面板)，10,000 檔 × 20 年約 6 GB：大規模請用 --float32
+#
+#   market = generate_market(n_tickers=1000, years=5, mix={'crypto': .2, 'us': .6, 'tw': .2}, seed=7)
+#   market.raw             # yf.download 形狀 (Open/High/Low/Close, ticker)
+#   market.panel()         # get_data() 形狀 (close, open_, high, low, is_trading_day, twd_series, raw_high_twd)
+#   market.asset_map       # {ticker: sector}，供 compute_scores / StrategyConfig 使用
+#   market = engine_market(engine, '2021-05-01')   # 指定 universe：引擎的 ALL_TICKERS / ASSET_MAP，可直接當作 engine.yf
+#     (vanguard_bench / vanguard_robustness 的離線 fixture 即由此產生)
+#
+#   python vanguard_synth.py --tickers 2000 --years 10 --seed 1 --out synth_cache.pkl   # 存成 price_cache.pkl 格式
+# =========================================================
+import argparse
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_END = '2026-02-26'
+DEFAULT_MIX = {'crypto': 0.25, 'us': 0.55, 'tw': 0.20}
+USD_TWD_RATE = 32.5
+BLOCK = 512  # 每次產生的標的數
+
+# regime: 0 多頭 / 1 空頭 / 2 危機；每日轉移機率
+REGIME_NAMES = ('bull', 'bear', 'crisis')
+REGIME_TRANSITION = np.array([
+    [0.995, 0.004, 0.001],
+    [0.010, 0.985, 0.005],
+    [0.020, 0.030, 0.950],
+])
+# 市場因子：年化 drift / 年化波動 (依 regime)，跳躍頻率 (每年次數) 與平均跳幅
+MARKETS = {
+    'crypto': {'mu': (0.60, -0.50, -1.50), 'vol': (0.55, 0.70, 1.10), 'jumps': (4, 6, 20), 'jump': -0.04, 'calendar': 'daily'},
+    'us':     {'mu': (0.15, -0.15, -0.80), 'vol': (0.15, 0.25, 0.55), 'jumps': (1, 3, 12), 'jump': -0.02, 'calendar': 'us'},
+    'tw':     {'mu': (0.12, -0.12, -0.70), 'vol': (0.16, 0.24, 0.45), 'jumps': (1, 3, 10), 'jump': -0.02, 'calendar': 'tw'},
+}
+# 板塊：(市場, 權重, beta 範圍, 年化個別波動範圍)
+SECTORS = {
+    'CRYPTO_SPOT': ('crypto', 0.5, (0.9, 1.1), (0.30, 0.60)),
+    'CRYPTO_MEME': ('crypto', 0.4, (1.2, 1.8), (0.80, 1.50)),
+    'CRYPTO_LEV':  ('crypto', 0.1, (1.8, 2.2), (0.50, 0.90)),
+    'US_STOCK':    ('us', 0.45, (0.6, 1.1), (0.15, 0.35)),
+    'US_GROWTH':   ('us', 0.35, (1.1, 1.6), (0.35, 0.80)),
+    'LEV_2X':      ('us', 0.15, (1.8, 2.2), (0.30, 0.60)),
+    'US_LEV':      ('us', 0.05, (2.7, 3.2), (0.40, 0.70)),
+    'TW_STOCK':    ('tw', 1.0, (0.6, 1.4), (0.20, 0.45)),
+}
+VIX_LEVEL = (14.0, 24.0, 45.0)
+HOLIDAYS_PER_YEAR = {'us': 9, 'tw': 10}
+LISTING_FRAC = 0.15  # 中途上市的比例 (上市日前為 NaN)
+DEFAULT_SECTOR = {'crypto': 'CRYPTO_SPOT', 'us': 'US_STOCK', 'tw': 'TW_STOCK'}  # 指定 universe 中未知板塊的參數
+
+# 引擎需要的基準 / 總經序列：(市場, beta, 年化個別波動)
+BENCHMARKS = {
+    'SPY': ('us', 1.0, 0.01), 'QQQ': ('us', 1.2, 0.04), 'BTC-USD': ('crypto', 1.0, 0.02),
+    '^TWII': ('tw', 1.0, 0.01), '^HSI': ('tw', 0.9, 0.10),
+}
+
+
+class SyntheticMarket:
+    def __init__(self, raw, asset_map, regimes, factors, seed):
+        self.raw = raw
+        self.asset_map = asset_map
+        self.regimes = regimes
+        self.factors = factors
+        self.seed = seed
+
+    @property
+    def tickers(self): return list(self.raw['Close'].columns)
+
+    @property
+    def tier_1(self):
+        """各板塊前幾檔當作 TIER_1 (分數 ×1.2 加權路徑也會被執行)"""
+        return [t for t in self.asset_map if zlib.crc32(t.encode()) % 20 == 0]
+
+    def panel(self, usd_twd_rate=USD_TWD_RATE):
+        return to_panel(self.raw, usd_twd_rate)
+
+    def download(self, tickers=None, start=None, **kwargs):
+        """yf.download 相容介面：可直接當作引擎模組的 yf 使用"""
+        return self.raw.loc[pd.Timestamp(start):].copy() if start is not None else self.raw.copy()
+
+    def summary(self):
+        close = self.raw['Close']
+        kinds = pd.Series(self.asset_map).value_counts().to_dict()
+        days = np.bincount(self.regimes, minlength=3)
+        return (f"{close.shape[1]} tickers × {close.shape[0]} 天 ({close.index[0]:%Y-%m-%d} ~ {close.index[-1]:%Y-%m-%d}) | "
+                f"NaN {close.isna().values.mean():.1%} | regime " + " / ".join(f"{n} {d}" for n, d in zip(REGIME_NAMES, days))
+                + f" | 板塊 {kinds}")
+
+
+# =========================
+# 產生器
+# =========================
+def _regime_path(rng, n):
+    u = rng.random(n)
+    cum = REGIME_TRANSITION.cumsum(axis=1)
+    out = np.empty(n, np.int8)
+    state = 0
+    for k in range(n):
+        out[k] = state
+        state = int(np.searchsorted(cum[state], u[k], side='right'))
+    return out
+
+
+def _calendar(rng, idx, kind):
+    """回傳長度 = 日數的 bool：該市場是否開盤"""
+    if kind == 'daily': return np.ones(len(idx), bool)
+    open_ = np.asarray(idx.weekday < 5)
+    for year in np.unique(idx.year):
+        days = np.flatnonzero(np.asarray(idx.year == year) & open_)
+        if not len(days): continue
+        holidays = rng.choice(days, size=min(HOLIDAYS_PER_YEAR[kind], len(days)), replace=False)
+        open_[holidays] = False
+        if kind == 'tw':  # 農曆年：一~二月間連續 5 個營業日休市
+            jan_feb = days[np.asarray(idx.month[days] <= 2)]
+            if len(jan_feb) > 5:
+                s = rng.integers(0, len(jan_feb) - 5)
+                open_[jan_feb[s:s + 5]] = False
+    return open_
+
+
+def _factor(rng, regimes, market):
+    p = MARKETS[market]
+    mu, vol = np.array(p['mu'])[regimes] / 365, np.array(p['vol'])[regimes] / np.sqrt(365)
+    jumps = rng.random(len(regimes)) < np.array(p['jumps'])[regimes] / 365
+    return mu - vol ** 2 / 2 + vol * rng.standard_normal(len(regimes)) + jumps * rng.normal(p['jump'], 0.05, len(regimes))
+
+
+def _ohlc(rng, log_ret, start_level):
+    """log 報酬 (n, k) → (open, high, low, close)；開盤反映部分隔夜變動 (跳空在開盤出現)"""
+    close = start_level * np.exp(np.cumsum(log_ret, axis=0))
+    prev = np.vstack([close[:1], close[:-1]])
+    n, k = close.shape
+    open_ = prev * np.exp(log_ret * rng.uniform(0, 0.6, (n, k)) + rng.normal(0, 0.003, (n, k)))
+    wick = np.abs(log_ret).mean(axis=0) * 0.8
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.standard_normal((n, k))) * wick)
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.standard_normal((n, k))) * wick)
+    return open_, high, low, close
+
+
+def _vix(rng, regimes, us_factor):
+    n = len(regimes)
+    level = np.array(VIX_LEVEL)[regimes]
+    shocks = rng.normal(0, 1.0, n) + np.maximum(-us_factor, 0) * 150  # 美股下跌 → VIX 上升
+    out = np.empty(n)
+    out[0] = level[0]
+    for k in range(1, n):
+        out[k] = max(9.0, out[k - 1] + 0.10 * (level[k] - out[k - 1]) + shocks[k])
+    return out
+
+
+def _twd(rng, n):
+    out = np.empty(n)
+    out[0] = USD_TWD_RATE
+    shocks = rng.normal(0, 0.08, n)
+    for k in range(1, n):
+        out[k] = out[k - 1] + 0.01 * (USD_TWD_RATE - out[k - 1]) + shocks[k]
+    return out
+
+
+def _names(market, count, offset):
+    if market == 'crypto': return [f"SYN{offset + i:05d}-USD" for i in range(count)]
+    if market == 'tw': return [f"{1000 + offset + i}.TW" for i in range(count)]
+    return [f"SYN{offset + i:05d}" for i in range(count)]
+
+
+def _market_of(ticker):
+    """依代號推斷市場 (台股判斷與 to_panel 相同)"""
+    if ticker.endswith('-USD'): return 'crypto'
+    return 'tw' if '.TW' in ticker else 'us'
+
+
+def _universe_plan(rng, universe, n, listing_frac):
+    """指定標的 {ticker: 板塊 或 None} 的規劃：基準序列沿用 BENCHMARKS，未知板塊依代號取市場預設板塊的參數"""
+    plan = []
+    for name, sec in sorted(universe.items()):
+        if name in ('^VIX', 'TWD=X'): continue
+        if name in BENCHMARKS:
+            (market, beta, idio), lst = BENCHMARKS[name], 0
+        else:
+            market, _, betas, idios = SECTORS.get(sec) or SECTORS[DEFAULT_SECTOR[_market_of(name)]]
+            beta, idio = rng.uniform(*betas), rng.uniform(*idios)
+            lst = rng.integers(n // 10, max(n - n // 5, n // 10 + 1)) if rng.random() < listing_frac else 0
+        plan.append((name, market, sec, beta, idio, lst))
+    return plan
+
+
+def _synthetic_plan(rng, mix, n_tickers, n, listing_frac):
+    """依市場權重產生合成代號 (SYN00001 / 1000.TW ...) 並附上 BENCHMARKS"""
+    weights = np.array(list(mix.values()), float)
+    counts = np.floor(weights / weights.sum() * n_tickers).astype(int)
+    counts[np.argmax(weights)] += n_tickers - counts.sum()
+    plan, offset = [], 0
+    for market, count in zip(mix, counts):
+        sector_names = [s for s, p in SECTORS.items() if p[0] == market]
+        sector_w = np.array([SECTORS[s][1] for s in sector_names])
+        sectors = rng.choice(sector_names, size=count, p=sector_w / sector_w.sum())
+        listing = np.where(rng.random(count) < listing_frac, rng.integers(n // 10, max(n - n // 5, n // 10 + 1), count), 0)
+        for name, sec, lst in zip(_names(market, count, offset), sectors, listing):
+            plan.append((name, market, str(sec), rng.uniform(*SECTORS[sec][2]), rng.uniform(*SECTORS[sec][3]), lst))
+        offset += count
+    for name, (market, beta, idio) in BENCHMARKS.items():
+        plan.append((name, market, 'CRYPTO_SPOT' if name == 'BTC-USD' else None, beta, idio, 0))
+    return plan
+
+
+def generate_market(n_tickers=100, years=4, mix=None, seed=0, end=DEFAULT_END, listing_frac=LISTING_FRAC, dtype=np.float64,
+                    universe=None, start=None):
+    """
+    n_tickers: 不含基準序列 (SPY/QQQ/BTC-USD/^TWII/^HSI/^VIX/TWD=X 一律附上)
+    mix: {'crypto': w, 'us': w, 'tw': w}，權重自動正規化
+    universe: 指定標的 ({ticker: 板塊} 或 ticker 清單)；給定時忽略 n_tickers / mix，只產生這些欄位 (含其中的基準序列)
+    start: 起始日 (預設 end 往前 years 年)
+    結果直接寫入預先配置的 (日數, 4 × 檔數) 陣列 (欄位已排序)，不做整表 concat 複製
+    """
+    mix = {k: v for k, v in (mix or DEFAULT_MIX).items() if v > 0}
+    unknown = set(mix) - set(MARKETS)
+    if unknown: raise ValueError(f"未知市場: {sorted(unknown)}")
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end)
+    idx = pd.date_range(start if start is not None else end - pd.Timedelta(days=int(round(years * 365.25)) - 1), end, freq='D')
+    n = len(idx)
+
+    regimes = _regime_path(rng, n)
+    calendars = {m: _calendar(rng, idx, MARKETS[m]['calendar']) for m in MARKETS}
+    factors = {m: _factor(rng, regimes, m) for m in MARKETS}
+
+    # --- 標的規劃：(名稱, 市場, 板塊, beta, 年化個別波動, 上市日) ---
+    if universe is not None:
+        universe = universe if isinstance(universe, dict) else dict.fromkeys(universe)
+        plan = _universe_plan(rng, universe, n, listing_frac)
+        extras = [t for t in ('^VIX', 'TWD=X') if t in universe]
+    else:
+        plan, extras = _synthetic_plan(rng, mix, n_tickers, n, listing_frac), ['^VIX', 'TWD=X']
+    columns = sorted([p[0] for p in plan] + extras)
+    pos = {c: i for i, c in enumerate(columns)}
+    m = len(columns)
+    data = np.empty((n, 4 * m), dtype)  # Open | High | Low | Close
+
+    def put(names, ohlc, traded):
+        cols = np.array([pos[c] for c in names])
+        for f, arr in enumerate(ohlc):
+            arr = arr.astype(dtype, copy=False)
+            arr[~traded] = np.nan
+            data[:, f * m + cols] = arr
+
+    # --- 依市場分塊產生 ---
+    for market in MARKETS:
+        rows = [p for p in plan if p[1] == market]
+        for start in range(0, len(rows), BLOCK):
+            block = rows[start:start + BLOCK]
+            k = len(block)
+            beta, idio = np.array([p[3] for p in block]), np.array([p[4] for p in block]) / np.sqrt(365)
+            log_ret = np.outer(factors[market], beta) - idio ** 2 / 2 + rng.standard_normal((n, k)) * idio
+            log_ret += (rng.random((n, k)) < 2.0 / 365) * rng.normal(0, 0.12, (n, k))  # 個股消息面跳空
+            ohlc = _ohlc(rng, log_ret, rng.uniform(20, 600 if market == 'tw' else 300, k))
+            traded = calendars[market][:, None] & (np.arange(n)[:, None] >= np.array([p[5] for p in block])[None, :])
+            put([p[0] for p in block], ohlc, traded)
+
+    for name, make in (('^VIX', lambda: _vix(rng, regimes, factors['us'])), ('TWD=X', lambda: _twd(rng, n))):
+        if name not in pos: continue
+        a = make()[:, None]
+        put([name], (a, a * 1.01, a * 0.99, a), calendars['us'][:, None])
+
+    raw = pd.DataFrame(data, index=idx, columns=pd.MultiIndex.from_product([['Open', 'High', 'Low', 'Close'], columns]), copy=False)
+    asset_map = {p[0]: p[2] for p in plan if p[2] is not None}
+    return SyntheticMarket(raw, dict(sorted(asset_map.items())), regimes, factors, seed)
+
+
+def engine_market(engine, start, end=DEFAULT_END, seed=0):
+    """引擎模組 universe 的合成市場 (ALL_TICKERS，板塊取自 ASSET_MAP，全部自 start 起即上市)；回傳值可直接設為 engine.yf"""
+    universe = {t: engine.ASSET_MAP.get(t) for t in engine.ALL_TICKERS}
+    return generate_market(seed=seed, end=end, listing_frac=0, universe=universe, start=start)
+
+
+def to_panel(raw, usd_twd_rate=USD_TWD_RATE):
+    """yf.download 形狀 → get_data() 回傳的 7 項面板 (與 V18.00_VANGUARD.get_data 相同轉換，不寫價格快取)"""
+    raw_close = raw['Close']
+    close, open_, high, low = (raw[k].ffill() for k in ('Close', 'Open', 'High', 'Low'))
+    is_trading_day = ~raw_close.isna()
+    twd_series = close['TWD=X'].ffill().bfill() if 'TWD=X' in close.columns else pd.Series(usd_twd_rate, index=close.index)
+    raw_high_twd = high.copy()
+    tw = [c for c in close.columns if '.TW' in c or '.TWO' in c]
+    if tw:
+        for df in (close, open_, high, low): df[tw] = df[tw].div(twd_series, axis=0)
+    drop = [c for c in close.columns if c == 'TWD=X']
+    if drop:
+        for df in (close, open_, high, low, is_trading_day, raw_high_twd): df.drop(columns=drop, inplace=True)
+    return close, open_, high, low, is_trading_day, twd_series, raw_high_twd
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="合成市場產生器")
+    parser.add_argument("--tickers", type=int, default=100)
+    parser.add_argument("--years", type=float, default=4)
+    parser.add_argument("--mix", default="crypto=0.25,us=0.55,tw=0.20", help="市場權重，例如 crypto=0.3,us=0.5,tw=0.2")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--end", default=DEFAULT_END)
+    parser.add_argument("--float32", action="store_true", help="以 float32 產生 (大規模時省一半記憶體)")
+    parser.add_argument("--out", help="以 price_cache.pkl 格式存檔 (可供 --catch-up / 紙上券商使用)")
+    args = parser.parse_args()
+    mix = {k: float(v) for k, v in (part.split('=') for part in args.mix.split(','))}
+    t0 = time.perf_counter()
+    market = generate_market(args.tickers, args.years, mix, args.seed, args.end, dtype=np.float32 if args.float32 else np.float64)
+    print(f"🧪 {market.summary()}")
+    print(f"   產生耗時 {time.perf_counter() - t0:.1f}s")
+    if args.out:
+        keys = ('close', 'open', 'high', 'low', 'is_trading_day', 'twd_series', 'raw_high_twd')
+        pd.to_pickle(dict(zip(keys, market.panel())), args.out)
+        print(f"📁 已寫入 {args.out}")
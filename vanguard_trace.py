@@ -0,0 +1,137 @@
+# =========================================================
+# Vanguard Decision Trace
+# [OPT-13] 日迴圈決策紀錄器：每日排名 / 換倉門檻 / 板塊上限 / 倉位縮放 / 巨觀開關
+#   - 預設關閉：step_day(trace=None) 只多幾次 None 判斷
+#   - 開啟時逐日累積精簡欄位，結束時以 columnar npz (每欄一個 numpy 陣列) 追加寫入
+#   - 合併時以 (date, account) 去重：重跑同一天會取代舊紀錄，不會重複出現 (檔案大小只隨不同日數成長)
+#   - 事後查詢：load_trace() → (days, events) 兩張 DataFrame，或 CLI 直接列出某日決策
+#
+#   python vanguard_trace.py decision_trace.npz --date 2026-05-16 [--symbol RKLX] [--account production]
+# =========================================================
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+TRACE_FILE = 'decision_trace.npz'
+
+# events.kind：
+#   CAND       當日候選排名 (rank, score)
+#   HOLD       持倉分數 (flag=1 代表已列入賣出)
+#   MIN_HOLD   最差持倉未滿最短持有天數，略過換倉
+#   SECTOR_CAP 候選因 is_allowed 板塊上限被跳過
+#   SWAP       換倉評估：symbol=最差持倉, note=最佳候選, score=b_score, ref=w_score, mult=min(2.0, 1.4+v_hold*0.1), flag=是否換倉
+#   BUY_SKIP   排隊買單被丟棄 (note=GAP_UP / NO_CASH / MIN_NOTIONAL)
+#   FILL       成交 (note=side:reason)
+#   ORDER      當日結算後隊列中的指令 (note=type:reason, score=amount_usd)
+DAY_COLUMNS = {
+    'date': 'datetime64[D]', 'account': 'U32', 'vix': 'f4', 'vix_scaler': 'f4', 'macro_bearish': '?',
+    'total_eq': 'f8', 'cash': 'f8', 'n_candidates': 'i4', 'n_holdings': 'i2',
+}
+EVENT_COLUMNS = {
+    'date': 'datetime64[D]', 'account': 'U32', 'kind': 'U10', 'rank': 'i2', 'symbol': 'U24',
+    'score': 'f4', 'ref': 'f4', 'mult': 'f4', 'flag': 'i1', 'note': 'U48',
+}
+
+
+class DecisionTrace:
+    def __init__(self, path=TRACE_FILE, top_k=10):
+        self.path = path
+        self.top_k = top_k
+        self._days = {k: [] for k in DAY_COLUMNS}
+        self._events = {k: [] for k in EVENT_COLUMNS}
+        self._date, self._account = None, None
+
+    def start(self, date, account):
+        """每日開始時呼叫，之後的 event() 都歸屬此 (date, account)"""
+        self._date, self._account = pd.Timestamp(date).to_datetime64(), account
+
+    def summary(self, vix, vix_scaler, macro_bearish, total_eq, cash, n_candidates, n_holdings):
+        for k, v in zip(DAY_COLUMNS, (self._date, self._account, vix, vix_scaler, macro_bearish, total_eq, cash, n_candidates, n_holdings)):
+            self._days[k].append(v)
+
+    def event(self, kind, symbol, rank=-1, score=np.nan, ref=np.nan, mult=np.nan, flag=0, note=''):
+        for k, v in zip(EVENT_COLUMNS, (self._date, self._account, kind, rank, symbol, score, ref, mult, flag, note)):
+            self._events[k].append(v)
+
+    def ranking(self, candidates, score_of):
+        for rank, sym in enumerate(candidates[:self.top_k]):
+            self.event('CAND', sym, rank=rank, score=score_of(sym))
+
+    def __len__(self): return len(self._days['date'])
+
+    def save(self):
+        """追加寫入：既有檔案中與本次相同 (date, account) 的紀錄先移除，再逐欄串接本次累積的欄位"""
+        cols = {}
+        for prefix, spec, buf in (('day_', DAY_COLUMNS, self._days), ('evt_', EVENT_COLUMNS, self._events)):
+            for k, dtype in spec.items():
+                cols[prefix + k] = np.asarray(buf[k], dtype=dtype)
+        if os.path.exists(self.path):
+            with np.load(self.path) as old:
+                cols = _merge({k: old[k] for k in old.files}, cols)
+        tmp = self.path + '.tmp.npz'
+        np.savez_compressed(tmp, **cols)
+        os.replace(tmp, self.path)
+        # 已寫入的紀錄清空，daemon 重複 save() 時不會重複追加
+        self._days = {k: [] for k in DAY_COLUMNS}
+        self._events = {k: [] for k in EVENT_COLUMNS}
+
+
+def _keys(cols, prefix):
+    return pd.MultiIndex.from_arrays([cols[prefix + 'date'], cols[prefix + 'account']])
+
+
+def _merge(old, new):
+    """舊欄位中 (date, account) 出現在本次紀錄者丟棄 (重跑取代)，其餘保留在前"""
+    rerun = _keys(new, 'day_').union(_keys(new, 'evt_'))
+    keep = {prefix: ~_keys(old, prefix).isin(rerun) for prefix in ('day_', 'evt_') if prefix + 'date' in old and prefix + 'account' in old}
+    out = {}
+    for k, v in new.items():
+        if k not in old: out[k] = v; continue
+        mask = keep.get(k[:4])
+        out[k] = np.concatenate([old[k] if mask is None else old[k][mask], v])
+    return out
+
+
+def load_trace(path=TRACE_FILE):
+    """回傳 (days, events) 兩張 DataFrame"""
+    with np.load(path) as f:
+        days = pd.DataFrame({k: f['day_' + k] for k in DAY_COLUMNS})
+        events = pd.DataFrame({k: f['evt_' + k] for k in EVENT_COLUMNS})
+    return days, events
+
+
+def explain_day(days, events, date, account=None, symbol=None):
+    date = pd.Timestamp(date)
+    d = days[days['date'] == date]
+    e = events[events['date'] == date]
+    if account: d, e = d[d['account'] == account], e[e['account'] == account]
+    if symbol: e = e[(e['symbol'] == symbol) | (e['note'].str.contains(symbol, regex=False))]
+    lines = []
+    for row in d.itertuples(index=False):
+        lines.append(f"📅 {date.strftime('%Y-%m-%d')} [{row.account}] VIX {row.vix:.1f} | scaler {row.vix_scaler:.2f}x | "
+                     f"macro_bearish={bool(row.macro_bearish)} | 總資產 ${row.total_eq:,.0f} | 候選 {row.n_candidates} | 持倉 {row.n_holdings}")
+        for ev in e[e['account'] == row.account].itertuples(index=False):
+            if ev.kind == 'CAND': lines.append(f"   #{ev.rank + 1:<3} {ev.symbol:<14} score {ev.score:.4f}")
+            elif ev.kind == 'HOLD': lines.append(f"   HOLD {ev.symbol:<14} score {ev.score:.4f}{' (賣出中)' if ev.flag else ''}")
+            elif ev.kind == 'SWAP':
+                lines.append(f"   SWAP {ev.symbol} → {ev.note}: b={ev.score:.4f} vs w={ev.ref:.4f} x {ev.mult:.2f} "
+                             f"(門檻 {ev.ref * ev.mult:.4f}) → {'換倉' if ev.flag else '不換'}")
+            elif ev.kind == 'ORDER': lines.append(f"   ORDER {ev.symbol:<14} {ev.note}" + (f" ${ev.score:,.0f}" if not np.isnan(ev.score) else ""))
+            else: lines.append(f"   {ev.kind:<10} {ev.symbol:<14} {ev.note}")
+    return "\n".join(lines) if lines else f"❌ {date.strftime('%Y-%m-%d')} 無紀錄"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="查詢 decision trace")
+    parser.add_argument("path", nargs='?', default=TRACE_FILE)
+    parser.add_argument("--date", help="YYYY-MM-DD；省略則列出最後一天")
+    parser.add_argument("--account")
+    parser.add_argument("--symbol")
+    args = parser.parse_args()
+    days, events = load_trace(args.path)
+    if days.empty:
+        print("❌ trace 為空")
+    else:
+        print(explain_day(days, events, args.date or days['date'].max(), args.account, args.symbol))